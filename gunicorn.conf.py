@@ -0,0 +1,16 @@
+# gunicorn.conf.py
+# Configuración de gunicorn (se carga sola desde el directorio de trabajo).
+# Un único proceso con hilos (gthread): la cola de análisis, las cachés en memoria y el
+# loop de fondo son del proceso, así que se escala con hilos y no con workers. Un análisis
+# lento ocupa un hilo y `/`, `/api/matches` siguen atendiéndose con el resto.
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Cada stream (SSE de progreso, batch NDJSON) retiene un hilo mientras dura.
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
@@ -1,12 +1,11 @@
 # modules/estudio_scraper.py
 from modules.analisis_avanzado import generar_analisis_comparativas_indirectas
 from modules.analisis_reciente import analizar_rendimiento_reciente_con_handicap, comparar_lineas_handicap_recientes
-from modules.analisis_rivales import analizar_rivales_comunes, analizar_contra_rival_del_rival
+from modules.analisis_rivales import analizar_rivales_comunes, analizar_contra_rival_del_rival, resumir_rivales_comunes
 from modules.funciones_resumen import generar_resumen_rendimiento_reciente
 from modules.funciones_auxiliares import _calcular_estadisticas_contra_rival, _analizar_over_under, _analizar_ah_cubierto, _analizar_desempeno_casa_fuera
 import time
 import re
-import math
 from bs4 import BeautifulSoup
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
@@ -19,64 +18,24 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from modules.estudio_scraper import (
+    cargar_paginas_preview_ligero, extract_comparative_match_of, extract_h2h_data_of, extract_last_match_in_league_of,
+    get_rival_a_for_original_h2h_of, get_rival_b_for_original_h2h_of,
+)
+from modules.indice_equipos import record_h2h_page
+from modules.cobertura import ah_cover_code, goal_line_code, outcome_sign, parse_score
 from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover, check_goal_line_cover, get_match_details_from_row_of, extract_final_score_of
 
 BASE_URL_OF = "https://live18.nowgoal25.com"
 SELENIUM_TIMEOUT_SECONDS_OF = 10
 PLACEHOLDER_NODATA = "*(No disponible)*"
 
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-    if numeric_value == 0.0: return "0"
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else:
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-    final_value_signed = sign * abs_rounded
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}"
-    if for_sheets:
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
+_AH_COVER_LABELS = {True: ("CUBIERTO", True), False: ("NO CUBIERTO", False), None: ("PUSH", None)}
+_GOAL_LINE_LABELS = {
+    True: ("SUPERADA (Over)", True),
+    False: (f"<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", False),
+    None: ("PUSH (Igual)", None),
+}
 
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
     """
@@ -84,50 +43,28 @@ def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_n
     Maneja correctamente el Hándicap Asiático 0.
     """
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-
-        # --- LÓGICA ESPECIAL PARA HÁNDICAP 0 (DRAW NO BET) ---
+        goles_h, goles_a = parse_score(resultado_raw)
         if ah_line_num == 0.0:
-            # Simulamos la apuesta sobre el equipo local del partido principal
-            if main_home_team_name.lower() == home_team_in_h2h.lower(): # Si nuestro local jugaba de local
-                if goles_h > goles_a: return ("CUBIERTO", True)
-                elif goles_a > goles_h: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-            else: # Si nuestro local jugaba de visitante
-                if goles_a > goles_h: return ("CUBIERTO", True)
-                elif goles_h > goles_a: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-        
-        # --- LÓGICA ANTERIOR PARA HÁNDICAPS CON FAVORITO ---
-        if favorite_team_name.lower() == home_team_in_h2h.lower():
-            favorite_margin = goles_h - goles_a
+            # --- HÁNDICAP 0 (DRAW NO BET): se simula la apuesta sobre el local del partido principal ---
+            favourite_is_home = main_home_team_name.lower() == home_team_in_h2h.lower()
+        elif favorite_team_name.lower() == home_team_in_h2h.lower():
+            favourite_is_home = True
         elif favorite_team_name.lower() == away_team_in_h2h.lower():
-            favorite_margin = goles_a - goles_h
+            favourite_is_home = False
         else:
             return ("indeterminado", None)
-        
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
-
+        code = ah_cover_code(goles_h, goles_a, ah_line_num, favourite_is_home)
     except (ValueError, TypeError, AttributeError):
         return ("indeterminado", None)
+    return _AH_COVER_LABELS[outcome_sign(code)]
 
 def check_goal_line_cover(resultado_raw: str, goal_line_num: float):
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return (f"<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", False)
-        else:
-            return ("PUSH (Igual)", None)
+        goles_h, goles_a = parse_score(resultado_raw)
+        code = goal_line_code(goles_h, goles_a, goal_line_num)
     except (ValueError, TypeError):
         return ("indeterminado", None)
+    return _GOAL_LINE_LABELS[outcome_sign(code)]
 
 def _analizar_precedente_handicap(precedente_data, ah_actual_num, favorito_actual_name, main_home_team_name):
     """
@@ -493,28 +430,6 @@ def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
     except requests.RequestException:
         return None
 
-def get_rival_a_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v1")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 1 and (rival_tag := onclicks[1]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
-    return None, None, None
-
-def get_rival_b_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v2")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 0 and (rival_tag := onclicks[0]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
-    return None, None, None
-
 def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
     if not all([driver, key_match_id, rival_a_id, rival_b_id]):
         return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
@@ -637,32 +552,6 @@ def get_match_datetime_from_script_of(soup):
         pass
     return result
 
-def _parse_date_ddmmyyyy(d: str) -> tuple:
-    m = re.search(r'(\d{2})-(\d{2})-(\d{4})', d or '')
-    return (int(m.group(3)), int(m.group(2)), int(m.group(1))) if m else (1900, 1, 1)
-
-def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game):
-    if not soup or not (table := soup.find("table", id=table_id)): return None
-    candidate_matches = []
-    score_selector = 'fscore_1' if is_home_game else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')):
-            continue
-        if league_id and details.get("league_id_hist") != str(league_id):
-            continue
-        is_team_home = team_name.lower() in details.get('home', '').lower()
-        is_team_away = team_name.lower() in details.get('away', '').lower()
-        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
-            candidate_matches.append(details)
-    if not candidate_matches: return None
-    candidate_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    last_match = candidate_matches[0]
-    return {
-        "date": last_match.get('date', 'N/A'), "home_team": last_match.get('home'),
-        "away_team": last_match.get('away'), "score": last_match.get('score_raw', 'N/A').replace('-', ':'),
-        "handicap_line_raw": last_match.get('ahLine_raw', 'N/A'), "match_id": last_match.get('matchIndex')
-    }
-
 def extract_bet365_initial_odds_of(soup):
     odds_info = {
         "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
@@ -770,35 +659,32 @@ def extract_over_under_stats_from_div_of(soup, team_type: str):
         return default_stats
     return default_stats
 
-def extract_h2h_data_of(soup, home_name, away_name, league_id=None):
-    results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
-    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")): return results
-    all_matches = []
-    for r in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h')):
-            if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
-                all_matches.append(d)
-    if not all_matches: return results
-    all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    most_recent = all_matches[0]
-    results.update({'ah6': most_recent.get('ahLine', '-'), 'res6': most_recent.get('score', '?:?'), 'res6_raw': most_recent.get('score_raw', '?-?'), 'match6_id': most_recent.get('matchIndex'), 'h2h_gen_home': most_recent.get('home'), 'h2h_gen_away': most_recent.get('away')})
-    for d in all_matches:
-        if d['home'].lower() == home_name.lower() and d['away'].lower() == away_name.lower():
-            results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
-            break
-    return results
-
-def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table):
-    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
-    score_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')): continue
-        if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
-        h, a = details.get('home','').lower(), details.get('away','').lower()
-        main, opp = main_team.lower(), opponent.lower()
-        if (main == h and opp == a) or (main == a and opp == h):
-            return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
-    return None
+def _h2h_indirecto_ligero(soup, home_name, away_name, home_id=None, away_id=None, max_rivals=3, match_id=None):
+    """
+    H2H indirecto de la vista previa: para los primeros rivales comunes compara el margen del
+    último partido de cada equipo contra ese rival (ver modules.analisis_rivales).
+    """
+    indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
+    for rival in (resumir_rivales_comunes(soup, home_name, away_name, home_id, away_id, match_id) or [])[:max_rivals]:
+        home_margin, away_margin = rival["team_a"]["last_margin"], rival["team_b"]["last_margin"]
+        if home_margin is None or away_margin is None:
+            continue
+        if home_margin > away_margin:
+            indirect["home_better"] += 1
+            verdict = "home"
+        elif home_margin < away_margin:
+            indirect["away_better"] += 1
+            verdict = "away"
+        else:
+            indirect["draws"] += 1
+            verdict = "draw"
+        indirect["samples"].append({
+            "rival": rival["rival"].lower(),
+            "home_margin": home_margin,
+            "away_margin": away_margin,
+            "verdict": verdict
+        })
+    return indirect
 
 def extract_indirect_comparison_data(soup):
     """
@@ -899,6 +785,7 @@ def obtener_datos_completos_partido(match_id: str):
 
         # --- Extracción de Datos Primarios ---
         home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(soup_completo)
+        record_h2h_page(match_id, soup_completo, home_id, away_id, home_name, away_name, league_id)
         # Fecha/hora del partido (si está en el script)
         dt_info = get_match_datetime_from_script_of(soup_completo)
         datos.update({
@@ -919,8 +806,8 @@ def obtener_datos_completos_partido(match_id: str):
             future_away_ou = executor.submit(extract_over_under_stats_from_div_of, soup_completo, 'away')
             future_main_odds = executor.submit(extract_bet365_initial_odds_of, soup_completo)
             future_h2h_data = executor.submit(extract_h2h_data_of, soup_completo, home_name, away_name, None)
-            future_last_home = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v1", home_name, league_id, True)
-            future_last_away = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v2", away_name, league_id, False)
+            future_last_home = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v1", home_name, league_id, True, home_id, match_id)
+            future_last_away = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v2", away_name, league_id, False, away_id, match_id)
             
             # Tarea H2H Col3 (requiere una nueva llamada de Selenium)
             key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
@@ -1008,7 +895,7 @@ def obtener_datos_completos_partido(match_id: str):
                 datos["comparacion_lineas_visitante"] = comparacion_visitante
             
             # --- ANÁLISIS DE RIVALES COMUNES ---
-            rivales_comunes = analizar_rivales_comunes(soup_completo, home_name, away_name)
+            rivales_comunes = analizar_rivales_comunes(soup_completo, home_name, away_name, home_id, away_id, match_id)
             datos["rivales_comunes"] = rivales_comunes
             
             # --- ANÁLISIS CONTRA RIVAL DEL RIVAL ---
@@ -1098,7 +985,8 @@ def obtener_datos_preview_rapido(match_id: str):
         soup = BeautifulSoup(driver.page_source, 'lxml')
 
         # 2. Extraer identificadores y nombres (igual que en el scraper completo)
-        _, _, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+        home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+        record_h2h_page(match_id, soup, home_id, away_id, home_name, away_name, league_id)
         dt_info = get_match_datetime_from_script_of(soup)
 
         # 2b. Extraer línea AH actual (Bet365 inicial)
@@ -1217,7 +1105,7 @@ def obtener_datos_preview_rapido(match_id: str):
         recent_indirect = {"last_home": None, "last_away": None, "h2h_col3": None}
         try:
             # Último del local en liga
-            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True)
+            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True, home_id, match_id)
             last_home_stats = get_match_progression_stats_data(str(last_home.get('match_id'))) if last_home and last_home.get('match_id') else None
             def _df_to_rows(df):
                 rows = []
@@ -1240,7 +1128,7 @@ def obtener_datos_preview_rapido(match_id: str):
                     "date": last_home.get('date')
                 }
             # Último del visitante en liga
-            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False)
+            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False, away_id, match_id)
             last_away_stats = get_match_progression_stats_data(str(last_away.get('match_id'))) if last_away and last_away.get('match_id') else None
             if last_away:
                 recent_indirect["last_away"] = {
@@ -1271,79 +1159,7 @@ def obtener_datos_preview_rapido(match_id: str):
             pass
 
         # 5. Calcular H2H Indirecto (rivales comunes) de forma ligera
-        indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
-        try:
-            table_v1 = soup.find("table", id="table_v1")
-            table_v2 = soup.find("table", id="table_v2")
-
-            def _parse_score_to_tuple(score_text):
-                try:
-                    gh, ga = map(int, score_text.strip().split("-"))
-                    return gh, ga
-                except Exception:
-                    return None
-
-            def _find_match_info(table, rival_name_lower, team_name_ref):
-                if not table:
-                    return None
-                rows = table.find_all("tr", id=re.compile(r"tr[12]_\\d+"))
-                for r in rows:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_t = tds[2].get_text(strip=True)
-                    away_t = tds[4].get_text(strip=True)
-                    if away_t.lower() == rival_name_lower or home_t.lower() == rival_name_lower:
-                        score_text = tds[3].get_text(strip=True)
-                        score = _parse_score_to_tuple(score_text)
-                        if not score:
-                            continue
-                        gh, ga = score
-                        if home_t.lower() == team_name_ref.lower():
-                            margin = gh - ga
-                        elif away_t.lower() == team_name_ref.lower():
-                            margin = ga - gh
-                        else:
-                            margin = gh - ga
-                        return {"rival": rival_name_lower, "margin": margin}
-                return None
-
-            if table_v1 and table_v2:
-                rivals_home = set()
-                for r in table_v1.find_all("tr", id=re.compile(r"tr1_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_home.add(tds[4].get_text(strip=True).lower())
-                rivals_away = set()
-                for r in table_v2.find_all("tr", id=re.compile(r"tr2_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_away.add(tds[2].get_text(strip=True).lower())
-                common = [rv for rv in rivals_home.intersection(rivals_away) if rv and rv != '?']
-                common = common[:3]
-                for rv in common:
-                    home_info = _find_match_info(table_v1, rv, home_name)
-                    away_info = _find_match_info(table_v2, rv, away_name)
-                    if not home_info or not away_info:
-                        continue
-                    if home_info["margin"] > away_info["margin"]:
-                        indirect["home_better"] += 1
-                        verdict = "home"
-                    elif home_info["margin"] < away_info["margin"]:
-                        indirect["away_better"] += 1
-                        verdict = "away"
-                    else:
-                        indirect["draws"] += 1
-                        verdict = "draw"
-                    indirect["samples"].append({
-                        "rival": rv,
-                        "home_margin": home_info["margin"],
-                        "away_margin": away_info["margin"],
-                        "verdict": verdict
-                    })
-        except Exception:
-            # Ignorar errores de comparativas indirectas en la vista previa
-            pass
+        indirect = _h2h_indirecto_ligero(soup, home_name, away_name, home_id, away_id, match_id=match_id)
 
         # 5b. Evaluar "muy superior" en ataques peligrosos desde comparativas indirectas (con la misma función)
         indirect_panels = extract_indirect_comparison_data(soup)
@@ -1430,16 +1246,18 @@ def obtener_datos_preview_ligero(match_id: str):
     if not match_id or not match_id.isdigit():
         return {"error": "ID de partido inválido."}
 
-    url = f"{BASE_URL_OF}/match/h2h-{match_id}"
     try:
-        session = requests.Session()
-        session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-        response = session.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        # Todas las páginas (h2h, estadísticas y h2h del rival) se descargan en paralelo con aiohttp.
+        paginas = cargar_paginas_preview_ligero(match_id)
+        soup = paginas["soup"]
+        stats_descargadas = paginas["stats"]
+
+        def _stats_de(mid):
+            mid = str(mid)
+            return stats_descargadas[mid] if mid in stats_descargadas else get_match_progression_stats_data(mid)
 
         # Equipos
-        _, _, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+        home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
         dt_info = get_match_datetime_from_script_of(soup)
 
         # Línea AH (Bet365 inicial)
@@ -1556,8 +1374,8 @@ def obtener_datos_preview_ligero(match_id: str):
         recent_indirect = {"last_home": None, "last_away": None, "h2h_col3": None}
         try:
             # Últimos partidos
-            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True)
-            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False)
+            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True, home_id, match_id)
+            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False, away_id, match_id)
             def _df_to_rows(df):
                 rows = []
                 try:
@@ -1569,7 +1387,7 @@ def obtener_datos_preview_ligero(match_id: str):
                     pass
                 return rows
             if last_home:
-                lh_stats = get_match_progression_stats_data(str(last_home.get('match_id')))
+                lh_stats = _stats_de(last_home.get('match_id'))
                 recent_indirect["last_home"] = {
                     "home": last_home.get('home_team'),
                     "away": last_home.get('away_team'),
@@ -1580,7 +1398,7 @@ def obtener_datos_preview_ligero(match_id: str):
                     "date": last_home.get('date')
                 }
             if last_away:
-                la_stats = get_match_progression_stats_data(str(last_away.get('match_id')))
+                la_stats = _stats_de(last_away.get('match_id'))
                 recent_indirect["last_away"] = {
                     "home": last_away.get('home_team'),
                     "away": last_away.get('away_team'),
@@ -1593,13 +1411,8 @@ def obtener_datos_preview_ligero(match_id: str):
             # H2H Rivales (Col3) sin Selenium: cargar la página del key_id_a
             key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup, league_id)
             _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup, league_id)
-            if key_id_a and rival_a_id and rival_b_id:
-                key_url = f"{BASE_URL_OF}/match/h2h-{key_id_a}"
-                session2 = requests.Session()
-                session2.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-                key_resp = session2.get(key_url, timeout=6)
-                key_resp.raise_for_status()
-                soup_key = BeautifulSoup(key_resp.text, 'lxml')
+            soup_key = paginas["rival_soup"]
+            if key_id_a and rival_a_id and rival_b_id and soup_key is not None:
                 table = soup_key.find("table", id="table_v2")
                 if table:
                     for row in table.find_all("tr", id=re.compile(r"tr2_\\d+")):
@@ -1626,7 +1439,7 @@ def obtener_datos_preview_ligero(match_id: str):
                                 ah_raw = (cell.get("data-o") or cell.text).strip() or "-"
                             match_id_col3 = row.get('index')
                             score_line = f"{links[0].text.strip()} {g_h}:{g_a} {links[1].text.strip()}"
-                            col3_stats = get_match_progression_stats_data(str(match_id_col3))
+                            col3_stats = _stats_de(match_id_col3)
                             # Fecha si existe
                             date_txt = None
                             try:
@@ -1646,75 +1459,7 @@ def obtener_datos_preview_ligero(match_id: str):
             pass
 
         # H2H indirecto ligero (rivales comunes)
-        indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
-        try:
-            table_v1 = soup.find("table", id="table_v1")
-            table_v2 = soup.find("table", id="table_v2")
-            def _parse_score_to_tuple(score_text):
-                try:
-                    gh, ga = map(int, score_text.strip().split("-"))
-                    return gh, ga
-                except Exception:
-                    return None
-            def _find_match_info(table, rival_name_lower, team_name_ref):
-                if not table:
-                    return None
-                rows = table.find_all("tr", id=re.compile(r"tr[12]_\\d+"))
-                for r in rows:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_t = tds[2].get_text(strip=True)
-                    away_t = tds[4].get_text(strip=True)
-                    if away_t.lower() == rival_name_lower or home_t.lower() == rival_name_lower:
-                        score_text = tds[3].get_text(strip=True)
-                        score = _parse_score_to_tuple(score_text)
-                        if not score:
-                            continue
-                        gh, ga = score
-                        if home_t.lower() == team_name_ref.lower():
-                            margin = gh - ga
-                        elif away_t.lower() == team_name_ref.lower():
-                            margin = ga - gh
-                        else:
-                            margin = gh - ga
-                        return {"rival": rival_name_lower, "margin": margin}
-                return None
-            if table_v1 and table_v2:
-                rivals_home = set()
-                for r in table_v1.find_all("tr", id=re.compile(r"tr1_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_home.add(tds[4].get_text(strip=True).lower())
-                rivals_away = set()
-                for r in table_v2.find_all("tr", id=re.compile(r"tr2_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_away.add(tds[2].get_text(strip=True).lower())
-                common = [rv for rv in rivals_home.intersection(rivals_away) if rv and rv != '?']
-                common = common[:3]
-                for rv in common:
-                    home_info = _find_match_info(table_v1, rv, home_name)
-                    away_info = _find_match_info(table_v2, rv, away_name)
-                    if not home_info or not away_info:
-                        continue
-                    if home_info["margin"] > away_info["margin"]:
-                        indirect["home_better"] += 1
-                        verdict = "home"
-                    elif home_info["margin"] < away_info["margin"]:
-                        indirect["away_better"] += 1
-                        verdict = "away"
-                    else:
-                        indirect["draws"] += 1
-                        verdict = "draw"
-                    indirect["samples"].append({
-                        "rival": rv,
-                        "home_margin": home_info["margin"],
-                        "away_margin": away_info["margin"],
-                        "verdict": verdict
-                    })
-        except Exception:
-            pass
+        indirect = _h2h_indirecto_ligero(soup, home_name, away_name, home_id, away_id, match_id=match_id)
 
         # Ataques peligrosos (comparativas indirectas)
         indirect_panels = extract_indirect_comparison_data(soup)
@@ -1781,7 +1526,7 @@ def obtener_datos_preview_ligero(match_id: str):
             "match_datetime": dt_info.get("match_datetime"),
         })
         return result
-    except requests.Timeout:
+    except (requests.Timeout, TimeoutError):
         return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder."}
     except Exception as e:
         print(f"ERROR en scraper preview ligero para {match_id}: {e}")
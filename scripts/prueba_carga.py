@@ -0,0 +1,162 @@
+# scripts/prueba_carga.py
+# Prueba de carga: mide la latencia de las rutas baratas mientras hay análisis lentos en curso.
+#
+#   python scripts/prueba_carga.py --base-url http://127.0.0.1:8000
+#   python scripts/prueba_carga.py --compare            # arranca gunicorn con sync y con gthread
+#
+# Con --compare el script lanza gunicorn (con gunicorn.conf.py) una vez por clase de worker
+# y muestra una tabla con la latencia de la ruta rápida en cada modo.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_FAST_PATHS = ('/api/matches?limit=5', '/')
+DEFAULT_SLOW_PATH = '/api/analisis/2776232'
+SERVER_START_TIMEOUT_SECONDS = 60
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _worker(base_url, paths, deadline, latencies, errors, lock, timeout):
+    session = requests.Session()
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=timeout)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def run_load(base_url, fast_paths, slow_path, fast_clients, slow_clients, duration, timeout):
+    """Lanza los clientes lentos y rápidos a la vez y devuelve las latencias de cada grupo."""
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    results = {'fast': ([], []), 'slow': ([], [])}
+    threads = []
+    groups = (('slow', [slow_path], slow_clients), ('fast', list(fast_paths), fast_clients))
+    for group, paths, clients in groups:
+        latencies, errors = results[group]
+        for _ in range(clients):
+            thread = threading.Thread(
+                target=_worker, args=(base_url, paths, deadline, latencies, errors, lock, timeout), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join(duration + timeout + 5)
+    return results
+
+
+def summarize(latencies, errors, duration):
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+def _wait_until_ready(base_url, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al arrancar (código {process.returncode})")
+        try:
+            requests.get(base_url + '/metrics', timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError('gunicorn no respondió a tiempo')
+
+
+def _start_gunicorn(worker_class, port, app_spec):
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class)
+    if worker_class == 'sync':
+        # Con threads > 1 gunicorn cambia el worker sync por gthread sin avisar.
+        env['GUNICORN_THREADS'] = '1'
+    command = [sys.executable, '-m', 'gunicorn', '-c', str(REPO_ROOT / 'gunicorn.conf.py'), app_spec]
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def compare_worker_classes(args):
+    rows = []
+    for worker_class in args.worker_classes:
+        base_url = f"http://127.0.0.1:{args.port}"
+        process = _start_gunicorn(worker_class, args.port, args.app)
+        try:
+            _wait_until_ready(base_url, process)
+            results = run_load(base_url, args.fast_path, args.slow_path, args.fast_clients, args.slow_clients,
+                               args.duration, args.timeout)
+        finally:
+            process.terminate()
+            try:
+                process.wait(15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        rows.append((worker_class, summarize(*results['fast'], args.duration), summarize(*results['slow'], args.duration)))
+    return rows
+
+
+def _print_table(rows):
+    header = f"{'modo':<10} {'ruta':<6} {'ok':>6} {'err':>5} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, fast, slow in rows:
+        for label, summary in (('rápida', fast), ('lenta', slow)):
+            print(f"{name:<10} {label:<6} {summary['requests']:>6} {summary['errors']:>5} {summary['rps']:>7} "
+                  f"{str(summary['p50_ms']):>9} {str(summary['p95_ms']):>9} {str(summary['max_ms']):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Latencia de las rutas baratas con análisis lentos en curso.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--fast-path', action='append', help='Ruta barata (repetible).')
+    parser.add_argument('--slow-path', default=DEFAULT_SLOW_PATH, help='Ruta de análisis profundo.')
+    parser.add_argument('--fast-clients', type=int, default=8)
+    parser.add_argument('--slow-clients', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=20.0, help='Segundos de carga.')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Timeout por petición.')
+    parser.add_argument('--compare', action='store_true', help='Arranca gunicorn con cada clase de worker.')
+    parser.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--app', default='src.app:app', help='Aplicación WSGI para gunicorn.')
+    args = parser.parse_args(argv)
+    args.fast_path = args.fast_path or list(DEFAULT_FAST_PATHS)
+
+    if args.compare:
+        _print_table(compare_worker_classes(args))
+        return
+    results = run_load(args.base_url, args.fast_path, args.slow_path, args.fast_clients, args.slow_clients,
+                       args.duration, args.timeout)
+    _print_table([(args.base_url, summarize(*results['fast'], args.duration), summarize(*results['slow'], args.duration))])
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,14 @@
 import asyncio
 import json
 import re
+import sys
+from pathlib import Path
 import cloudscraper
 from datetime import datetime, timedelta
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from modules.cliente_http import outbound_call
+
 # --- CONFIGURACIÓN ---
 JS_URL = "https://live20.nowgoal25.com/gf/data/bf_en-idn.js"
 REQUEST_TIMEOUT_SECONDS = 15
@@ -25,8 +30,9 @@ def _fetch_js_data_sync():
     """Descarga el contenido del archivo JS de datos."""
     session = _get_session()
     try:
-        response = session.get(JS_URL, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
+        with outbound_call(JS_URL):
+            response = session.get(JS_URL, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT_SECONDS)
+            response.raise_for_status()
         return response.text
     except Exception as e:
         print(f"Error al descargar los datos del JS: {e}")
@@ -2,35 +2,158 @@
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
-from flask import Flask, render_template, abort, request, redirect, url_for
-import asyncio
-from playwright.async_api import async_playwright
+from flask import Flask, render_template, abort, request, redirect, url_for, g, Response, send_from_directory, stream_with_context, make_response
+import hmac
+import os
 from bs4 import BeautifulSoup
 import datetime
 import re
-import math
 import threading
 import json
 import time
 import logging
+from collections import Counter
 from pathlib import Path
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 # ¡Importante! Importa tu nuevo módulo de scraping
 from modules.estudio_scraper import (
     analizar_partido_completo, 
-    format_ah_as_decimal_string_of,
-    parse_ah_to_number_of,
     check_handicap_cover,
     generar_analisis_completo_mercado,
-    analizar_partidos_handicap
+    analizar_partidos_handicap,
+    get_cached_analysis_with_age,
+    ANALYSIS_CACHE_TTL_SECONDS,
+)
+from modules.tiempos import get_stage_summary
+from modules.metricas import (
+    CACHE_EVICTIONS, CACHE_REQUESTS, DATA_STORE_RELOADS, HTTP_REQUEST_SECONDS, gauge, render_prometheus, track_outbound
+)
+from modules.cola_analisis import AnalysisJobQueue, JOB_DONE, PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from modules.prefetch import PrefetchScheduler
+from modules.playwright_pool import get_playwright_pool
+from modules.cliente_http import build_session, outbound_call, host_available
+from modules.handicap_asiatico import format_ah_as_decimal_string_of, normalize_handicap_to_half_bucket_str, parse_ah_to_number_of
+from modules.http_cache import COMPRESSIBLE_MIMETYPES, STATIC_MAX_AGE_SECONDS, compress_response, etag_matches, make_etag
+from modules.perfilado import (
+    PROFILE_DIR, PROFILE_SLOW_REQUEST_SECONDS, RequestProfile, SlowRequestSampler, list_profiles
 )
 from flask import jsonify # Asegúrate de que jsonify está importado
 
 app = Flask(__name__)
 
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=response.status_code
+        )
+    return response
+
+
+# --- Caché HTTP y compresión ---
+_CONDITIONAL_MIMETYPES = ('text/html', 'application/json')
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _conditional_response(etag, build):
+    """304 si el cliente ya tiene esta versión; si no, construye la respuesta y le pone la ETag."""
+    if etag_matches(request, etag):
+        return _not_modified(etag)
+    response = make_response(build())
+    if response.status_code == 200:
+        response.set_etag(etag)
+    return response
+
+
+@app.after_request
+def _apply_http_caching(response):
+    if request.endpoint == 'static':
+        # Los análisis cacheados en disco cambian al refrescarse; el resto de estáticos no.
+        if request.path.startswith('/static/cached_previews/'):
+            response.headers['Cache-Control'] = 'no-cache'
+        else:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE_SECONDS}'
+        static_etag = response.get_etag()[0]
+        if response.status_code == 200 and static_etag and etag_matches(request, static_etag):
+            not_modified = _not_modified(static_etag)
+            not_modified.headers['Cache-Control'] = response.headers['Cache-Control']
+            return not_modified
+        if response.status_code == 200 and response.mimetype in COMPRESSIBLE_MIMETYPES:
+            # send_file entrega el fichero en passthrough; se lee a memoria para poder comprimirlo.
+            response.direct_passthrough = False
+            response.set_data(response.get_data())
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+    if (request.method == 'GET' and response.status_code == 200 and not response.is_streamed
+            and not response.direct_passthrough and response.mimetype in _CONDITIONAL_MIMETYPES):
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        if not response.get_etag()[0]:
+            response.add_etag()
+        if etag_matches(request, response.get_etag()[0]):
+            return _not_modified(response.get_etag()[0])
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+_SLOW_PROFILED_ROUTE_PREFIXES = ('/api/analisis', '/api/estudio_panel', '/api/preview/', '/estudio', '/api/handicap_analysis')
+
+
+def _admin_token_ok():
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('X-Admin-Token') or request.args.get('admin_token') or ''
+    return bool(supplied) and hmac.compare_digest(supplied, ADMIN_TOKEN)
+
+
+@app.before_request
+def _start_request_profiling():
+    flag = (request.headers.get('X-Profile') or request.args.get('profile') or '').strip().lower()
+    label = f"{request.method}_{request.path}"
+    if flag in ('1', 'true', 'yes') and _admin_token_ok():
+        try:
+            g.request_profile = RequestProfile(label)
+        except ValueError as exc:
+            # Solo puede haber un cProfile activo a la vez en el proceso.
+            print(f"No se pudo iniciar el perfilado de {label}: {exc}")
+    elif PROFILE_SLOW_REQUEST_SECONDS > 0 and request.path.startswith(_SLOW_PROFILED_ROUTE_PREFIXES):
+        g.request_profile = SlowRequestSampler(label)
+
+
+def _finish_request_profiling():
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return []
+    saved = profile.stop()
+    if saved:
+        logging.warning(f"[PROFILE] Perfil guardado para {request.path}: {', '.join(saved)}")
+    return saved
+
+
+@app.after_request
+def _stop_request_profiling(response):
+    saved = _finish_request_profiling()
+    if saved:
+        response.headers['X-Profile-Saved'] = ','.join(saved)
+    return response
+
+
+@app.teardown_request
+def _discard_request_profiling(exc):
+    _finish_request_profiling()
+
 # --- Mantén tu lógica para la página principal ---
 URL_NOWGOAL = "https://live20.nowgoal25.com/"
 
@@ -45,7 +168,6 @@ _REQUEST_HEADERS = {
 
 _requests_session = None
 _requests_session_lock = threading.Lock()
-_requests_fetch_lock = threading.Lock()
 
 _EMPTY_DATA_TEMPLATE = {"upcoming_matches": [], "finished_matches": []}
 _DATA_FILE_CANDIDATES = [
@@ -62,19 +184,32 @@ else:
 _data_file_lock = threading.Lock()
 
 
+def data_store_version():
+    """Versión del data store (mtime y tamaño de data.json); cambia cada vez que el scraper lo reescribe."""
+    try:
+        stat = DATA_FILE.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def load_data_from_file():
     """Carga los datos desde el archivo JSON, similar a la app ligera."""
     with _data_file_lock:
         if not DATA_FILE.exists():
+            DATA_STORE_RELOADS.inc(outcome='missing')
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
         try:
             with DATA_FILE.open('r', encoding='utf-8') as fh:
                 data = json.load(fh)
         except (json.JSONDecodeError, OSError) as exc:
             print(f"Error al leer {DATA_FILE}: {exc}")
+            DATA_STORE_RELOADS.inc(outcome='error')
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
         if not isinstance(data, dict):
+            DATA_STORE_RELOADS.inc(outcome='error')
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
+        DATA_STORE_RELOADS.inc(outcome='ok')
 
         normalized = {}
         for key in _EMPTY_DATA_TEMPLATE:
@@ -135,7 +270,7 @@ def _build_handicap_filter_predicate(handicap_filter):
 
 def _normalize_goal_line_option_str(value):
     try:
-        parsed = _parse_handicap_to_float(value)
+        parsed = parse_ah_to_number_of(value)
     except Exception:
         parsed = None
     if parsed is None:
@@ -150,7 +285,7 @@ def _build_goal_line_filter_predicate(goal_line_filter):
     if not goal_line_filter:
         return None
     try:
-        target_value = _parse_handicap_to_float(goal_line_filter)
+        target_value = parse_ah_to_number_of(goal_line_filter)
     except Exception:
         target_value = None
     if target_value is None:
@@ -159,7 +294,7 @@ def _build_goal_line_filter_predicate(goal_line_filter):
 
     def predicate(raw_value):
         try:
-            current_value = _parse_handicap_to_float(raw_value or '')
+            current_value = parse_ah_to_number_of(raw_value or '')
         except Exception:
             current_value = None
         if current_value is None:
@@ -278,12 +413,29 @@ def load_preview_from_cache(match_id: str):
             with cache_path.open('r', encoding='utf-8') as fh:
                 cached_data = json.load(fh)
                 if isinstance(cached_data, dict):
+                    CACHE_REQUESTS.inc(cache='preview_disk', result='hit')
                     return cached_data
         except (json.JSONDecodeError, OSError) as exc:
             print(f"Error al leer cache de analisis {cache_path}: {exc}")
+    CACHE_REQUESTS.inc(cache='preview_disk', result='miss')
     return None
 
 
+def get_preview_cache_age(match_id: str):
+    cache_path = _get_preview_cache_dir() / f'{match_id}.json'
+    try:
+        return max(time.time() - cache_path.stat().st_mtime, 0.0)
+    except OSError:
+        return None
+
+
+def _preview_cache_version(match_id: str):
+    try:
+        return (_get_preview_cache_dir() / f'{match_id}.json').stat().st_mtime_ns
+    except OSError:
+        return None
+
+
 def save_preview_to_cache(match_id: str, payload: dict):
     cache_dir = _get_preview_cache_dir()
     try:
@@ -307,148 +459,43 @@ def _get_shared_requests_session():
     global _requests_session
     with _requests_session_lock:
         if _requests_session is None:
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=0.4, status_forcelist=[500, 502, 503, 504])
-            adapter = HTTPAdapter(max_retries=retries)
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
-            session.headers.update(_REQUEST_HEADERS)
-            _requests_session = session
+            _requests_session = build_session(_REQUEST_HEADERS)
         return _requests_session
 
 
 def _fetch_nowgoal_html_sync(url: str) -> str | None:
     session = _get_shared_requests_session()
     try:
-        with _requests_fetch_lock:
+        with outbound_call(url), track_outbound('dashboard'):
             response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
+            response.raise_for_status()
         return response.text
     except Exception as exc:
         print(f"Error al obtener {url} con requests: {exc}")
         return None
 
 
-async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None = None, requests_first: bool = True) -> str | None:
+def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None = None, requests_first: bool = True) -> str | None:
     target_url = _build_nowgoal_url(path)
     html_content = None
 
     if requests_first:
-        try:
-            html_content = await asyncio.to_thread(_fetch_nowgoal_html_sync, target_url)
-        except Exception as exc:
-            print(f"Error asincronico al lanzar la carga con requests ({target_url}): {exc}")
-            html_content = None
+        html_content = _fetch_nowgoal_html_sync(target_url)
 
     if html_content:
         return html_content
 
+    if not host_available(target_url):
+        # Breaker abierto: tampoco se lanza el navegador contra un host caído.
+        return None
+
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            try:
-                await page.goto(target_url, wait_until="domcontentloaded", timeout=20000)
-                await page.wait_for_timeout(4000)
-                if filter_state is not None:
-                    try:
-                        await page.evaluate("(state) => { if (typeof HideByState === 'function') { HideByState(state); } }", filter_state)
-                        await page.wait_for_timeout(1500)
-                    except Exception as eval_err:
-                        print(f"Advertencia al aplicar HideByState({filter_state}) en {target_url}: {eval_err}")
-                return await page.content()
-            finally:
-                await browser.close()
+        with track_outbound('playwright'):
+            return get_playwright_pool(_REQUEST_HEADERS['User-Agent']).fetch_html(target_url, filter_state)
     except Exception as browser_exc:
         print(f"Error al obtener la pagina con Playwright ({target_url}): {browser_exc}")
     return None
 
-def _parse_number_clean(s: str):
-    if s is None:
-        return None
-    txt = str(s).strip()
-    txt = txt.replace('−', '-')  # unicode minus
-    txt = txt.replace(',', '.')
-    txt = txt.replace('+', '')
-    txt = txt.replace(' ', '')
-    m = re.search(r"^[+-]?\d+(?:\.\d+)?$", txt)
-    if m:
-        try:
-            return float(m.group(0))
-        except ValueError:
-            return None
-    return None
-
-def _parse_number(s: str):
-    if s is None:
-        return None
-    # Normaliza separadores y signos
-    txt = str(s).strip()
-    txt = txt.replace('−', '-')  # minus unicode
-    txt = txt.replace(',', '.')
-    txt = txt.replace(' ', '')
-    # Coincide con un número decimal con signo
-    m = re.search(r"^[+-]?\d+(?:\.\d+)?$", txt)
-    if m:
-        try:
-            return float(m.group(0))
-        except ValueError:
-            return None
-    return None
-
-def _parse_handicap_to_float(text: str):
-    if text is None:
-        return None
-    t = str(text).strip()
-    if '/' in t:
-        parts = [p for p in re.split(r"/", t) if p]
-        nums = []
-        for p in parts:
-            v = _parse_number_clean(p)
-            if v is None:
-                return None
-            nums.append(v)
-        if not nums:
-            return None
-        return sum(nums) / len(nums)
-    # Si viene como cadena normal (ej. "+0.25" o "-0,75")
-    return _parse_number_clean(t.replace('+', ''))
-
-def _bucket_to_half(value: float) -> float:
-    if value is None:
-        return None
-    if value == 0:
-        return 0.0
-    sign = -1.0 if value < 0 else 1.0
-    av = abs(value)
-    base = math.floor(av + 1e-9)
-    frac = av - base
-    # Mapea 0.25/0.75/0.5 a .5, 0.0 queda .0
-    def close(a, b):
-        return abs(a - b) < 1e-6
-    if close(frac, 0.0):
-        bucket = float(base)
-    elif close(frac, 0.5) or close(frac, 0.25) or close(frac, 0.75):
-        bucket = base + 0.5
-    else:
-        # fallback: redondeo al múltiplo de 0.5 más cercano
-        bucket = round(av * 2) / 2.0
-        # si cae justo en entero, desplazar a .5 para respetar la preferencia de .25/.75 → .5
-        f = bucket - math.floor(bucket)
-        if close(f, 0.0) and (abs(av - (math.floor(bucket) + 0.25)) < 0.26 or abs(av - (math.floor(bucket) + 0.75)) < 0.26):
-            bucket = math.floor(bucket) + 0.5
-    return sign * bucket
-
-def normalize_handicap_to_half_bucket_str(text: str):
-    v = _parse_handicap_to_float(text)
-    if v is None:
-        return None
-    b = _bucket_to_half(v)
-    if b is None:
-        return None
-    # Formato con un decimal
-    return f"{b:.1f}"
-
 def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None, goal_line_filter=None):
     soup = BeautifulSoup(html_content, 'html.parser')
     match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
@@ -595,7 +642,7 @@ def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_
 
     return paginated_matches
 
-async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
+def get_main_page_matches(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
     return _filter_and_slice_matches(
         'upcoming_matches',
         limit=limit,
@@ -606,7 +653,7 @@ async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None
     )
 
 
-async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
+def get_main_page_finished_matches(limit=None, offset=0, handicap_filter=None, goal_line_filter=None):
     return _filter_and_slice_matches(
         'finished_matches',
         limit=limit,
@@ -617,21 +664,108 @@ async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_fi
     )
 
 
-async def _fetch_sidebar_lists(handicap_filter=None, goal_line_filter=None):
-    return await asyncio.gather(
-        get_main_page_matches_async(handicap_filter=handicap_filter, goal_line_filter=goal_line_filter),
-        get_main_page_finished_matches_async(handicap_filter=handicap_filter, goal_line_filter=goal_line_filter),
+def _fetch_sidebar_lists(handicap_filter=None, goal_line_filter=None):
+    return (
+        get_main_page_matches(handicap_filter=handicap_filter, goal_line_filter=goal_line_filter),
+        get_main_page_finished_matches(handicap_filter=handicap_filter, goal_line_filter=goal_line_filter),
     )
 
 
+# --- Instantáneas del dashboard ---
+# Cada vez que cambia data.json se renderizan en segundo plano la vista sin filtros y los
+# filtros de hándicap / línea de goles con más partidos; el resto se renderiza bajo demanda.
+DASHBOARD_SNAPSHOT_TOP_FILTERS = int(os.environ.get('DASHBOARD_SNAPSHOT_TOP_FILTERS', '4'))
+UPCOMING_PAGE_TITLE = 'Pr�ximos Partidos'
+FINISHED_PAGE_TITLE = 'Resultados Finalizados'
+_DASHBOARD_SNAPSHOT_PAGES = (
+    ('/', 'upcoming', UPCOMING_PAGE_TITLE),
+    ('/resultados', 'finished', FINISHED_PAGE_TITLE),
+)
+_dashboard_snapshots = {}
+_dashboard_snapshots_version = None
+_dashboard_snapshots_lock = threading.Lock()
+
+
+def _dashboard_version():
+    return data_store_version(), _template_mtime('index.html')
+
+
+def _dashboard_etag(version, path, page_mode, page_title, handicap_filter, goal_line_filter):
+    return make_etag('dashboard', version, path, page_mode, page_title, handicap_filter, goal_line_filter)
+
+
+def _common_dashboard_filters(limit=DASHBOARD_SNAPSHOT_TOP_FILTERS):
+    """Los valores de hándicap y de línea de goles con más partidos en el data store."""
+    data = load_data_from_file()
+    handicaps = Counter()
+    goal_lines = Counter()
+    for section in ('upcoming_matches', 'finished_matches'):
+        for entry in data.get(section, []):
+            handicap = normalize_handicap_to_half_bucket_str(entry.get('handicap'))
+            if handicap is not None:
+                handicaps[handicap] += 1
+            goal_line = _normalize_goal_line_option_str(entry.get('goal_line'))
+            if goal_line is not None:
+                goal_lines[goal_line] += 1
+    filters = [(None, None)]
+    filters += [(value, None) for value, _ in handicaps.most_common(limit)]
+    filters += [(None, value) for value, _ in goal_lines.most_common(limit)]
+    return filters
+
+
+def _rebuild_dashboard_snapshots(version):
+    try:
+        filters = _common_dashboard_filters()
+        for path, page_mode, page_title in _DASHBOARD_SNAPSHOT_PAGES:
+            for handicap_filter, goal_line_filter in filters:
+                if _dashboard_version() != version:
+                    return  # data.json volvió a cambiar: ya hay otra reconstrucción en marcha
+                with app.test_request_context(path):
+                    html = _build_matches_dashboard(page_mode, page_title, handicap_filter, goal_line_filter)
+                etag = _dashboard_etag(version, path, page_mode, page_title, handicap_filter, goal_line_filter)
+                with _dashboard_snapshots_lock:
+                    if _dashboard_snapshots_version == version:
+                        _dashboard_snapshots[etag] = html
+    except Exception as exc:
+        print(f"ERROR al precalcular las instantáneas del dashboard: {exc}")
+
+
+def _ensure_dashboard_snapshots(version):
+    """Descarta las instantáneas de otra versión y lanza la reconstrucción (una por versión)."""
+    global _dashboard_snapshots_version
+    with _dashboard_snapshots_lock:
+        if _dashboard_snapshots_version == version:
+            return
+        _dashboard_snapshots_version = version
+        evicted = len(_dashboard_snapshots)
+        _dashboard_snapshots.clear()
+    if evicted:
+        CACHE_EVICTIONS.inc(evicted, cache='dashboard')
+    threading.Thread(
+        target=_rebuild_dashboard_snapshots, args=(version,), name='dashboard-snapshots', daemon=True
+    ).start()
+
+
 def _render_matches_dashboard(page_mode='upcoming', page_title='Partidos'):
-    handicap_filter = request.args.get('handicap')
-    goal_line_filter = request.args.get('ou')
+    handicap_filter = request.args.get('handicap') or None
+    goal_line_filter = request.args.get('ou') or None
+    version = _dashboard_version()
+    _ensure_dashboard_snapshots(version)
+    etag = _dashboard_etag(version, request.path, page_mode, page_title, handicap_filter, goal_line_filter)
+    with _dashboard_snapshots_lock:
+        snapshot = _dashboard_snapshots.get(etag)
+    CACHE_REQUESTS.inc(cache='dashboard', result='hit' if snapshot is not None else 'miss')
+    if snapshot is not None:
+        return _conditional_response(etag, lambda: snapshot)
+    return _conditional_response(
+        etag, lambda: _build_matches_dashboard(page_mode, page_title, handicap_filter, goal_line_filter)
+    )
+
+
+def _build_matches_dashboard(page_mode, page_title, handicap_filter=None, goal_line_filter=None):
     error_msg = None
     try:
-        upcoming_matches, finished_matches = asyncio.run(
-            _fetch_sidebar_lists(handicap_filter, goal_line_filter)
-        )
+        upcoming_matches, finished_matches = _fetch_sidebar_lists(handicap_filter, goal_line_filter)
     except Exception as exc:
         print(f"ERROR al cargar datos para el dashboard: {exc}")
         upcoming_matches, finished_matches = [], []
@@ -658,19 +792,19 @@ def _render_matches_dashboard(page_mode='upcoming', page_title='Partidos'):
 @app.route('/')
 def index():
     print("Recibida petici�n para Pr�ximos Partidos...")
-    return _render_matches_dashboard('upcoming', 'Pr�ximos Partidos')
+    return _render_matches_dashboard('upcoming', UPCOMING_PAGE_TITLE)
 
 
 @app.route('/resultados')
 def resultados():
     print("Recibida petici�n para Partidos Finalizados...")
-    return _render_matches_dashboard('finished', 'Resultados Finalizados')
+    return _render_matches_dashboard('finished', FINISHED_PAGE_TITLE)
 
 
 @app.route('/proximos')
 def proximos():
     print("Recibida petici�n para /proximos")
-    return _render_matches_dashboard('upcoming', 'Pr�ximos Partidos')
+    return _render_matches_dashboard('upcoming', UPCOMING_PAGE_TITLE)
 
 @app.route('/api/matches')
 def api_matches():
@@ -678,7 +812,7 @@ def api_matches():
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_matches_async(limit, offset, request.args.get('handicap'), request.args.get('ou')))
+        matches = get_main_page_matches(limit, offset, request.args.get('handicap'), request.args.get('ou'))
         return jsonify({'matches': matches})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -689,7 +823,7 @@ def api_finished_matches():
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_finished_matches_async(limit, offset, request.args.get('handicap'), request.args.get('ou')))
+        matches = get_main_page_finished_matches(limit, offset, request.args.get('handicap'), request.args.get('ou'))
         return jsonify({'matches': matches})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -720,6 +854,18 @@ def api_preview_basico(match_id):
         return jsonify({'error': f'No se pudo cargar la vista previa: {exc}'}), 500
 
 
+def _stage_timings_requested():
+    value = (request.args.get('debug') or request.headers.get('X-Debug-Timings') or '').strip().lower()
+    return value in ('1', 'true', 'yes', 'timings')
+
+
+def _build_debug_meta(stage_timings, **extra):
+    meta = dict(extra)
+    if _stage_timings_requested():
+        meta['stage_timings'] = stage_timings
+    return meta
+
+
 def _select_default_match_id(preloaded_upcoming, preloaded_finished):
     if preloaded_upcoming:
         return preloaded_upcoming[0].get('id')
@@ -747,13 +893,18 @@ def mostrar_estudio(match_id):
     if not target_match_id:
         abort(404, description='No hay partidos disponibles para analizar.')
 
-    datos_partido = analizar_partido_completo(target_match_id)
+    datos_partido = _analizar_con_swr(target_match_id)
 
     if not datos_partido or "error" in datos_partido:
         error_message = (datos_partido or {}).get('error', 'Error desconocido')
         print(f"Error al obtener datos para {target_match_id}: {error_message}")
-        abort(500, description=error_message)
+        status = (datos_partido or {}).get('http_status', 500)
+        if status == 202:
+            return Response(f"{error_message} Recarga la página en unos segundos.", status=202,
+                            mimetype='text/plain', headers={'Retry-After': '10'})
+        abort(status, description=error_message)
 
+    datos_partido.pop('stage_timings', None)
     datos_partido['match_id'] = target_match_id
     print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
     return render_template(
@@ -766,6 +917,65 @@ def mostrar_estudio(match_id):
     )
 
 
+# HTML del panel ya renderizado, uno por partido. La clave incluye el mtime de la plantilla
+# y la versión del análisis (generated_at), así que un refresco lo invalida solo.
+PANEL_HTML_CACHE_MAX_ENTRIES = 128
+_ANALYSIS_PANEL_TEMPLATE = 'partials/analysis_panel.html'
+_panel_html_cache = {}
+_panel_html_cache_lock = threading.Lock()
+
+
+def _template_mtime(name):
+    try:
+        return (Path(app.root_path) / app.template_folder / name).stat().st_mtime
+    except OSError:
+        return None
+
+
+def _render_analysis_panel(match_id, datos_partido):
+    version = datos_partido.get('generated_at')
+    key = (_template_mtime(_ANALYSIS_PANEL_TEMPLATE), version)
+    if version is not None:
+        with _panel_html_cache_lock:
+            entry = _panel_html_cache.get(match_id)
+        if entry is not None and entry[0] == key:
+            CACHE_REQUESTS.inc(cache='panel_html', result='hit')
+            return entry[1]
+        CACHE_REQUESTS.inc(cache='panel_html', result='miss')
+    html = render_template(
+        _ANALYSIS_PANEL_TEMPLATE,
+        data=datos_partido,
+        format_ah=format_ah_as_decimal_string_of
+    )
+    if version is not None:
+        with _panel_html_cache_lock:
+            _panel_html_cache.pop(match_id, None)
+            _panel_html_cache[match_id] = (key, html)
+            while len(_panel_html_cache) > PANEL_HTML_CACHE_MAX_ENTRIES:
+                _panel_html_cache.pop(next(iter(_panel_html_cache)))
+                CACHE_EVICTIONS.inc(cache='panel_html')
+    return html
+
+
+def _build_estudio_panel_payload(match_id, datos_partido, start_time):
+    stage_timings = datos_partido.pop('stage_timings', None)
+    datos_partido['match_id'] = match_id
+    html = _render_analysis_panel(match_id, datos_partido)
+    elapsed = round(time.time() - start_time, 2)
+    return {
+        'html': html,
+        'match': {
+            'id': match_id,
+            'home': datos_partido.get('home_name'),
+            'away': datos_partido.get('away_name'),
+            'score': datos_partido.get('score'),
+            'time': datos_partido.get('time')
+        },
+        'cache': datos_partido.get('cache'),
+        'meta': _build_debug_meta(stage_timings, elapsed=elapsed)
+    }
+
+
 @app.route('/api/estudio_panel/<string:match_id>')
 def api_estudio_panel(match_id):
     """
@@ -773,30 +983,13 @@ def api_estudio_panel(match_id):
     """
     start_time = time.time()
     try:
-        datos_partido = analizar_partido_completo(match_id)
+        datos_partido = _analizar_con_swr(match_id)
         if not datos_partido or "error" in datos_partido:
-            error_message = (datos_partido or {}).get('error', 'No se pudo analizar el partido.')
-            return jsonify({'error': error_message}), 500
-
-        datos_partido['match_id'] = match_id
-        html = render_template(
-            'partials/analysis_panel.html',
-            data=datos_partido,
-            format_ah=format_ah_as_decimal_string_of
-        )
-        elapsed = round(time.time() - start_time, 2)
-        payload = {
-            'html': html,
-            'match': {
-                'id': match_id,
-                'home': datos_partido.get('home_name'),
-                'away': datos_partido.get('away_name'),
-                'score': datos_partido.get('score'),
-                'time': datos_partido.get('time')
-            },
-            'meta': {'elapsed': elapsed}
-        }
-        return jsonify(payload)
+            return _swr_error_response(datos_partido)
+        if datos_partido.get('generated_at') is None or _stage_timings_requested():
+            return jsonify(_build_estudio_panel_payload(match_id, datos_partido, start_time))
+        etag = make_etag('estudio_panel', match_id, datos_partido['generated_at'], _template_mtime(_ANALYSIS_PANEL_TEMPLATE))
+        return _conditional_response(etag, lambda: jsonify(_build_estudio_panel_payload(match_id, datos_partido, start_time)))
     except Exception as exc:
         logging.exception("Error generando el panel dinámico para %s", match_id)
         return jsonify({'error': f'No se pudo renderizar el análisis: {exc}'}), 500
@@ -830,285 +1023,634 @@ def api_preview(match_id):
     Devuelve los datos en formato JSON.
     """
     try:
-        preview_data = analizar_partido_completo(match_id)
+        preview_data = _analizar_con_swr(match_id)
         if "error" in preview_data:
-            return jsonify(preview_data), 500
+            return _swr_error_response(preview_data)
+        stage_timings = preview_data.pop('stage_timings', None)
+        if _stage_timings_requested():
+            preview_data['meta'] = _build_debug_meta(stage_timings)
         return jsonify(preview_data)
     except Exception as e:
         print(f"Error en la ruta /api/preview/{match_id}: {e}")
         return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
 
+def _build_analysis_payload(match_id):
+    """
+    Ejecuta el scraping completo y construye el payload de /api/analisis.
+    Devuelve (payload, stage_timings); en caso de fallo el payload lleva la clave 'error'.
+    """
+    datos = analizar_partido_completo(match_id)
+    if not datos or (isinstance(datos, dict) and datos.get('error')):
+        return {'error': (datos or {}).get('error', 'No se pudieron obtener datos.')}, None
+    stage_timings = datos.pop('stage_timings', None)
+
+    # --- Lógica para el payload complejo (la original) ---
+    def df_to_rows(df):
+        rows = []
+        try:
+            if df is not None and hasattr(df, 'iterrows'):
+                for idx, row in df.iterrows():
+                    label = str(idx)
+                    label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
+                    try:
+                        home_val = row['Casa']
+                    except Exception:
+                        home_val = ''
+                    try:
+                        away_val = row['Fuera']
+                    except Exception:
+                        away_val = ''
+                    rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
+        except Exception:
+            pass
+        return rows
+
+    payload = {
+        'match_id': match_id,
+        'home_team': datos.get('home_name', ''),
+        'away_team': datos.get('away_name', ''),
+        'final_score': datos.get('score'),
+        'match_date': datos.get('match_date'),
+        'match_time': datos.get('match_time'),
+        'match_datetime': datos.get('match_datetime'),
+        'recent_indirect_full': {
+            'last_home': None,
+            'last_away': None,
+            'h2h_col3': None
+        },
+        'comparativas_indirectas': {
+            'left': None,
+            'right': None
+        }
+    }
+    
+    # --- START COVERAGE CALCULATION ---
+    main_odds = datos.get("main_match_odds_data")
+    home_name = datos.get("home_name")
+    away_name = datos.get("away_name")
+    ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
+    
+    favorito_actual_name = "Ninguno (línea en 0)"
+    if ah_actual_num is not None:
+        if ah_actual_num > 0: favorito_actual_name = home_name
+        elif ah_actual_num < 0: favorito_actual_name = away_name
+
+    def get_cover_status_vs_current(details):
+        if not details or ah_actual_num is None:
+            return 'NEUTRO'
+        try:
+            score_str = details.get('score', '').replace(' ', '').replace(':', '-')
+            if not score_str or '?' in score_str:
+                return 'NEUTRO'
+
+            h_home = details.get('home_team')
+            h_away = details.get('away_team')
+            
+            status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
+            return status
+        except Exception:
+            return 'NEUTRO'
+            
+    # --- Análisis mejorado de H2H Rivales ---
+    def analyze_h2h_rivals(home_result, away_result):
+        if not home_result or not away_result:
+            return None
+            
+        try:
+            # Obtener resultados de los partidos
+            home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
+            away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
+            
+            # Calcular diferencia de goles
+            home_goal_diff = home_goals[0] - home_goals[1]
+            away_goal_diff = away_goals[0] - away_goals[1]
+            
+            # Comparar resultados
+            if home_goal_diff > away_goal_diff:
+                return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
+            elif away_goal_diff > home_goal_diff:
+                return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
+            else:
+                return "Los rivales han tenido resultados similares"
+        except Exception:
+            return None
+            
+    # --- Análisis de Comparativas Indirectas ---
+    def analyze_indirect_comparison(result, team_name):
+        if not result:
+            return None
+            
+        try:
+            # Determinar si el equipo cubrió el handicap
+            status = get_cover_status_vs_current(result)
+            
+            if status == 'CUBIERTO':
+                return f"Contra este rival, {team_name} habría cubierto el handicap"
+            elif status == 'NO CUBIERTO':
+                return f"Contra este rival, {team_name} no habría cubierto el handicap"
+            else:
+                return f"Contra este rival, el resultado para {team_name} sería indeterminado"
+        except Exception:
+            return None
+    # --- END COVERAGE CALCULATION ---
+
+    last_home = (datos.get('last_home_match') or {})
+    last_home_details = last_home.get('details') or {}
+    if last_home_details:
+        payload['recent_indirect_full']['last_home'] = {
+            'home': last_home_details.get('home_team'),
+            'away': last_home_details.get('away_team'),
+            'score': (last_home_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
+            'ou': last_home_details.get('ouLine') or '-',
+            'stats_rows': df_to_rows(last_home.get('stats')),
+            'date': last_home_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_home_details)
+        }
+
+    last_away = (datos.get('last_away_match') or {})
+    last_away_details = last_away.get('details') or {}
+    if last_away_details:
+        payload['recent_indirect_full']['last_away'] = {
+            'home': last_away_details.get('home_team'),
+            'away': last_away_details.get('away_team'),
+            'score': (last_away_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
+            'ou': last_away_details.get('ouLine') or '-',
+            'stats_rows': df_to_rows(last_away.get('stats')),
+            'date': last_away_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_away_details)
+        }
+
+    h2h_col3 = (datos.get('h2h_col3') or {})
+    h2h_col3_details = h2h_col3.get('details') or {}
+    if h2h_col3_details and h2h_col3_details.get('status') == 'found':
+        h2h_col3_details_adapted = {
+            'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
+            'home_team': h2h_col3_details.get('h2h_home_team_name'),
+            'away_team': h2h_col3_details.get('h2h_away_team_name')
+        }
+        payload['recent_indirect_full']['h2h_col3'] = {
+            'home': h2h_col3_details.get('h2h_home_team_name'),
+            'away': h2h_col3_details.get('h2h_away_team_name'),
+            'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
+            'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
+            'ou': h2h_col3_details.get('ou_result') or '-',
+            'stats_rows': df_to_rows(h2h_col3.get('stats')),
+            'date': h2h_col3_details.get('date'),
+            'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
+            'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
+        }
+
+    h2h_general = (datos.get('h2h_general') or {})
+    h2h_general_details = h2h_general.get('details') or {}
+    if h2h_general_details:
+        score_text = h2h_general_details.get('res6') or ''
+        cover_input = {
+            'score': score_text,
+            'home_team': h2h_general_details.get('h2h_gen_home'),
+            'away_team': h2h_general_details.get('h2h_gen_away')
+        }
+        payload['recent_indirect_full']['h2h_general'] = {
+            'home': h2h_general_details.get('h2h_gen_home'),
+            'away': h2h_general_details.get('h2h_gen_away'),
+            'score': score_text.replace(':', ' : '),
+            'ah': h2h_general_details.get('ah6') or '-',
+            'ou': h2h_general_details.get('ou_result6') or '-',
+            'stats_rows': df_to_rows(h2h_general.get('stats')),
+            'date': h2h_general_details.get('date'),
+            'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
+        }
+
+    comp_left = (datos.get('comp_L_vs_UV_A') or {})
+    comp_left_details = comp_left.get('details') or {}
+    if comp_left_details:
+        payload['comparativas_indirectas']['left'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_left_details.get('home_team'),
+            'away_team': comp_left_details.get('away_team'),
+            'score': (comp_left_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
+            'ou': comp_left_details.get('ou_line') or '-',
+            'localia': comp_left_details.get('localia') or '',
+            'stats_rows': df_to_rows(comp_left.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_left_details),
+            'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
+        }
+
+    comp_right = (datos.get('comp_V_vs_UL_H') or {})
+    comp_right_details = comp_right.get('details') or {}
+    if comp_right_details:
+        payload['comparativas_indirectas']['right'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_right_details.get('home_team'),
+            'away_team': comp_right_details.get('away_team'),
+            'score': (comp_right_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
+            'ou': comp_right_details.get('ou_line') or '-',
+            'localia': comp_right_details.get('localia') or '',
+            'stats_rows': df_to_rows(comp_right.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_right_details),
+            'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
+        }
+
+    # --- Lógica para el HTML simplificado ---
+    h2h_data = datos.get("h2h_data")
+    simplified_html = ""
+    if all([main_odds, h2h_data, home_name, away_name]):
+        simplified_html = generar_analisis_completo_mercado(main_odds, h2h_data, home_name, away_name)
+    
+    payload['simplified_html'] = simplified_html
+
+    return payload, stage_timings
+
+
+def _run_analysis_job(match_id):
+    """Trabajo de la cola: analiza, guarda en la caché de disco y devuelve el payload."""
+    start_time = time.time()
+    logging.warning(f"CACHE MISS para {match_id}. Iniciando análisis profundo...")
+    payload, stage_timings = _build_analysis_payload(match_id)
+    if payload.get('error'):
+        return payload
+    save_preview_to_cache(match_id, payload)
+    elapsed = time.time() - start_time
+    logging.warning(f"[PERFORMANCE] El análisis completo para el partido {match_id} tardó {elapsed:.2f} segundos.")
+    return dict(payload, stage_timings=stage_timings, elapsed=round(elapsed, 2))
+
+
+ANALYSIS_JOB_WORKERS = 1
+ANALYSIS_JOB_MAX_PENDING = 32
+ANALYSIS_JOB_WAIT_SECONDS = 280
+
+analysis_jobs = AnalysisJobQueue(
+    _run_analysis_job,
+    workers=ANALYSIS_JOB_WORKERS,
+    max_pending=ANALYSIS_JOB_MAX_PENDING,
+)
+gauge('app_analysis_jobs', 'Trabajos de análisis por estado.', ('state',),
+      callback=lambda: {(state,): value for state, value in analysis_jobs.stats().items() if state in ('pending', 'running')})
+
+# Opt-in: con la precarga activa, la primera visita arranca análisis en segundo plano contra NowGoal.
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', '0').strip().lower() not in ('0', 'false', 'no')
+PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N', 8))
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', 1))
+PREFETCH_MIN_INTERVAL_SECONDS = float(os.environ.get('PREFETCH_MIN_INTERVAL_SECONDS', 20))
+PREFETCH_IDLE_SECONDS = float(os.environ.get('PREFETCH_IDLE_SECONDS', 30))
+_PREFETCH_PASSIVE_PREFIXES = ('/static/', '/metrics', '/api/jobs/', '/api/debug/')
+
+
+def _list_prefetch_candidates():
+    # time_obj es el data-t de NowGoal en UTC (el panel le suma 2 h solo al mostrarlo),
+    # igual que el utcnow() con el que compara el planificador.
+    upcoming = _filter_and_slice_matches('upcoming_matches', limit=PREFETCH_TOP_N * 3)
+    return [(str(entry.get('id')), _parse_time_obj(entry.get('time_obj'))) for entry in upcoming if entry.get('id')]
+
+
+prefetcher = PrefetchScheduler(
+    _list_prefetch_candidates,
+    lambda match_id: analysis_jobs.submit(match_id, PRIORITY_PREFETCH),
+    get_preview_cache_age,
+    top_n=PREFETCH_TOP_N,
+    concurrency=PREFETCH_CONCURRENCY,
+    min_interval_seconds=PREFETCH_MIN_INTERVAL_SECONDS,
+    idle_seconds=PREFETCH_IDLE_SECONDS,
+)
+
+
+@app.before_request
+def _track_interactive_traffic():
+    if request.path.startswith(_PREFETCH_PASSIVE_PREFIXES):
+        return
+    prefetcher.notify_interactive()
+    if PREFETCH_ENABLED:
+        prefetcher.start()
+
+
+# --- Stale-while-revalidate de los análisis ---
+# Hasta ANALYSIS_CACHE_TTL_SECONDS la caché está fresca; hasta ANALYSIS_MAX_STALENESS_SECONDS
+# se sirve caducada mientras la cola la refresca en segundo plano; después se espera al análisis.
+# Los partidos terminados no caducan.
+ANALYSIS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYSIS_MAX_STALENESS_SECONDS', '3600'))
+
+CACHE_FRESH = 'fresh'
+CACHE_STALE = 'stale'
+CACHE_EXPIRED = 'expired'
+
+
+def _is_finished_match(match_id):
+    _, section = _find_match_basic_data(match_id)
+    return section == 'finished_matches'
+
+
+def _classify_cache_age(age, immutable=False):
+    if age is None:
+        return CACHE_EXPIRED
+    if immutable or age <= ANALYSIS_CACHE_TTL_SECONDS:
+        return CACHE_FRESH
+    if age <= ANALYSIS_MAX_STALENESS_SECONDS:
+        return CACHE_STALE
+    return CACHE_EXPIRED
+
+
+def _cache_marker(age, state, refreshing=False):
+    return {
+        'age_seconds': round(age, 1) if age is not None else None,
+        'stale': state == CACHE_STALE,
+        'refreshing': refreshing,
+    }
+
+
+def _revalidate_in_background(match_id):
+    """Encola el refresco con prioridad baja; la cola ya deduplica por partido."""
+    return analysis_jobs.submit(match_id, PRIORITY_PREFETCH) is not None
+
+
+def _analizar_con_swr(match_id):
+    """
+    analizar_partido_completo con stale-while-revalidate sobre la caché en memoria del scraper.
+    El resultado lleva la clave 'cache' con la antigüedad de lo servido. Sin caché utilizable
+    el análisis pasa por la cola, nunca por el hilo de la petición; si no llega a tiempo se
+    devuelve un error con 'http_status' (503 cola llena, 202 sigue en curso).
+    """
+    match_id = "".join(filter(str.isdigit, str(match_id)))
+    if not match_id:
+        return {'error': 'ID de partido inválido.', 'http_status': 400}
+    cached, age, immutable = get_cached_analysis_with_age(match_id)
+    if cached is not None:
+        state = _classify_cache_age(age, immutable or _is_finished_match(match_id))
+        if state == CACHE_FRESH:
+            cached['cache'] = _cache_marker(age, state)
+            return cached
+        if state == CACHE_STALE:
+            cached['cache'] = _cache_marker(age, state, refreshing=_revalidate_in_background(match_id))
+            return cached
+    # La cola deduplica por partido: si ya hay un refresco en curso, reenviarlo como
+    # interactivo le sube la prioridad y se espera a ese mismo trabajo.
+    job = analysis_jobs.submit(match_id, PRIORITY_INTERACTIVE)
+    if job is None:
+        return {'error': 'La cola de análisis está llena, inténtalo más tarde.', 'http_status': 503}
+    if not job.wait(ANALYSIS_JOB_WAIT_SECONDS):
+        return {'error': 'El análisis sigue en curso.', 'job_id': job.id, 'http_status': 202}
+    if job.status != JOB_DONE:
+        return {'error': job.error or 'No se pudo analizar el partido.'}
+    # El trabajo deja el análisis en la caché en memoria del scraper.
+    datos, _, _ = get_cached_analysis_with_age(match_id)
+    if datos is None:
+        return {'error': 'No se pudo recuperar el análisis.'}
+    datos['cache'] = _cache_marker(0.0, CACHE_FRESH)
+    return datos
+
+
+def _swr_error_response(datos):
+    """Respuesta JSON para un error de _analizar_con_swr, con su código (500 por defecto)."""
+    datos = datos or {}
+    body = {'error': datos.get('error', 'No se pudo analizar el partido.')}
+    if datos.get('job_id'):
+        body['job_id'] = datos['job_id']
+    return jsonify(body), datos.get('http_status', 500)
+
+
+def _load_servable_preview(match_id):
+    """Payload de la caché de disco si aún se puede servir (fresco o caducado), con su marca 'cache'."""
+    cached_payload = load_preview_from_cache(match_id)
+    if not (isinstance(cached_payload, dict) and cached_payload.get('home_team')):
+        return None
+    age = get_preview_cache_age(match_id)
+    state = _classify_cache_age(age, _is_finished_match(match_id))
+    if state == CACHE_EXPIRED:
+        return None
+    refreshing = state == CACHE_STALE and _revalidate_in_background(match_id)
+    cached_payload['cache'] = _cache_marker(age, state, refreshing)
+    return cached_payload
+
+
+def _job_result_payload(job):
+    if job.status != JOB_DONE:
+        return {'error': job.error}
+    result = {k: v for k, v in dict(job.result).items() if k not in ('stage_timings', 'elapsed')}
+    result['cache'] = _cache_marker(0.0, CACHE_FRESH)
+    return result
+
+
 @app.route('/api/analisis/<string:match_id>')
 def api_analisis(match_id):
     """
     Servicio de analisis profundo bajo demanda.
     Devuelve tanto el payload complejo como el HTML simplificado.
     """
+    # Mismo id que /start_analysis_background y el stream: la cola deduplica por él.
+    match_id = "".join(filter(str.isdigit, match_id))
+    if not match_id:
+        return jsonify({'error': 'ID de partido inválido.'}), 400
     try:
-        cached_payload = load_preview_from_cache(match_id)
-        if isinstance(cached_payload, dict) and cached_payload.get('home_team'):
-            print(f"Devolviendo analisis cacheado para {match_id}")
-            return jsonify(cached_payload)
+        cached_payload = _load_servable_preview(match_id)
+        if cached_payload is not None:
+            print(f"Devolviendo analisis cacheado para {match_id} ({'stale' if cached_payload['cache']['stale'] else 'fresh'})")
+            if _stage_timings_requested():
+                cached_payload['meta'] = _build_debug_meta(None, cached=True)
+                return jsonify(cached_payload)
+            # La versión es la de la entrada de caché en disco (su antigüedad no cuenta).
+            etag = make_etag('analisis', match_id, _preview_cache_version(match_id))
+            return _conditional_response(etag, lambda: jsonify(cached_payload))
+
+        # Pasa por la cola para no competir con los análisis en segundo plano por el driver.
+        job = analysis_jobs.submit(match_id, PRIORITY_INTERACTIVE)
+        if job is None:
+            return jsonify({'error': 'La cola de análisis está llena, inténtalo más tarde.'}), 503
+        if not job.wait(ANALYSIS_JOB_WAIT_SECONDS):
+            return jsonify({'error': 'El análisis sigue en curso.', 'job_id': job.id}), 202
+        result = dict(job.result) if job.status == JOB_DONE else {'error': job.error}
+
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 500
+
+        stage_timings = result.pop('stage_timings', None)
+        elapsed = result.pop('elapsed', None)
+        result['cache'] = _cache_marker(0.0, CACHE_FRESH)
+        if _stage_timings_requested():
+            result['meta'] = _build_debug_meta(stage_timings, elapsed=elapsed, cached=False)
+        return jsonify(result)
 
-        start_time = time.time()
-        logging.warning(f"CACHE MISS para {match_id}. Iniciando análisis profundo...")
+    except Exception as e:
+        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
+        return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
-        datos = analizar_partido_completo(match_id)
-        if not datos or (isinstance(datos, dict) and datos.get('error')):
-            return jsonify({'error': (datos or {}).get('error', 'No se pudieron obtener datos.')}), 500
+ANALYSIS_STREAM_KEEPALIVE_SECONDS = 15
 
-        # --- Lógica para el payload complejo (la original) ---
-        def df_to_rows(df):
-            rows = []
-            try:
-                if df is not None and hasattr(df, 'iterrows'):
-                    for idx, row in df.iterrows():
-                        label = str(idx)
-                        label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
-                        try:
-                            home_val = row['Casa']
-                        except Exception:
-                            home_val = ''
-                        try:
-                            away_val = row['Fuera']
-                        except Exception:
-                            away_val = ''
-                        rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
-            except Exception:
-                pass
-            return rows
 
-        payload = {
-            'match_id': match_id,
-            'home_team': datos.get('home_name', ''),
-            'away_team': datos.get('away_name', ''),
-            'final_score': datos.get('score'),
-            'match_date': datos.get('match_date'),
-            'match_time': datos.get('match_time'),
-            'match_datetime': datos.get('match_datetime'),
-            'recent_indirect_full': {
-                'last_home': None,
-                'last_away': None,
-                'h2h_col3': None
-            },
-            'comparativas_indirectas': {
-                'left': None,
-                'right': None
-            }
-        }
-        
-        # --- START COVERAGE CALCULATION ---
-        main_odds = datos.get("main_match_odds_data")
-        home_name = datos.get("home_name")
-        away_name = datos.get("away_name")
-        ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
-        
-        favorito_actual_name = "Ninguno (línea en 0)"
-        if ah_actual_num is not None:
-            if ah_actual_num > 0: favorito_actual_name = home_name
-            elif ah_actual_num < 0: favorito_actual_name = away_name
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
-        def get_cover_status_vs_current(details):
-            if not details or ah_actual_num is None:
-                return 'NEUTRO'
-            try:
-                score_str = details.get('score', '').replace(' ', '').replace(':', '-')
-                if not score_str or '?' in score_str:
-                    return 'NEUTRO'
-
-                h_home = details.get('home_team')
-                h_away = details.get('away_team')
-                
-                status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
-                return status
-            except Exception:
-                return 'NEUTRO'
-                
-        # --- Análisis mejorado de H2H Rivales ---
-        def analyze_h2h_rivals(home_result, away_result):
-            if not home_result or not away_result:
-                return None
-                
-            try:
-                # Obtener resultados de los partidos
-                home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
-                away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
-                
-                # Calcular diferencia de goles
-                home_goal_diff = home_goals[0] - home_goals[1]
-                away_goal_diff = away_goals[0] - away_goals[1]
-                
-                # Comparar resultados
-                if home_goal_diff > away_goal_diff:
-                    return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
-                elif away_goal_diff > home_goal_diff:
-                    return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
-                else:
-                    return "Los rivales han tenido resultados similares"
-            except Exception:
-                return None
-                
-        # --- Análisis de Comparativas Indirectas ---
-        def analyze_indirect_comparison(result, team_name):
-            if not result:
-                return None
-                
-            try:
-                # Determinar si el equipo cubrió el handicap
-                status = get_cover_status_vs_current(result)
-                
-                if status == 'CUBIERTO':
-                    return f"Contra este rival, {team_name} habría cubierto el handicap"
-                elif status == 'NO CUBIERTO':
-                    return f"Contra este rival, {team_name} no habría cubierto el handicap"
-                else:
-                    return f"Contra este rival, el resultado para {team_name} sería indeterminado"
-            except Exception:
-                return None
-        # --- END COVERAGE CALCULATION ---
-
-        last_home = (datos.get('last_home_match') or {})
-        last_home_details = last_home.get('details') or {}
-        if last_home_details:
-            payload['recent_indirect_full']['last_home'] = {
-                'home': last_home_details.get('home_team'),
-                'away': last_home_details.get('away_team'),
-                'score': (last_home_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
-                'ou': last_home_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_home.get('stats')),
-                'date': last_home_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_home_details)
-            }
-
-        last_away = (datos.get('last_away_match') or {})
-        last_away_details = last_away.get('details') or {}
-        if last_away_details:
-            payload['recent_indirect_full']['last_away'] = {
-                'home': last_away_details.get('home_team'),
-                'away': last_away_details.get('away_team'),
-                'score': (last_away_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
-                'ou': last_away_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_away.get('stats')),
-                'date': last_away_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_away_details)
-            }
-
-        h2h_col3 = (datos.get('h2h_col3') or {})
-        h2h_col3_details = h2h_col3.get('details') or {}
-        if h2h_col3_details and h2h_col3_details.get('status') == 'found':
-            h2h_col3_details_adapted = {
-                'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
-                'home_team': h2h_col3_details.get('h2h_home_team_name'),
-                'away_team': h2h_col3_details.get('h2h_away_team_name')
-            }
-            payload['recent_indirect_full']['h2h_col3'] = {
-                'home': h2h_col3_details.get('h2h_home_team_name'),
-                'away': h2h_col3_details.get('h2h_away_team_name'),
-                'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
-                'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
-                'ou': h2h_col3_details.get('ou_result') or '-',
-                'stats_rows': df_to_rows(h2h_col3.get('stats')),
-                'date': h2h_col3_details.get('date'),
-                'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
-                'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
-            }
-
-        h2h_general = (datos.get('h2h_general') or {})
-        h2h_general_details = h2h_general.get('details') or {}
-        if h2h_general_details:
-            score_text = h2h_general_details.get('res6') or ''
-            cover_input = {
-                'score': score_text,
-                'home_team': h2h_general_details.get('h2h_gen_home'),
-                'away_team': h2h_general_details.get('h2h_gen_away')
-            }
-            payload['recent_indirect_full']['h2h_general'] = {
-                'home': h2h_general_details.get('h2h_gen_home'),
-                'away': h2h_general_details.get('h2h_gen_away'),
-                'score': score_text.replace(':', ' : '),
-                'ah': h2h_general_details.get('ah6') or '-',
-                'ou': h2h_general_details.get('ou_result6') or '-',
-                'stats_rows': df_to_rows(h2h_general.get('stats')),
-                'date': h2h_general_details.get('date'),
-                'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
-            }
-
-        comp_left = (datos.get('comp_L_vs_UV_A') or {})
-        comp_left_details = comp_left.get('details') or {}
-        if comp_left_details:
-            payload['comparativas_indirectas']['left'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_left_details.get('home_team'),
-                'away_team': comp_left_details.get('away_team'),
-                'score': (comp_left_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
-                'ou': comp_left_details.get('ou_line') or '-',
-                'localia': comp_left_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_left.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_left_details),
-                'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
-            }
-
-        comp_right = (datos.get('comp_V_vs_UL_H') or {})
-        comp_right_details = comp_right.get('details') or {}
-        if comp_right_details:
-            payload['comparativas_indirectas']['right'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_right_details.get('home_team'),
-                'away_team': comp_right_details.get('away_team'),
-                'score': (comp_right_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
-                'ou': comp_right_details.get('ou_line') or '-',
-                'localia': comp_right_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_right.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_right_details),
-                'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
-            }
-
-        # --- Lógica para el HTML simplificado ---
-        h2h_data = datos.get("h2h_data")
-        simplified_html = ""
-        if all([main_odds, h2h_data, home_name, away_name]):
-            simplified_html = generar_analisis_completo_mercado(main_odds, h2h_data, home_name, away_name)
-        
-        payload['simplified_html'] = simplified_html
 
-        save_preview_to_cache(match_id, payload)
+@app.route('/api/analisis/<string:match_id>/stream')
+def api_analisis_stream(match_id):
+    """
+    Progreso del análisis por Server-Sent Events: un evento 'stage' por etapa (con su payload
+    parcial) y un 'result' final con el panel renderizado. Si ya hay un análisis en curso
+    para el partido, el stream se engancha a él y repite las etapas ya emitidas.
+    """
+    match_id = "".join(filter(str.isdigit, match_id))
+    if not match_id:
+        return jsonify({'error': 'ID de partido inválido.'}), 400
+    start_time = time.time()
+
+    def panel_result():
+        datos_partido = _analizar_con_swr(match_id)
+        if not datos_partido or datos_partido.get('error'):
+            return _sse('failed', {'error': (datos_partido or {}).get('error', 'No se pudo analizar el partido.')})
+        return _sse('result', _build_estudio_panel_payload(match_id, datos_partido, start_time))
+
+    def generate():
+        cached, age, immutable = get_cached_analysis_with_age(match_id)
+        if cached is not None and _classify_cache_age(age, immutable or _is_finished_match(match_id)) != CACHE_EXPIRED:
+            yield panel_result()
+            return
+        job = analysis_jobs.submit(match_id, PRIORITY_INTERACTIVE)
+        if job is None:
+            yield _sse('failed', {'error': 'La cola de análisis está llena, inténtalo más tarde.'})
+            return
+        yield _sse('job', job.to_dict())
+        sent = 0
+        deadline = time.monotonic() + ANALYSIS_JOB_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            events = job.events_since(sent, ANALYSIS_STREAM_KEEPALIVE_SECONDS)
+            for event in events:
+                yield _sse('stage', event, sent)
+                sent += 1
+            if job.finished and len(job.events) <= sent:
+                break
+            if not events:
+                yield ": keepalive\n\n"
+        if not job.finished:
+            yield _sse('pending', {'job_id': job.id})
+        elif job.status != JOB_DONE:
+            yield _sse('failed', {'error': job.error})
+        else:
+            yield panel_result()
 
-        end_time = time.time()
-        elapsed = end_time - start_time
-        logging.warning(f"[PERFORMANCE] El análisis completo para el partido {match_id} tardó {elapsed:.2f} segundos.")
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-        return jsonify(payload)
 
-    except Exception as e:
-        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
-        return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
+ANALYSIS_BATCH_MAX_IDS = 50
+ANALYSIS_BATCH_POLL_SECONDS = 0.25
+
+
+@app.route('/api/analisis/batch', methods=['POST'])
+def api_analisis_batch():
+    """
+    Análisis de varios partidos en una sola petición, en NDJSON (una línea por partido).
+    Los cacheados salen al momento; el resto se encola y cada línea se envía al terminar.
+    """
+    raw_ids = (request.get_json(silent=True) or {}).get('match_ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return jsonify({'error': 'Se esperaba una lista match_ids.'}), 400
+    match_ids = list(dict.fromkeys("".join(filter(str.isdigit, str(mid))) for mid in raw_ids))
+    match_ids = [mid for mid in match_ids if mid]
+    if len(match_ids) > ANALYSIS_BATCH_MAX_IDS:
+        return jsonify({'error': f'Como máximo {ANALYSIS_BATCH_MAX_IDS} partidos por petición.'}), 400
+
+    def line(match_id, status, **fields):
+        return json.dumps(dict(match_id=match_id, status=status, **fields), ensure_ascii=False) + "\n"
+
+    def generate():
+        pending = {}
+        for match_id in match_ids:
+            cached_payload = _load_servable_preview(match_id)
+            if cached_payload is not None:
+                yield line(match_id, 'ok', cached=True, result=cached_payload)
+                continue
+            # La cola limita la concurrencia total: sus trabajadores son los únicos que analizan.
+            job = analysis_jobs.submit(match_id, PRIORITY_BATCH)
+            if job is None:
+                yield line(match_id, 'rejected', error='La cola de análisis está llena.')
+            else:
+                pending[match_id] = job
+
+        deadline = time.monotonic() + ANALYSIS_JOB_WAIT_SECONDS
+        while pending and time.monotonic() < deadline:
+            for match_id, job in list(pending.items()):
+                if not job.finished:
+                    continue
+                del pending[match_id]
+                result = _job_result_payload(job)
+                if result.get('error'):
+                    yield line(match_id, 'error', error=result['error'])
+                else:
+                    yield line(match_id, 'ok', cached=False, result=result)
+            if pending:
+                next(iter(pending.values())).wait(ANALYSIS_BATCH_POLL_SECONDS)
+        for match_id, job in pending.items():
+            yield line(match_id, 'pending', job_id=job.id)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 
 @app.route('/start_analysis_background', methods=['POST'])
 def start_analysis_background():
-    match_id = request.json.get('match_id')
+    match_id = (request.get_json(silent=True) or {}).get('match_id')
     if not match_id:
         return jsonify({'status': 'error', 'message': 'No se proporcionó match_id'}), 400
 
-    def analysis_worker(app, match_id):
-        with app.app_context():
-            print(f"Iniciando análisis en segundo plano para el ID: {match_id}")
-            try:
-                analizar_partido_completo(match_id)
-                print(f"Análisis en segundo plano finalizado para el ID: {match_id}")
-            except Exception as e:
-                print(f"Error en el hilo de análisis para el ID {match_id}: {e}")
+    cleaned_match_id = "".join(filter(str.isdigit, str(match_id)))
+    if not cleaned_match_id:
+        return jsonify({'status': 'error', 'message': 'match_id inválido'}), 400
+
+    job = analysis_jobs.submit(cleaned_match_id, PRIORITY_INTERACTIVE)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'La cola de análisis está llena, inténtalo más tarde.'}), 503
+
+    return jsonify({
+        'status': 'success',
+        'message': f'Análisis iniciado para el partido {cleaned_match_id}',
+        'job_id': job.id,
+        'job_status': job.status,
+    })
 
-    thread = threading.Thread(target=analysis_worker, args=(app, match_id))
-    thread.start()
 
-    return jsonify({'status': 'success', 'message': f'Análisis iniciado para el partido {match_id}'})
+@app.route('/api/jobs/<string:job_id>')
+def api_job_status(job_id):
+    """
+    Estado (y resultado, cuando ha terminado) de un trabajo de análisis.
+    """
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo no encontrado.'}), 404
+    data = job.to_dict(include_result=True)
+    if isinstance(data.get('result'), dict):
+        data['result'] = {k: v for k, v in data['result'].items() if k not in ('stage_timings', 'elapsed')}
+    return jsonify(data)
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/debug/profiles')
+def api_debug_profiles():
+    """
+    Lista los perfiles guardados (requiere token de administración).
+    """
+    if not _admin_token_ok():
+        return jsonify({'error': 'No autorizado.'}), 403
+    return jsonify({'directory': str(PROFILE_DIR), 'profiles': list_profiles()})
+
+
+@app.route('/api/debug/profiles/<path:filename>')
+def api_debug_profile_file(filename):
+    if not _admin_token_ok():
+        return jsonify({'error': 'No autorizado.'}), 403
+    return send_from_directory(PROFILE_DIR, filename, as_attachment=True)
+
+@app.route('/api/debug/stage_timings')
+def api_debug_stage_timings():
+    """
+    Agregado en proceso de los tramos medidos por analizar_partido_completo.
+    """
+    return jsonify({'stages': get_stage_summary()})
 
 @app.route('/api/handicap_analysis/<string:match_id>')
 def api_handicap_analysis(match_id):
@@ -1,8 +1,8 @@
 # modules/analisis_reciente.py
-import re
-import math
-from bs4 import BeautifulSoup
-from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
+import numpy as np
+from modules.cobertura import ah_cover_codes, outcome_sign
+from modules.historial import history_store
+from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of
 
 def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=True):
     """
@@ -18,91 +18,39 @@ def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=Tru
     """
     # Determinar qué tabla usar según si es equipo local o visitante
     table_id = "table_v1" if is_home_team else "table_v2"
-    table = soup.find("table", id=table_id)
+    table = history_store(soup).table(table_id)
     
-    if not table:
+    if table is None:
         return {"error": "No se encontró la tabla de partidos recientes"}
     
-    # Extraer los últimos 5 partidos del equipo
-    matches = []
-    score_selector = 'fscore_1' if is_home_team else 'fscore_2'
-    
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if len(matches) >= 5:  # Limitar a los últimos 5 partidos
-            break
-            
-        # Extraer información del partido
-        cells = row.find_all('td')
-        if len(cells) < 12:
-            continue
-            
-        # Obtener nombres de equipos
-        home_team_cell = cells[2]
-        away_team_cell = cells[4]
-        
-        home_team = home_team_cell.get_text(strip=True)
-        away_team = away_team_cell.get_text(strip=True)
-        
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
-            continue
-            
-        # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
-            continue
-            
-        score_raw = score_span.get_text(strip=True)
-        if '-' not in score_raw:
-            continue
-            
-        # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
-        
-        matches.append({
-            'home_team': home_team,
-            'away_team': away_team,
-            'score': score_raw,
-            'ah_line_raw': ah_line_raw,
-            'ah_line_num': parse_ah_to_number_of(ah_line_raw)
-        })
+    # Los últimos 5 partidos del equipo con marcador
+    rows = np.flatnonzero(table.team_mask(team_name) & table.scored_mask())[:5]
     
     # Analizar el rendimiento
     analysis = {
         'team_name': team_name,
-        'total_matches': len(matches),
+        'total_matches': len(rows),
         'covered': 0,
         'not_covered': 0,
         'push': 0,
         'details': []
     }
     
-    for match in matches:
-        # Determinar quién era el favorito
-        favorito_name = None
-        if match['ah_line_num'] is not None:
-            if match['ah_line_num'] > 0:
-                favorito_name = match['home_team']
-            elif match['ah_line_num'] < 0:
-                favorito_name = match['away_team']
-                
-        # Verificar si el equipo cubrió el handicap
-        resultado = check_handicap_cover(
-            match['score'], 
-            match['ah_line_num'] if match['ah_line_num'] is not None else 0,
-            favorito_name or "",
-            match['home_team'],
-            match['away_team'],
-            team_name
-        )
-        
+    # Cobertura de todas las filas en una pasada. Con línea 0 (o sin línea) se mira desde
+    # el equipo analizado; si no, desde el favorito que marca el signo de la línea.
+    home_goals, away_goals = table.goals()
+    lines = np.nan_to_num(table.ah[rows], nan=0.0)
+    team_is_home = table.team_mask(team_name, side='home')[rows]
+    favourite_is_home = np.where(lines == 0, team_is_home, lines > 0)
+    codes = ah_cover_codes(home_goals[rows], away_goals[rows], lines, favourite_is_home)
+
+    for i, code in zip(rows, codes):
         # Contar resultados
-        if resultado[1] is True:
+        covered = outcome_sign(int(code))
+        if covered is True:
             analysis['covered'] += 1
             result_text = "CUBIERTO"
-        elif resultado[1] is False:
+        elif covered is False:
             analysis['not_covered'] += 1
             result_text = "NO CUBIERTO"
         else:
@@ -110,10 +58,10 @@ def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=Tru
             result_text = "PUSH"
             
         analysis['details'].append({
-            'home_team': match['home_team'],
-            'away_team': match['away_team'],
-            'score': match['score'],
-            'ah_line': format_ah_as_decimal_string_of(match['ah_line_raw']) if match['ah_line_raw'] else '-',
+            'home_team': table.home[i],
+            'away_team': table.away[i],
+            'score': table.score_text[i],
+            'ah_line': table.ah_display[i],
             'result': result_text
         })
     
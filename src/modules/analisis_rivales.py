@@ -1,154 +1,206 @@
 # modules/analisis_rivales.py
-import re
-from bs4 import BeautifulSoup
-from modules.utils import get_match_details_from_row_of
+# Rivales comunes y "rival del rival" sobre el almacén columnar (modules/historial.py).
+# Cada tabla construye una vez su índice hash rival -> filas del equipo y los análisis
+# cruzan esos índices en lugar de recorrer las filas de BeautifulSoup en cada pasada.
+import numpy as np
+from modules.cobertura import PUSH, UNKNOWN, classify_margins
+from modules.historial import history_store
+from modules.indice_equipos import fresh_team_table, match_kickoff_ordinal, rows_before_match
 
-def analizar_rivales_comunes(soup, team_a, team_b):
+def _fila_partido(table, i, team, opponent=None):
+    details = table.details(i)
+    fila = {'team': team}
+    if opponent is not None:
+        fila['opponent'] = opponent
+    fila.update({
+        'home_team': details['home'],
+        'away_team': details['away'],
+        'score': details['score'],
+        'score_raw': details['score_raw'],
+        'ah_line': details['ahLine'],
+        'ah_line_raw': details['ahLine_raw'],
+        'date': details['date']
+    })
+    return fila
+
+def _resumen_contra_rival(table, rows, team_home):
+    """
+    Resultados, cobertura del hándicap y over/under del equipo en las filas dadas (orden de la
+    web). team_home marca, por fila de la tabla, si el equipo jugaba de local.
+    """
+    home_goals, away_goals = table.goals()
+    hg, ag = home_goals[rows], away_goals[rows]
+    team_home = team_home[rows]
+    goals_for = np.where(team_home, hg, ag)
+    goals_against = np.where(team_home, ag, hg)
+    margin = goals_for - goals_against
+    # La línea de la web es la del local (positiva: el local da goles).
+    home_ah_diff = (hg - ag) - table.ah[rows]
+    ah_codes = classify_margins(np.where(team_home, home_ah_diff, -home_ah_diff))
+    ou = [table.ou_result[i] for i in rows]
+    scored = np.flatnonzero(~np.isnan(margin))
+    return {
+        'matches': len(rows),
+        'wins': int(np.sum(margin > 0)),
+        'draws': int(np.sum(margin == 0)),
+        'losses': int(np.sum(margin < 0)),
+        'goals_for': int(np.nansum(goals_for)),
+        'goals_against': int(np.nansum(goals_against)),
+        'ah_covered': int(np.sum(ah_codes > 0)),
+        'ah_not_covered': int(np.sum((ah_codes < 0) & (ah_codes != UNKNOWN))),
+        'ah_push': int(np.sum(ah_codes == PUSH)),
+        'over': ou.count('O'),
+        'under': ou.count('U'),
+        'ou_push': ou.count('D'),
+        'last_margin': int(margin[scored[0]]) if len(scored) else None,
+        'match_ids': [table.match_id[i] for i in rows],
+    }
+
+def _ids_rivales_comunes(table_v1, table_v2, team_a, team_b):
+    """Cruce de los índices rival -> filas: team_a como local en table_v1 y team_b como visitante en table_v2."""
+    rivals_a = table_v1.opponent_rows(team_a, side='home')
+    rivals_b = table_v2.opponent_rows(team_b, side='away')
+    common = sorted(rivals_a.keys() & rivals_b.keys(), key=lambda rival: rivals_a[rival][0])
+    return common, rivals_a
+
+def resumir_rivales_comunes(soup, team_a, team_b, team_a_id=None, team_b_id=None, main_match_id=None):
+    """
+    Rivales comunes de team_a (local en table_v1) y team_b (visitante en table_v2), en el
+    orden en que aparecen en table_v1, con el resumen de cada equipo contra cada rival
+    (todos sus partidos contra él en su tabla). None si la página no trae las tablas.
+    Si la página no tiene rivales comunes y se pasan los ids de NowGoal, se buscan en el
+    índice local de equipos (ver resumir_rivales_comunes_indice) hasta el partido analizado.
+    """
+    store = history_store(soup)
+    table_v1, table_v2 = store.table('table_v1'), store.table('table_v2')
+    if table_v1 is None or table_v2 is None:
+        return None
+    common, rivals_a = _ids_rivales_comunes(table_v1, table_v2, team_a, team_b)
+    if not common and team_a_id and team_b_id:
+        return resumir_rivales_comunes_indice(team_a_id, team_b_id, main_match_id, match_kickoff_ordinal(soup)) or []
+    all_a = table_v1.opponent_rows(team_a)
+    all_b = table_v2.opponent_rows(team_b)
+    home_a = table_v1.team_mask(team_a, side='home', exact=False)
+    home_b = table_v2.team_mask(team_b, side='home', exact=False)
+    return [{
+        'rival': table_v1.away[rivals_a[rival][0]],
+        'team_a': _resumen_contra_rival(table_v1, all_a[rival], home_a),
+        'team_b': _resumen_contra_rival(table_v2, all_b[rival], home_b),
+    } for rival in common]
+
+def _rivales_antes_de(table, team_id, main_match_id, kickoff):
+    """Índice rival -> filas de team_id, solo con los partidos anteriores al analizado."""
+    before = rows_before_match(table, main_match_id, kickoff)
+    rivals = {}
+    for rival, rows in table.opponent_rows_by_id(team_id).items():
+        rows = rows[before[rows]]
+        if len(rows):
+            rivals[rival] = rows
+    return rivals
+
+def resumir_rivales_comunes_indice(team_a_id, team_b_id, main_match_id=None, kickoff=None):
+    """
+    Rivales comunes a partir del historial local de los dos equipos (ids de NowGoal), en
+    cualquier condición y más allá de las filas que muestra la página, sin el partido
+    analizado (main_match_id) ni los jugados a partir de su fecha (kickoff). None si alguno
+    de los dos historiales no está fresco.
+    """
+    table_a, table_b = fresh_team_table(team_a_id), fresh_team_table(team_b_id)
+    if table_a is None or table_b is None:
+        return None
+    team_a_id, team_b_id = int(team_a_id), int(team_b_id)
+    rivals_a = _rivales_antes_de(table_a, team_a_id, main_match_id, kickoff)
+    rivals_b = _rivales_antes_de(table_b, team_b_id, main_match_id, kickoff)
+    common = sorted((rivals_a.keys() & rivals_b.keys()) - {team_a_id, team_b_id}, key=lambda rival: rivals_a[rival][0])
+    resumen = []
+    for rival in common:
+        first = rivals_a[rival][0]
+        resumen.append({
+            'rival': table_a.home[first] if table_a.home_team_id[first] == rival else table_a.away[first],
+            'team_a': _resumen_contra_rival(table_a, rivals_a[rival], table_a.home_team_id == team_a_id),
+            'team_b': _resumen_contra_rival(table_b, rivals_b[rival], table_b.home_team_id == team_b_id),
+        })
+    return resumen
+
+def analizar_rivales_comunes(soup, team_a, team_b, team_a_id=None, team_b_id=None, main_match_id=None):
     """
     Analiza los rivales comunes entre dos equipos.
-    
+
     Args:
         soup: BeautifulSoup object con el contenido de la página
         team_a: Nombre del primer equipo
         team_b: Nombre del segundo equipo
-    
+        team_a_id, team_b_id: Ids de NowGoal (opcionales) para consultar el índice local
+        main_match_id: Id del partido analizado; el índice solo aporta partidos anteriores
+
     Returns:
         dict: Diccionario con el análisis de rivales comunes
     """
-    # Buscar tablas de partidos para ambos equipos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
-    
-    if not table_v1 or not table_v2:
+    store = history_store(soup)
+    table_v1 = store.table('table_v1')  # Partidos de team_a como local
+    table_v2 = store.table('table_v2')  # Partidos de team_b como visitante
+
+    if table_v1 is None or table_v2 is None:
         return {"error": "No se encontraron las tablas de partidos"}
-    
-    # Extraer rivales de team_a (como local)
-    rivals_a = set()
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and team_a.lower() in details['home'].lower():
-            rivals_a.add(details['away'].lower())
-    
-    # Extraer rivales de team_b (como visitante)
-    rivals_b = set()
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and team_b.lower() in details['away'].lower():
-            rivals_b.add(details['home'].lower())
-    
-    # Encontrar rivales comunes
-    common_rivals = rivals_a.intersection(rivals_b)
-    
-    # Obtener detalles de partidos contra rivales comunes
+
+    common_ids, _ = _ids_rivales_comunes(table_v1, table_v2, team_a, team_b)
+
+    # Partidos de cada tabla contra los rivales comunes
     common_matches = []
-    
-    # Partidos de team_a contra rivales comunes
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and details['away'].lower() in common_rivals:
-            common_matches.append({
-                'team': team_a,
-                'opponent': details['away'],
-                'home_team': details['home'],
-                'away_team': details['away'],
-                'score': details['score'],
-                'score_raw': details['score_raw'],
-                'ah_line': details['ahLine'],
-                'ah_line_raw': details['ahLine_raw'],
-                'date': details['date']
-            })
-    
-    # Partidos de team_b contra rivales comunes
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and details['home'].lower() in common_rivals:
-            common_matches.append({
-                'team': team_b,
-                'opponent': details['home'],
-                'home_team': details['home'],
-                'away_team': details['away'],
-                'score': details['score'],
-                'score_raw': details['score_raw'],
-                'ah_line': details['ahLine'],
-                'ah_line_raw': details['ahLine_raw'],
-                'date': details['date']
-            })
-    
+    for i in np.flatnonzero(np.isin(table_v1.away_id, common_ids)):
+        common_matches.append(_fila_partido(table_v1, i, team_a, table_v1.away[i]))
+    for i in np.flatnonzero(np.isin(table_v2.home_id, common_ids)):
+        common_matches.append(_fila_partido(table_v2, i, team_b, table_v2.home[i]))
+
     # Ordenar por fecha
     common_matches.sort(key=lambda x: x['date'], reverse=True)
-    
+
     return {
         'team_a': team_a,
         'team_b': team_b,
-        'common_rivals': list(common_rivals),
-        'common_rivals_count': len(common_rivals),
-        'matches': common_matches[:10]  # Limitar a 10 partidos más recientes
+        'common_rivals': [store.interner.names[rival] for rival in common_ids],
+        'common_rivals_count': len(common_ids),
+        'matches': common_matches[:10],  # Limitar a 10 partidos más recientes
+        'rivals': resumir_rivales_comunes(soup, team_a, team_b, team_a_id, team_b_id, main_match_id)
     }
 
+def _filas_contra(table, team, rival):
+    """Filas de team contra cualquier equipo cuyo nombre contenga rival, en el orden de la web."""
+    index = table.opponent_rows(team)
+    rows = [index[rival_id] for rival_id in table.interner.matching(rival) if rival_id in index]
+    return np.unique(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.intp)
+
 def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b_rival):
     """
     Analiza el rendimiento de cada equipo contra el rival del otro equipo.
-    
+
     Args:
         soup: BeautifulSoup object con el contenido de la página
         team_a: Nombre del primer equipo
         team_b: Nombre del segundo equipo
         rival_a_rival: Rival del equipo A
         rival_b_rival: Rival del equipo B
-    
+
     Returns:
         dict: Diccionario con el análisis contra el rival del rival
     """
-    # Buscar tablas de partidos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
-    
-    if not table_v1 or not table_v2:
+    store = history_store(soup)
+    table_v1 = store.table('table_v1')  # Partidos de team_a como local
+    table_v2 = store.table('table_v2')  # Partidos de team_b como visitante
+
+    if table_v1 is None or table_v2 is None:
         return {"error": "No se encontraron las tablas de partidos"}
-    
-    # Buscar partidos de team_a contra rival_b_rival
-    matches_a_vs_rival_b_rival = []
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and (
-            (team_a.lower() in details['home'].lower() and rival_b_rival.lower() in details['away'].lower()) or
-            (team_a.lower() in details['away'].lower() and rival_b_rival.lower() in details['home'].lower())
-        ):
-            matches_a_vs_rival_b_rival.append({
-                'team': team_a,
-                'home_team': details['home'],
-                'away_team': details['away'],
-                'score': details['score'],
-                'score_raw': details['score_raw'],
-                'ah_line': details['ahLine'],
-                'ah_line_raw': details['ahLine_raw'],
-                'date': details['date']
-            })
-    
-    # Buscar partidos de team_b contra rival_a_rival
-    matches_b_vs_rival_a_rival = []
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and (
-            (team_b.lower() in details['home'].lower() and rival_a_rival.lower() in details['away'].lower()) or
-            (team_b.lower() in details['away'].lower() and rival_a_rival.lower() in details['home'].lower())
-        ):
-            matches_b_vs_rival_a_rival.append({
-                'team': team_b,
-                'home_team': details['home'],
-                'away_team': details['away'],
-                'score': details['score'],
-                'score_raw': details['score_raw'],
-                'ah_line': details['ahLine'],
-                'ah_line_raw': details['ahLine_raw'],
-                'date': details['date']
-            })
-    
+
+    rows_a = _filas_contra(table_v1, team_a, rival_b_rival)
+    rows_b = _filas_contra(table_v2, team_b, rival_a_rival)
+
     return {
         'team_a': team_a,
         'team_b': team_b,
         'rival_a_rival': rival_a_rival,
         'rival_b_rival': rival_b_rival,
-        'matches_a_vs_rival_b_rival': matches_a_vs_rival_b_rival,
-        'matches_b_vs_rival_a_rival': matches_b_vs_rival_a_rival
-    }
\ No newline at end of file
+        'matches_a_vs_rival_b_rival': [_fila_partido(table_v1, i, team_a) for i in rows_a],
+        'matches_b_vs_rival_a_rival': [_fila_partido(table_v2, i, team_b) for i in rows_b],
+        'resumen_a_vs_rival_b_rival': _resumen_contra_rival(table_v1, rows_a, table_v1.team_mask(team_a, side='home', exact=False)),
+        'resumen_b_vs_rival_a_rival': _resumen_contra_rival(table_v2, rows_b, table_v2.team_mask(team_b, side='home', exact=False))
+    }
@@ -0,0 +1,85 @@
+# src/modules/bloqueo_recursos.py
+# Bloqueo de recursos en los navegadores headless (Chrome/Selenium y Playwright).
+# Los extractores solo leen el HTML del documento y las tablas que rellenan los
+# scripts de NowGoal; imágenes, fuentes, CSS, anuncios y trackers sobran.
+
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from modules.metricas import histogram
+
+RESOURCE_BLOCKING_ENABLED = os.environ.get('RESOURCE_BLOCKING_ENABLED', '1').strip().lower() not in ('0', 'false', 'no')
+
+# Allow-list (Playwright): tipos de recurso y hosts permitidos.
+ALLOWED_RESOURCE_TYPES = frozenset(
+    t.strip() for t in os.environ.get('ALLOWED_RESOURCE_TYPES', 'document,script,xhr,fetch').split(',') if t.strip()
+)
+ALLOWED_HOST_SUFFIXES = tuple(
+    h.strip() for h in os.environ.get('ALLOWED_HOST_SUFFIXES', 'nowgoal25.com').split(',') if h.strip()
+)
+
+# Block-list (Chrome vía CDP Network.setBlockedURLs, que solo admite comodines).
+CHROME_BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css', '*.mp4', '*.webm', '*.mp3',
+    '*googletagmanager.com*', '*google-analytics.com*', '*googlesyndication.com*',
+    '*doubleclick.net*', '*adservice.google.*', '*googleadservices.com*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*scorecardresearch.com*',
+    '*cloudflareinsights.com*', '*adsystem*', '*/ads/*', '*popads*', '*propellerads*',
+]
+
+BROWSER_NAVIGATION_SECONDS = histogram(
+    'app_browser_navigation_seconds',
+    'Duración de la navegación de los navegadores headless, con y sin bloqueo de recursos.',
+    ('browser', 'blocking'),
+)
+
+
+def _host_allowed(host: str) -> bool:
+    host = (host or '').lower()
+    return any(host == suffix or host.endswith('.' + suffix) for suffix in ALLOWED_HOST_SUFFIXES)
+
+
+def is_request_allowed(url: str, resource_type: str) -> bool:
+    if not RESOURCE_BLOCKING_ENABLED:
+        return True
+    if resource_type not in ALLOWED_RESOURCE_TYPES:
+        return False
+    if resource_type == 'document':
+        return True
+    return _host_allowed(urlsplit(url).hostname)
+
+
+def apply_chrome_resource_blocking(driver):
+    """Activa Network.setBlockedURLs en un driver de Chrome. Devuelve True si se aplicó."""
+    if not RESOURCE_BLOCKING_ENABLED:
+        return False
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': CHROME_BLOCKED_URL_PATTERNS})
+        return True
+    except Exception as exc:
+        print(f"No se pudo activar el bloqueo de recursos en Chrome: {exc}")
+        return False
+
+
+async def playwright_route_filter(route):
+    request = route.request
+    if is_request_allowed(request.url, request.resource_type):
+        await route.continue_()
+    else:
+        await route.abort()
+
+
+@contextmanager
+def measure_navigation(browser: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        BROWSER_NAVIGATION_SECONDS.observe(
+            time.perf_counter() - started, browser=browser, blocking='on' if RESOURCE_BLOCKING_ENABLED else 'off'
+        )
@@ -0,0 +1,69 @@
+# src/modules/bucle_fondo.py
+# Event loop único y persistente para las piezas asyncio del proceso (Playwright, aiohttp).
+# Vive en un hilo propio; el código síncrono (rutas de Flask, workers de la cola) le manda
+# corrutinas con submit()/run() en lugar de crear y destruir un loop por petición.
+
+import asyncio
+import atexit
+import threading
+
+BACKGROUND_RUN_TIMEOUT_SECONDS = 60
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = 'async-loop'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def is_running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def in_loop(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Programa la corrutina en el loop y devuelve un concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout: float = BACKGROUND_RUN_TIMEOUT_SECONDS):
+        """Ejecuta la corrutina en el loop y bloquea hasta su resultado."""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError('run() bloquearía el propio loop de fondo; usa await')
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_shared_loop = BackgroundLoop()
+# Se registra al importar el módulo para que atexit lo pare después de que los clientes
+# (navegador, sesión aiohttp) hayan cerrado sus recursos en él.
+atexit.register(_shared_loop.stop)
+
+
+def get_background_loop() -> BackgroundLoop:
+    return _shared_loop
@@ -0,0 +1,85 @@
+# src/modules/cliente_async.py
+# Cliente HTTP asyncio (aiohttp) para las descargas que no necesitan navegador.
+# Una sola ClientSession vive en el event loop de fondo del proceso; las rutas de Flask
+# (síncronas) le mandan corrutinas con run() y esperan el resultado.
+
+import asyncio
+import atexit
+import threading
+from urllib.parse import urlsplit
+
+from modules.bucle_fondo import get_background_loop
+from modules.cliente_http import CONNECTION_POOL_SIZE, HOST_CONCURRENCY_LIMIT, outbound_call_async
+from modules.metricas import track_outbound
+
+ASYNC_REQUEST_TIMEOUT_SECONDS = 10
+ASYNC_RUN_TIMEOUT_SECONDS = 60
+
+
+class AsyncHttpClient:
+    def __init__(self, headers: dict, per_host_limit: int = HOST_CONCURRENCY_LIMIT,
+                 timeout_seconds: float = ASYNC_REQUEST_TIMEOUT_SECONDS):
+        self.headers = dict(headers)
+        self.per_host_limit = per_host_limit
+        self.timeout_seconds = timeout_seconds
+        self._background = get_background_loop()
+        self._session = None
+        self._host_semaphores = {}
+
+    # --- Dentro del loop de fondo ---
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                connector=aiohttp.TCPConnector(limit=CONNECTION_POOL_SIZE, limit_per_host=self.per_host_limit),
+            )
+        return self._session
+
+    def _host_semaphore(self, url: str):
+        host = (urlsplit(url).hostname or '').lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    async def fetch_text(self, url: str, source: str = 'async'):
+        """Descarga url y devuelve el cuerpo; lanza la excepción de aiohttp o OutboundUnavailable."""
+        session = await self._get_session()
+        async with self._host_semaphore(url), outbound_call_async(url):
+            with track_outbound(source):
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    return await response.text()
+
+    # --- API pública ---
+    def run(self, coro, timeout: float = ASYNC_RUN_TIMEOUT_SECONDS):
+        """Ejecuta la corrutina en el loop de fondo y bloquea hasta su resultado."""
+        return self._background.run(coro, timeout)
+
+    def shutdown(self):
+        if not self._background.is_running():
+            return
+
+        async def close():
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+
+        try:
+            self._background.run(close(), timeout=5)
+        except Exception:
+            pass
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_async_client(headers: dict):
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = AsyncHttpClient(headers)
+            atexit.register(_shared_client.shutdown)
+        return _shared_client
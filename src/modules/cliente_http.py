@@ -0,0 +1,270 @@
+# src/modules/cliente_http.py
+# Capa compartida para las peticiones salientes a NowGoal.
+# Por host: límite de concurrencia, token bucket (ritmo máximo) y circuit breaker.
+# Con el breaker abierto las llamadas fallan al instante con OutboundUnavailable,
+# para que quien llama sirva la caché aunque esté caducada.
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules.metricas import counter, gauge
+
+HOST_CONCURRENCY_LIMIT = 6
+CONNECTION_POOL_SIZE = 32
+
+OUTBOUND_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_RATE_PER_SECOND', '4'))
+OUTBOUND_RATE_BURST = int(os.environ.get('OUTBOUND_RATE_BURST', '8'))
+OUTBOUND_RATE_MAX_WAIT_SECONDS = 5.0
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+_BREAKER_STATE_VALUES = {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+
+OUTBOUND_REJECTIONS = counter(
+    'app_outbound_rejections_total', 'Peticiones salientes rechazadas antes de salir, por host y motivo.', ('host', 'reason')
+)
+
+
+class OutboundUnavailable(Exception):
+    """El host no admite más peticiones ahora mismo (breaker abierto o sin tokens)."""
+
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"{host}: {reason}")
+        self.host = host
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(int(capacity), 1)
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Devuelve 0 si consiguió un token, o los segundos que faltan para el siguiente."""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, max_wait: float = OUTBOUND_RATE_MAX_WAIT_SECONDS) -> bool:
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failure_threshold` fallos seguidos; open -> half_open pasado
+    `reset_seconds`, dejando salir una única petición de prueba que decide si se cierra.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._open_seconds_total = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and (self._clock() - self._opened_at) >= self.reset_seconds:
+                self.state = BREAKER_HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                self._open_seconds_total += self._clock() - self._opened_at
+                self._opened_at = None
+            self.state = BREAKER_CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == BREAKER_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self._opened_at = self._clock()
+                else:
+                    # Vuelve a abrir tras una prueba fallida: el tiempo abierto sigue contando.
+                    self._open_seconds_total += self._clock() - self._opened_at
+                    self._opened_at = self._clock()
+                self.state = BREAKER_OPEN
+
+    def release_probe(self):
+        """La petición de prueba no llegó a salir: se libera sin contar como éxito ni fallo."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def open_seconds(self) -> float:
+        with self._lock:
+            current = self._clock() - self._opened_at if self._opened_at is not None else 0.0
+            return self._open_seconds_total + current
+
+
+class _HostState:
+    def __init__(self):
+        self.slot = threading.BoundedSemaphore(HOST_CONCURRENCY_LIMIT)
+        self.bucket = TokenBucket(OUTBOUND_RATE_PER_SECOND, OUTBOUND_RATE_BURST)
+        self.breaker = CircuitBreaker()
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def _host_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+def _get_host_state(host: str) -> _HostState:
+    with _hosts_lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = _HostState()
+        return state
+
+
+def _is_host_failure(exc: BaseException) -> bool:
+    # Un 4xx (salvo 429) significa que el host responde: no debe abrir el breaker.
+    status = None
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+    elif isinstance(getattr(exc, 'status', None), int):
+        status = exc.status  # aiohttp.ClientResponseError
+    if status is not None:
+        return status >= 500 or status == 429
+    return True
+
+
+def host_available(url: str) -> bool:
+    return _get_host_state(_host_of(url)).breaker.state != BREAKER_OPEN
+
+
+@contextmanager
+def outbound_call(url: str, max_wait: float = OUTBOUND_RATE_MAX_WAIT_SECONDS):
+    """
+    Envuelve una petición saliente hacia el host de url. Lanza OutboundUnavailable sin
+    salir a la red si el breaker está abierto o no llega un token a tiempo.
+    """
+    host = _host_of(url)
+    state = _get_host_state(host)
+    if not state.breaker.allow():
+        OUTBOUND_REJECTIONS.inc(host=host, reason='breaker_open')
+        raise OutboundUnavailable(host, 'breaker_open')
+    if not state.bucket.acquire(max_wait):
+        state.breaker.release_probe()
+        OUTBOUND_REJECTIONS.inc(host=host, reason='rate_limited')
+        raise OutboundUnavailable(host, 'rate_limited')
+    state.slot.acquire()
+    try:
+        yield
+    except Exception as exc:
+        if _is_host_failure(exc):
+            state.breaker.record_failure()
+        else:
+            state.breaker.record_success()
+        raise
+    else:
+        state.breaker.record_success()
+    finally:
+        state.slot.release()
+
+
+@asynccontextmanager
+async def outbound_call_async(url: str, max_wait: float = OUTBOUND_RATE_MAX_WAIT_SECONDS):
+    """
+    Versión asyncio de outbound_call: comparte breaker y token bucket con las llamadas
+    síncronas, pero la concurrencia por host la limita el cliente asíncrono con su semáforo.
+    """
+    host = _host_of(url)
+    state = _get_host_state(host)
+    if not state.breaker.allow():
+        OUTBOUND_REJECTIONS.inc(host=host, reason='breaker_open')
+        raise OutboundUnavailable(host, 'breaker_open')
+    deadline = time.monotonic() + max_wait
+    try:
+        while (wait := state.bucket.try_acquire()) > 0:
+            if time.monotonic() + wait > deadline:
+                OUTBOUND_REJECTIONS.inc(host=host, reason='rate_limited')
+                raise OutboundUnavailable(host, 'rate_limited')
+            await asyncio.sleep(wait)
+    except BaseException:
+        state.breaker.release_probe()
+        raise
+    try:
+        yield
+    except asyncio.CancelledError:
+        state.breaker.release_probe()
+        raise
+    except Exception as exc:
+        if _is_host_failure(exc):
+            state.breaker.record_failure()
+        else:
+            state.breaker.record_success()
+        raise
+    else:
+        state.breaker.record_success()
+
+
+def build_session(headers: dict, retries: Retry | None = None, pool_size: int = CONNECTION_POOL_SIZE) -> requests.Session:
+    session = requests.Session()
+    retries = retries or Retry(total=3, backoff_factor=0.4, status_forcelist=[500, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    return session
+
+
+def _breaker_snapshot(metric):
+    with _hosts_lock:
+        items = list(_hosts.items())
+    if metric == 'state':
+        return {host: _BREAKER_STATE_VALUES[state.breaker.state] for host, state in items}
+    return {host: round(state.breaker.open_seconds(), 3) for host, state in items}
+
+
+gauge('app_outbound_breaker_state', 'Estado del circuit breaker por host (0 cerrado, 1 semiabierto, 2 abierto).',
+      ('host',), callback=lambda: _breaker_snapshot('state'))
+gauge('app_outbound_breaker_open_seconds', 'Segundos acumulados con el circuit breaker abierto, por host.',
+      ('host',), callback=lambda: _breaker_snapshot('open_seconds'))
@@ -0,0 +1,94 @@
+# src/modules/cobertura.py
+# Motor de cobertura de hándicap asiático y línea de goles.
+# La API por lotes clasifica todas las filas de un historial en una pasada de NumPy;
+# las funciones por fila (check_handicap_cover, check_goal_line_cover...) son envoltorios
+# del mismo clasificador en escalar, así que ambas vías dan siempre el mismo resultado.
+
+import numpy as np
+
+# Códigos de resultado (int8). En líneas de cuarto (0.25, 0.75...) el favorito puede
+# ganar o perder la mitad de la apuesta.
+LOSS, HALF_LOSS, PUSH, HALF_WIN, WIN = -2, -1, 0, 1, 2
+UNKNOWN = -128
+
+# margen - línea dentro de ±0.05 es push; hasta ±0.3 (las líneas de cuarto dejan ±0.25) es
+# media ganada / media perdida.
+_PUSH_TOLERANCE = 0.05
+_HALF_TOLERANCE = 0.3
+
+
+def classify_margin(diff) -> int:
+    """Código de resultado para (margen del favorito - |línea|) o (goles totales - línea)."""
+    if diff != diff:
+        return UNKNOWN
+    if diff > _HALF_TOLERANCE:
+        return WIN
+    if diff > _PUSH_TOLERANCE:
+        return HALF_WIN
+    if diff >= -_PUSH_TOLERANCE:
+        return PUSH
+    if diff >= -_HALF_TOLERANCE:
+        return HALF_LOSS
+    return LOSS
+
+
+def classify_margins(diffs) -> np.ndarray:
+    diffs = np.asarray(diffs, dtype=float)
+    codes = np.select(
+        [diffs > _HALF_TOLERANCE, diffs > _PUSH_TOLERANCE, diffs >= -_PUSH_TOLERANCE, diffs >= -_HALF_TOLERANCE],
+        [WIN, HALF_WIN, PUSH, HALF_LOSS],
+        LOSS,
+    ).astype(np.int8)
+    codes[np.isnan(diffs)] = UNKNOWN
+    return codes
+
+
+def ah_cover_codes(home_goals, away_goals, ah_lines, favourite_is_home) -> np.ndarray:
+    """
+    Resultado del favorito contra |línea| para cada fila. Goles o línea NaN (marcador
+    ilegible, sin línea) dan UNKNOWN.
+    """
+    home = np.asarray(home_goals, dtype=float)
+    away = np.asarray(away_goals, dtype=float)
+    margin = np.where(np.asarray(favourite_is_home, dtype=bool), home - away, away - home)
+    return classify_margins(margin - np.abs(np.asarray(ah_lines, dtype=float)))
+
+
+def goal_line_codes(home_goals, away_goals, goal_lines) -> np.ndarray:
+    """Over (> 0), push o under (< 0) del total de goles contra la línea, por fila."""
+    total = np.asarray(home_goals, dtype=float) + np.asarray(away_goals, dtype=float)
+    return classify_margins(total - np.asarray(goal_lines, dtype=float))
+
+
+def ah_cover_code(home_goals: int, away_goals: int, ah_line: float, favourite_is_home: bool) -> int:
+    margin = home_goals - away_goals if favourite_is_home else away_goals - home_goals
+    return classify_margin(margin - abs(ah_line))
+
+
+def goal_line_code(home_goals: int, away_goals: int, goal_line: float) -> int:
+    return classify_margin(home_goals + away_goals - goal_line)
+
+
+def outcome_sign(code: int):
+    """True si el favorito (o el over) gana aunque sea la mitad, False si pierde, None en push/desconocido."""
+    if code == UNKNOWN or code == PUSH:
+        return None
+    return code > 0
+
+
+def parse_score(score_raw: str):
+    """'2-1' -> (2, 1), con la misma tolerancia que el resto de módulos (int() sobre cada lado)."""
+    goles_h, goles_a = map(int, score_raw.split('-'))
+    return goles_h, goles_a
+
+
+def scores_to_arrays(scores):
+    """Marcadores 'h-a' a dos arrays float; los ilegibles quedan como NaN."""
+    home = np.full(len(scores), np.nan)
+    away = np.full(len(scores), np.nan)
+    for index, score_raw in enumerate(scores):
+        try:
+            home[index], away[index] = parse_score(score_raw)
+        except (ValueError, TypeError, AttributeError):
+            continue
+    return home, away
@@ -0,0 +1,200 @@
+# src/modules/cola_analisis.py
+# Cola acotada de análisis profundos con prioridad, deduplicación por partido y
+# estado consultable. Sustituye a los threading.Thread sueltos por petición.
+
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_PREFETCH = 10
+
+_current = threading.local()
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_ERROR = 'error'
+
+
+def _priority_name(priority):
+    if priority <= PRIORITY_INTERACTIVE:
+        return 'interactive'
+    return 'batch' if priority <= PRIORITY_BATCH else 'prefetch'
+
+
+class AnalysisJob:
+    """Un análisis encolado; el resultado queda guardado hasta que se purga el historial."""
+
+    def __init__(self, match_id: str, priority: int):
+        self.id = uuid.uuid4().hex
+        self.match_id = match_id
+        self.priority = priority
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.events = []
+        self._events_cond = threading.Condition()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_ERROR)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def publish(self, stage: str, data=None):
+        with self._events_cond:
+            self.events.append({'stage': stage, 'at': time.time(), 'data': data})
+            self._events_cond.notify_all()
+
+    def events_since(self, index: int, timeout=None):
+        """Eventos a partir de index; espera hasta timeout si no hay nuevos y el trabajo sigue en curso."""
+        with self._events_cond:
+            if len(self.events) <= index and not self.finished:
+                self._events_cond.wait(timeout)
+            return list(self.events[index:])
+
+    def _mark_done(self):
+        self._done.set()
+        with self._events_cond:
+            self._events_cond.notify_all()
+
+    def to_dict(self, include_result=False):
+        data = {
+            'job_id': self.id,
+            'match_id': self.match_id,
+            'priority': _priority_name(self.priority),
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+        if self.started_at and self.finished_at:
+            data['elapsed'] = round(self.finished_at - self.started_at, 2)
+        if include_result and self.status == JOB_DONE:
+            data['result'] = self.result
+        return data
+
+
+class AnalysisJobQueue:
+    """
+    Cola de prioridad con un número fijo de hilos trabajadores.
+    Un mismo partido nunca se analiza dos veces a la vez: si ya hay un trabajo
+    pendiente o en curso se devuelve ese mismo (y se sube su prioridad si hace falta).
+    """
+
+    def __init__(self, runner, workers: int = 1, max_pending: int = 32, history_size: int = 200, name: str = 'analysis'):
+        self._runner = runner
+        self._workers = max(int(workers), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self._history_size = history_size
+        self._name = name
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs = OrderedDict()
+        self._active_by_match = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(target=self._worker_loop, name=f"{self._name}-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job.status == JOB_QUEUED)
+
+    def submit(self, match_id: str, priority: int = PRIORITY_INTERACTIVE):
+        """Encola el análisis de match_id. Devuelve el trabajo, o None si la cola está llena."""
+        match_id = str(match_id)
+        with self._lock:
+            existing_id = self._active_by_match.get(match_id)
+            existing = self._jobs.get(existing_id) if existing_id else None
+            if existing is not None and not existing.finished:
+                if priority < existing.priority and existing.status == JOB_QUEUED:
+                    existing.priority = priority
+                    self._queue.put((priority, next(self._seq), existing.id))
+                return existing
+            if self._pending_count() >= self.max_pending:
+                return None
+            job = AnalysisJob(match_id, priority)
+            self._jobs[job.id] = job
+            self._active_by_match[match_id] = job.id
+            self._queue.put((priority, next(self._seq), job.id))
+            self._ensure_workers()
+            return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_active(self, match_id: str):
+        with self._lock:
+            job_id = self._active_by_match.get(str(match_id))
+            job = self._jobs.get(job_id) if job_id else None
+            return job if job is not None and not job.finished else None
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'pending': statuses.count(JOB_QUEUED),
+            'running': statuses.count(JOB_RUNNING),
+            'workers': self._workers,
+            'max_pending': self.max_pending,
+        }
+
+    def _prune_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self._history_size, 0)]:
+            self._jobs.pop(job_id, None)
+
+    def _worker_loop(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # Entradas duplicadas tras subir la prioridad: se ignoran las obsoletas.
+                if job is None or job.status != JOB_QUEUED:
+                    continue
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+            _current.job = job
+            try:
+                result = self._runner(job.match_id)
+                if isinstance(result, dict) and result.get('error'):
+                    job.error = result['error']
+                    job.status = JOB_ERROR
+                else:
+                    job.result = result
+                    job.status = JOB_DONE
+            except Exception as exc:
+                job.error = f"{type(exc).__name__}: {exc}"
+                job.status = JOB_ERROR
+            finally:
+                _current.job = None
+                job.finished_at = time.time()
+                with self._lock:
+                    if self._active_by_match.get(job.match_id) == job.id:
+                        self._active_by_match.pop(job.match_id, None)
+                    self._prune_history()
+                job._mark_done()
+
+
+def publish_progress(stage: str, data=None):
+    """Publica una etapa en el trabajo que se está ejecutando en este hilo (no hace nada fuera de la cola)."""
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        job.publish(stage, data)
@@ -2,25 +2,40 @@
 
 import time
 import copy
+import asyncio
 import requests
 import re
 import math
 import threading
 from contextlib import contextmanager
 from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
+from modules.tiempos import stage_span, timed_call, record_stage, collect_stage_timings, get_current_timings
+from modules.bloqueo_recursos import apply_chrome_resource_blocking, measure_navigation
+from modules.cliente_http import build_session, outbound_call, OutboundUnavailable
+from modules.cliente_async import get_async_client
+from modules.cola_analisis import publish_progress
+from modules.cobertura import ah_cover_code, goal_line_code, outcome_sign, parse_score
+from modules.handicap_asiatico import format_ah_as_decimal_string_of, parse_ah_to_number_of
+from modules.historial import history_store
+from modules.indice_equipos import fresh_team_table, get_team_index, match_kickoff_ordinal, record_h2h_page, rows_before_match
+from modules.metricas import (
+    CACHE_REQUESTS, CACHE_EVICTIONS, DRIVER_CHECKOUT_SECONDS, DRIVER_IN_USE, DRIVER_WAITING, gauge, track_outbound
+)
 
 # --- CONFIGURACIÓN GLOBAL ---
 BASE_URL_OF = "https://live18.nowgoal25.com"
 SELENIUM_TIMEOUT_SECONDS_OF = 10
+SELENIUM_WAIT_BUDGET_SECONDS = 20
+SELECT_SETTLE_TIMEOUT_SECONDS = 1.5
+SELENIUM_POLL_SECONDS = 0.05
 PLACEHOLDER_NODATA = "*(No disponible)*"
 REQUEST_TIMEOUT_SECONDS = 10
 REQUEST_HEADERS = {
@@ -32,7 +47,13 @@ REQUEST_HEADERS = {
 }
 SOUP_CACHE_TTL_SECONDS = 45
 STATS_CACHE_TTL_SECONDS = 300
+STATS_CACHE_MAX_ENTRIES = 2000
 ANALYSIS_CACHE_TTL_SECONDS = 120
+ANALYSIS_CACHE_MAX_ENTRIES = 256
+H2H_COL3_SOUP_CACHE_TTL_SECONDS = 600
+SOUP_CACHE_MAX_ENTRIES = 64
+H2H_COL3_CACHE_TTL_SECONDS = 1800
+H2H_COL3_CACHE_MAX_ENTRIES = 5000
 
 _requests_session = None
 _requests_session_lock = threading.Lock()
@@ -42,90 +63,89 @@ _stats_cache = {}
 _stats_cache_lock = threading.Lock()
 _analysis_cache = {}
 _analysis_cache_lock = threading.Lock()
+_h2h_col3_cache = {}
+_h2h_col3_cache_lock = threading.Lock()
 _STATS_NOT_FOUND = object()
 _driver_instance = None
 _driver_instance_lock = threading.Lock()
 _driver_use_lock = threading.Lock()
+SELENIUM_DRIVER_POOL_SIZE = 1
 
-def _read_cache(cache_dict, key, ttl_seconds, lock):
+gauge('app_selenium_driver_pool_size', 'Capacidad del pool de drivers de Selenium.', callback=lambda: SELENIUM_DRIVER_POOL_SIZE)
+gauge('app_selenium_drivers_alive', 'Drivers de Selenium inicializados.', callback=lambda: 0 if _driver_instance is None else 1)
+
+def _read_cache(cache_dict, key, ttl_seconds, lock, cache_name=None, keep_stale=False):
     with lock:
         entry = cache_dict.get(key)
         if not entry:
+            if cache_name:
+                CACHE_REQUESTS.inc(cache=cache_name, result='miss')
             return None
-        ts, value = entry
-        if (time.time() - ts) > ttl_seconds:
-            cache_dict.pop(key, None)
+        ts, value = entry[0], entry[1]
+        # Las entradas pueden llevar su propio TTL (p. ej. math.inf para datos inmutables).
+        entry_ttl = entry[2] if len(entry) > 2 else ttl_seconds
+        if (time.time() - ts) > entry_ttl:
+            # keep_stale deja la entrada caducada para _read_stale_cache (NowGoal caído).
+            if not keep_stale:
+                cache_dict.pop(key, None)
+                if cache_name:
+                    CACHE_EVICTIONS.inc(cache=cache_name)
+            if cache_name:
+                CACHE_REQUESTS.inc(cache=cache_name, result='miss')
             return None
+        if cache_name:
+            CACHE_REQUESTS.inc(cache=cache_name, result='hit')
         return value
 
-def _write_cache(cache_dict, key, value, lock):
+def _read_stale_cache(cache_dict, key, lock):
+    with lock:
+        entry = cache_dict.get(key)
+        return entry[1] if entry else None
+
+def _write_cache(cache_dict, key, value, lock, ttl_seconds=None, max_entries=None, cache_name=None):
     with lock:
-        cache_dict[key] = (time.time(), value)
+        cache_dict.pop(key, None)
+        cache_dict[key] = (time.time(), value) if ttl_seconds is None else (time.time(), value, ttl_seconds)
+        if max_entries is not None:
+            while len(cache_dict) > max_entries:
+                cache_dict.pop(next(iter(cache_dict)))
+                if cache_name:
+                    CACHE_EVICTIONS.inc(cache=cache_name)
 
 
 def _get_cached_analysis(match_id: str):
-    cached = _read_cache(_analysis_cache, match_id, ANALYSIS_CACHE_TTL_SECONDS, _analysis_cache_lock)
+    cached = _read_cache(_analysis_cache, match_id, ANALYSIS_CACHE_TTL_SECONDS, _analysis_cache_lock, 'analysis', keep_stale=True)
     if cached is None:
         return None
     return copy.deepcopy(cached)
 
 
-def _set_cached_analysis(match_id: str, payload: dict):
-    _write_cache(_analysis_cache, match_id, copy.deepcopy(payload), _analysis_cache_lock)
-
-# --- FUNCIONES HELPER PARA PARSEO Y FORMATEO ---
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
+def _get_stale_analysis(match_id: str):
+    cached = _read_stale_cache(_analysis_cache, match_id, _analysis_cache_lock)
+    if cached is None:
         return None
+    return copy.deepcopy(cached)
 
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-    if numeric_value == 0.0: return "0"
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else:
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-    final_value_signed = sign * abs_rounded
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}"
-    if for_sheets:
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
+
+def get_cached_analysis_with_age(match_id: str):
+    """
+    Lee el análisis en memoria sin aplicar el TTL, para servirlo caducado mientras se refresca.
+    Devuelve (payload, antigüedad en segundos, inmutable) o (None, None, False).
+    """
+    with _analysis_cache_lock:
+        entry = _analysis_cache.get(str(match_id))
+    if not entry:
+        return None, None, False
+    immutable = len(entry) > 2 and entry[2] == math.inf
+    return copy.deepcopy(entry[1]), max(time.time() - entry[0], 0.0), immutable
+
+
+def _set_cached_analysis(match_id: str, payload: dict):
+    # Un partido terminado ya no cambia: su análisis se guarda sin caducidad.
+    is_final = payload.get("final_score") not in (None, '', '?:?')
+    _write_cache(_analysis_cache, match_id, copy.deepcopy(payload), _analysis_cache_lock,
+                 ttl_seconds=math.inf if is_final else None,
+                 max_entries=ANALYSIS_CACHE_MAX_ENTRIES, cache_name='analysis')
 
 def _df_to_rows(df):
     rows = []
@@ -141,47 +161,34 @@ def _df_to_rows(df):
     return rows
 
 # --- SISTEMA DE ANÁLISIS DE MERCADO ---
+_AH_COVER_LABELS = {True: ("CUBIERTO", True), False: ("NO CUBIERTO", False), None: ("PUSH", None)}
+_GOAL_LINE_LABELS = {True: ("SUPERADA (Over)", True), False: ("NO SUPERADA (UNDER)", False), None: ("PUSH (Igual)", None)}
+
+
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
+        goles_h, goles_a = parse_score(resultado_raw)
         if ah_line_num == 0.0:
-            if main_home_team_name.lower() == home_team_in_h2h.lower():
-                if goles_h > goles_a: return ("CUBIERTO", True)
-                elif goles_a > goles_h: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-            else:
-                if goles_a > goles_h: return ("CUBIERTO", True)
-                elif goles_h > goles_a: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-        
-        if favorite_team_name.lower() == home_team_in_h2h.lower():
-            favorite_margin = goles_h - goles_a
+            # Línea 0: se mira desde el local del partido principal.
+            favourite_is_home = main_home_team_name.lower() == home_team_in_h2h.lower()
+        elif favorite_team_name.lower() == home_team_in_h2h.lower():
+            favourite_is_home = True
         elif favorite_team_name.lower() == away_team_in_h2h.lower():
-            favorite_margin = goles_a - goles_h
+            favourite_is_home = False
         else:
             return ("indeterminado", None)
-        
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
+        code = ah_cover_code(goles_h, goles_a, ah_line_num, favourite_is_home)
     except (ValueError, TypeError, AttributeError):
         return ("indeterminado", None)
+    return _AH_COVER_LABELS[outcome_sign(code)]
 
 def check_goal_line_cover(resultado_raw: str, goal_line_num: float):
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return (f"NO SUPERADA (UNDER)", False)
-        else:
-            return ("PUSH (Igual)", None)
+        goles_h, goles_a = parse_score(resultado_raw)
+        code = goal_line_code(goles_h, goles_a, goal_line_num)
     except (ValueError, TypeError):
         return ("indeterminado", None)
+    return _GOAL_LINE_LABELS[outcome_sign(code)]
 
 def _analizar_precedente_handicap(precedente_data, ah_actual_num, favorito_actual_name, main_home_team_name):
     res_raw = precedente_data.get('res_raw')
@@ -352,87 +359,255 @@ def get_requests_session_of():
     global _requests_session
     with _requests_session_lock:
         if _requests_session is None:
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=0.4, status_forcelist=[500, 502, 503, 504])
-            adapter = HTTPAdapter(max_retries=retries, pool_connections=32, pool_maxsize=32)
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
-            session.headers.update(REQUEST_HEADERS)
-            _requests_session = session
+            _requests_session = build_session(REQUEST_HEADERS)
         return _requests_session
 
+def _parse_match_progression_stats(html: str) -> pd.DataFrame:
+    soup = BeautifulSoup(html, 'lxml')
+    stat_titles = {"Shots": "-", "Shots on Goal": "-", "Attacks": "-", "Dangerous Attacks": "-"}
+    team_tech_div = soup.find('div', id='teamTechDiv_detail')
+    if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
+        for li in stat_list.find_all('li'):
+            if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in stat_titles:
+                values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
+                if len(values) == 2:
+                    stat_titles[stat_title] = {"Home": values[0], "Away": values[1]}
+    table_rows = [{"Estadistica_EN": name, "Casa": vals.get('Home', '-'), "Fuera": vals.get('Away', '-')}
+                  for name, vals in stat_titles.items() if isinstance(vals, dict)]
+    df = pd.DataFrame(table_rows)
+    return df.set_index("Estadistica_EN") if not df.empty else df
+
+def _cached_match_progression_stats(match_id: str):
+    """Devuelve (encontrado, df) según la caché de estadísticas."""
+    cached_value = _read_cache(_stats_cache, match_id, STATS_CACHE_TTL_SECONDS, _stats_cache_lock, 'stats', keep_stale=True)
+    if cached_value is None:
+        return False, None
+    if cached_value is _STATS_NOT_FOUND:
+        return True, None
+    return True, cached_value.copy(deep=True)
+
+def _store_match_progression_stats(match_id: str, df):
+    cache_value = df.copy(deep=True) if df is not None else _STATS_NOT_FOUND
+    _write_cache(_stats_cache, match_id, cache_value, _stats_cache_lock, max_entries=STATS_CACHE_MAX_ENTRIES, cache_name='stats')
+
+def _stale_match_progression_stats(match_id: str):
+    stale_value = _read_stale_cache(_stats_cache, match_id, _stats_cache_lock)
+    if stale_value is None or stale_value is _STATS_NOT_FOUND:
+        return None
+    return stale_value.copy(deep=True)
+
 def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
     if not match_id or not str(match_id).isdigit():
         return None
     match_id = str(match_id)
-    cached_value = _read_cache(_stats_cache, match_id, STATS_CACHE_TTL_SECONDS, _stats_cache_lock)
-    if cached_value is not None:
-        if cached_value is _STATS_NOT_FOUND:
-            return None
-        return cached_value.copy(deep=True)
+    found, cached_df = _cached_match_progression_stats(match_id)
+    if found:
+        return cached_df
 
     url = f"{BASE_URL_OF}/match/live-{match_id}"
     try:
         session = get_requests_session_of()
-        response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
-        stat_titles = {"Shots": "-", "Shots on Goal": "-", "Attacks": "-", "Dangerous Attacks": "-"}
-        team_tech_div = soup.find('div', id='teamTechDiv_detail')
-        if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
-            for li in stat_list.find_all('li'):
-                if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in stat_titles:
-                    values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
-                    if len(values) == 2:
-                        stat_titles[stat_title] = {"Home": values[0], "Away": values[1]}
-        table_rows = [{"Estadistica_EN": name, "Casa": vals.get('Home', '-'), "Fuera": vals.get('Away', '-')}
-                      for name, vals in stat_titles.items() if isinstance(vals, dict)]
-        df = pd.DataFrame(table_rows)
-        df = df.set_index("Estadistica_EN") if not df.empty else df
-        cache_value = df.copy(deep=True) if df is not None else _STATS_NOT_FOUND
-        _write_cache(_stats_cache, match_id, cache_value, _stats_cache_lock)
+        with outbound_call(url), track_outbound('stats'):
+            response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+            response.raise_for_status()
+        df = _parse_match_progression_stats(response.text)
+        _store_match_progression_stats(match_id, df)
         return df
+    except OutboundUnavailable:
+        return _stale_match_progression_stats(match_id)
     except requests.RequestException:
-        _write_cache(_stats_cache, match_id, _STATS_NOT_FOUND, _stats_cache_lock)
+        _store_match_progression_stats(match_id, None)
         return None
 
+# --- Ruta solo-requests asíncrona (aiohttp) ---
+async def _get_match_progression_stats_async(client, match_id: str):
+    found, cached_df = _cached_match_progression_stats(match_id)
+    if found:
+        return cached_df
+    try:
+        html = await client.fetch_text(f"{BASE_URL_OF}/match/live-{match_id}", 'stats')
+    except OutboundUnavailable:
+        return _stale_match_progression_stats(match_id)
+    except Exception:
+        _store_match_progression_stats(match_id, None)
+        return None
+    df = _parse_match_progression_stats(html)
+    _store_match_progression_stats(match_id, df)
+    return df
+
+async def _gather_match_progression_stats(client, match_ids):
+    results = await asyncio.gather(*(_get_match_progression_stats_async(client, mid) for mid in match_ids))
+    return dict(zip(match_ids, results))
+
+def _valid_stats_ids(match_ids):
+    return list(dict.fromkeys(str(mid) for mid in match_ids if mid and str(mid).isdigit()))
+
+def prefetch_match_progression_stats(match_ids) -> dict:
+    """Descarga en paralelo las estadísticas de varios partidos y las deja en caché."""
+    match_ids = _valid_stats_ids(match_ids)
+    if not match_ids:
+        return {}
+    client = get_async_client(REQUEST_HEADERS)
+    return client.run(_gather_match_progression_stats(client, match_ids))
+
+async def cargar_paginas_preview_ligero_async(match_id: str) -> dict:
+    """
+    Páginas de la vista previa ligera: h2h del partido, estadísticas de los últimos partidos
+    y h2h del rival (col3), todo con la misma ClientSession y en paralelo donde se puede.
+    """
+    client = get_async_client(REQUEST_HEADERS)
+    soup = BeautifulSoup(await client.fetch_text(f"{BASE_URL_OF}/match/h2h-{match_id}", 'preview'), 'lxml')
+    home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+    # Sin respuesta en la página se consulta el índice de equipos, que puede leer de disco:
+    # en un hilo aparte para no bloquear el loop compartido con Playwright y aiohttp.
+    last_home, last_away = await asyncio.to_thread(lambda: (
+        extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True, team_id=home_id, main_match_id=match_id),
+        extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False, team_id=away_id, main_match_id=match_id),
+    ))
+    key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup, league_id)
+    _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup, league_id)
+
+    async def load_rival_soup():
+        if not (key_id_a and rival_a_id and rival_b_id):
+            return None
+        try:
+            return BeautifulSoup(await client.fetch_text(f"{BASE_URL_OF}/match/h2h-{key_id_a}", 'preview'), 'lxml')
+        except Exception:
+            return None
+
+    stats_ids = _valid_stats_ids([(last_home or {}).get('match_id'), (last_away or {}).get('match_id')])
+    stats, rival_soup = await asyncio.gather(_gather_match_progression_stats(client, stats_ids), load_rival_soup())
+    col3 = None
+    if rival_soup is not None:
+        col3 = _find_rival_h2h_in_soup(rival_soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+        col3_ids = _valid_stats_ids([col3.get('match_id')]) if col3.get('status') == 'found' else []
+        stats.update(await _gather_match_progression_stats(client, col3_ids))
+    return {"soup": soup, "rival_soup": rival_soup, "h2h_col3": col3, "stats": stats}
+
+def cargar_paginas_preview_ligero(match_id: str) -> dict:
+    """Envoltorio síncrono para Flask y los scripts."""
+    client = get_async_client(REQUEST_HEADERS)
+    paginas = client.run(cargar_paginas_preview_ligero_async(str(match_id)))
+    _index_h2h_page(str(match_id), paginas["soup"])
+    return paginas
+
+def _first_rival_of(soup, table_id, league_id, rival_is_away):
+    if not soup or not (table := history_store(soup).table(table_id)): return None, None, None
+    rival_ids = table.away_team_id if rival_is_away else table.home_team_id
+    has_key = np.array([bool(match_id) for match_id in table.match_id], dtype=bool)
+    i = table.first(table.league_mask(league_id) & (table.vs == "1") & has_key & (rival_ids >= 0))
+    if i is None: return None, None, None
+    return table.match_id[i], str(rival_ids[i]), table.away[i] if rival_is_away else table.home[i]
+
 def get_rival_a_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v1")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 1 and (rival_tag := onclicks[1]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
-    return None, None, None
+    return _first_rival_of(soup, "table_v1", league_id, rival_is_away=True)
 
 def get_rival_b_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v2")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if league_id and row.get("name") != str(league_id):
-            continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 0 and (rival_tag := onclicks[0]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
-    return None, None, None
+    return _first_rival_of(soup, "table_v2", league_id, rival_is_away=False)
 
-def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
-    if not all([driver, key_match_id, rival_a_id, rival_b_id]):
-        return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
-    url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
-    try:
-        driver.get(url)
-        WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
+class SeleniumWaitBudget:
+    """Presupuesto total de espera de Selenium para un análisis; cada espera descuenta lo que consume."""
+
+    def __init__(self, total_seconds: float = SELENIUM_WAIT_BUDGET_SECONDS):
+        self.total_seconds = total_seconds
+        self.used_seconds = 0.0
+        self.exhausted_waits = 0
+
+    def remaining(self):
+        return max(self.total_seconds - self.used_seconds, 0.0)
+
+    def wait_until(self, driver, condition, max_seconds: float):
+        timeout = min(max_seconds, self.remaining())
+        if timeout <= 0:
+            self.exhausted_waits += 1
+            raise TimeoutException("Presupuesto de espera de Selenium agotado")
+        started = time.perf_counter()
         try:
-            select = Select(WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "hSelect_2"))))
-            select.select_by_value("8")
-            time.sleep(0.5)
-        except TimeoutException: pass
+            return WebDriverWait(driver, timeout, poll_frequency=SELENIUM_POLL_SECONDS).until(condition)
+        finally:
+            self.used_seconds += time.perf_counter() - started
+
+    def as_dict(self):
+        return {
+            'budget_s': self.total_seconds,
+            'used_s': round(self.used_seconds, 3),
+            'exhausted_waits': self.exhausted_waits,
+        }
+
+
+_ROW_COUNTS_SCRIPT = (
+    "var rows = document.querySelectorAll(arguments[0]);"
+    " return [Array.prototype.filter.call(rows, function (row) { return row.offsetParent !== null; }).length,"
+    " rows.length];"
+)
+
+
+def _count_rows(driver, table_id):
+    """(filas visibles, filas totales) de una tabla de historial."""
+    visible, total = driver.execute_script(_ROW_COUNTS_SCRIPT, f"#{table_id} tr[id^='tr{table_id[-1]}_']")
+    return visible, total
+
+
+def _select_and_wait_for_table(driver, select_id, table_id, value, budget):
+    """
+    Aplica value (número de partidos a mostrar) en el select, si existe, y espera a que la
+    tabla lo refleje: las filas visibles pasan a ser min(value, filas de la tabla) o, si hay
+    otros filtros activos en la página, al menos cambia su número. Si la tabla ya mostraba
+    ese número de filas no hay nada que esperar. La presencia del select se comprueba una
+    única vez, sin timeouts encadenados.
+    """
+    elements = driver.find_elements(By.ID, select_id)
+    if not elements:
+        return False
+    select = Select(elements[0])
+    try:
+        if select.first_selected_option.get_attribute("value") == value:
+            return True
+        rows_before, _ = _count_rows(driver, table_id)
+        select.select_by_value(value)
+    except NoSuchElementException:
+        return False
+    limit = int(value) if str(value).isdigit() else None
+
+    def table_updated(d):
+        visible, total = _count_rows(d, table_id)
+        return visible != rows_before or (limit is not None and visible == min(limit, total))
+
+    try:
+        budget.wait_until(driver, table_updated, SELECT_SETTLE_TIMEOUT_SECONDS)
+    except TimeoutException:
+        pass
+    return True
+
+
+def _record_wait_budget(budget):
+    timings = get_current_timings()
+    if timings is not None:
+        timings.extras['selenium_wait'] = budget.as_dict()
+    record_stage("selenium.wait_total", budget.used_seconds)
+
+
+def _load_rival_h2h_soup(driver, key_match_id, budget=None):
+    cache_key = f"h2h:{key_match_id}"
+    soup = _read_cache(_soup_cache, cache_key, H2H_COL3_SOUP_CACHE_TTL_SECONDS, _soup_cache_lock, 'soup')
+    if soup is not None:
+        return soup
+    budget = budget or SeleniumWaitBudget()
+    url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
+    with stage_span("h2h_col3.page_load"), track_outbound('selenium'), measure_navigation('chrome'):
+        # La espera de la tabla cuenta para el breaker: una página que carga pero nunca
+        # pinta el historial es un fallo del host igual que un error de red.
+        with outbound_call(url):
+            driver.get(url)
+            budget.wait_until(driver, EC.presence_of_element_located((By.ID, "table_v2")), SELENIUM_TIMEOUT_SECONDS_OF)
+    with stage_span("h2h_col3.select.hSelect_2"):
+        _select_and_wait_for_table(driver, "hSelect_2", "table_v2", "8", budget)
+    with stage_span("h2h_col3.soup_parse"):
         soup = BeautifulSoup(driver.page_source, "lxml")
-    except Exception as e:
-        return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
+    _write_cache(_soup_cache, cache_key, soup, _soup_cache_lock, max_entries=SOUP_CACHE_MAX_ENTRIES, cache_name='soup')
+    return soup
+
+def _find_rival_h2h_in_soup(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name):
     if not (table := soup.find("table", id="table_v2")):
         return {"status": "error", "resultado": "N/A (Tabla H2H Col3 no encontrada)"}
     for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
@@ -457,6 +632,28 @@ def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, riva
             }
     return {"status": "not_found", "resultado": f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name}."}
 
+def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B", wait_budget=None):
+    if not all([driver, key_match_id, rival_a_id, rival_b_id]):
+        return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
+    cache_key = (str(key_match_id), str(rival_a_id), str(rival_b_id))
+    cached = _read_cache(_h2h_col3_cache, cache_key, H2H_COL3_CACHE_TTL_SECONDS, _h2h_col3_cache_lock, 'h2h_col3')
+    if cached is not None:
+        return dict(cached)
+    try:
+        soup = _load_rival_h2h_soup(driver, key_match_id, wait_budget)
+    except Exception as e:
+        return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
+    result = _find_rival_h2h_in_soup(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    if result["status"] != "error":
+        # Un partido ya jugado con marcador no cambia: se guarda sin caducidad.
+        is_final = result["status"] == "found" and result["goles_home"].isdigit() and result["goles_away"].isdigit()
+        _write_cache(
+            _h2h_col3_cache, cache_key, dict(result), _h2h_col3_cache_lock,
+            ttl_seconds=math.inf if is_final else None,
+            max_entries=H2H_COL3_CACHE_MAX_ENTRIES, cache_name='h2h_col3'
+        )
+    return result
+
 def get_team_league_info_from_script_of(soup):
     script_tag = soup.find("script", string=re.compile(r"var _matchInfo = "))
     if not (script_tag and script_tag.string): return (None,) * 3 + ("N/A",) * 3
@@ -472,32 +669,29 @@ def get_team_league_info_from_script_of(soup):
     league_name = find_val(r"lName:\s*'([^']*)'") or "N/A"
     return home_id, away_id, league_id, home_name, away_name, league_name
 
-def _parse_date_ddmmyyyy(d: str) -> tuple:
-    m = re.search(r'(\d{2})-(\d{2})-(\d{4})', d or '')
-    return (int(m.group(3)), int(m.group(2)), int(m.group(1))) if m else (1900, 1, 1)
-
-def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game):
-    if not soup or not (table := soup.find("table", id=table_id)): return None
-    candidate_matches = []
-    score_selector = 'fscore_1' if is_home_game else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')):
-            continue
-        if league_id and details.get("league_id_hist") != str(league_id):
-            continue
-        is_team_home = team_name.lower() in details.get('home', '').lower()
-        is_team_away = team_name.lower() in details.get('away', '').lower()
-        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
-            candidate_matches.append(details)
-    if not candidate_matches: return None
-    candidate_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    last_match = candidate_matches[0]
+def _last_match_in_league(table, team_rows, league_id):
+    i = table.latest(table.league_mask(league_id) & team_rows)
+    if i is None: return None
+    last_match = table.details(i)
     return {
         "date": last_match.get('date', 'N/A'), "home_team": last_match.get('home'),
         "away_team": last_match.get('away'), "score": last_match.get('score_raw', 'N/A').replace('-', ':'),
         "handicap_line_raw": last_match.get('ahLine_raw', 'N/A'), "match_id": last_match.get('matchIndex')
     }
 
+def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game, team_id=None, main_match_id=None):
+    if soup and (table := history_store(soup).table(table_id)):
+        side = 'home' if is_home_game else 'away'
+        if (last_match := _last_match_in_league(table, table.team_mask(team_name, side=side, exact=False), league_id)):
+            return last_match
+    # La página solo muestra los últimos partidos; el índice local guarda más historia del equipo,
+    # pero solo cuentan los partidos anteriores al analizado (main_match_id).
+    if team_id and (team_table := fresh_team_table(team_id)) is not None:
+        side_ids = team_table.home_team_id if is_home_game else team_table.away_team_id
+        before = rows_before_match(team_table, main_match_id, match_kickoff_ordinal(soup))
+        return _last_match_in_league(team_table, (side_ids == int(team_id)) & before, league_id)
+    return None
+
 def extract_bet365_initial_odds_of(soup):
     odds_info = {
         "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
@@ -606,46 +800,50 @@ def extract_final_score_of(soup):
 
 def extract_h2h_data_of(soup, home_name, away_name, league_id=None):
     results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
-    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")): return results
-    all_matches = []
-    for r in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h')):
-            if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
-                all_matches.append(d)
-    if not all_matches: return results
-    all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    most_recent = all_matches[0]
+    if not soup or not home_name or not away_name or not (h2h_table := history_store(soup).table("table_v3")): return results
+    in_league = h2h_table.league_mask(league_id)
+    if (i := h2h_table.latest(in_league)) is None: return results
+    most_recent = h2h_table.details(i)
     results.update({'ah6': most_recent.get('ahLine', '-'), 'res6': most_recent.get('score', '?:?'), 'res6_raw': most_recent.get('score_raw', '?-?'), 'match6_id': most_recent.get('matchIndex'), 'h2h_gen_home': most_recent.get('home'), 'h2h_gen_away': most_recent.get('away')})
-    for d in all_matches:
-        if d['home'].lower() == home_name.lower() and d['away'].lower() == away_name.lower():
-            results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
-            break
+    same_venue = in_league & h2h_table.team_mask(home_name, side='home') & h2h_table.team_mask(away_name, side='away')
+    if (i := h2h_table.latest(same_venue)) is not None:
+        d = h2h_table.details(i)
+        results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
     return results
 
 def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table):
-    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
-    score_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')): continue
-        if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
-        h, a = details.get('home','').lower(), details.get('away','').lower()
-        main, opp = main_team.lower(), opponent.lower()
-        if (main == h and opp == a) or (main == a and opp == h):
-            return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
-    return None
+    if not opponent or opponent == "N/A" or not main_team or not (table := history_store(soup).table(table_id)): return None
+    main_home = table.team_mask(main_team, side='home') & table.team_mask(opponent, side='away')
+    main_away = table.team_mask(main_team, side='away') & table.team_mask(opponent, side='home')
+    if (i := table.first(table.league_mask(league_id, keep_unknown=True) & (main_home | main_away))) is None: return None
+    details = table.details(i)
+    return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main_home[i] else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
 
 
-def _load_main_match_soup(driver, main_match_id: str):
+def _load_main_match_soup(driver, main_match_id: str, budget=None):
+    budget = budget or SeleniumWaitBudget()
     main_page_url = f"{BASE_URL_OF}/match/h2h-{main_match_id}"
-    driver.get(main_page_url)
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "table_v1")))
-    for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
-        try:
-            Select(WebDriverWait(driver, 2).until(EC.presence_of_element_located((By.ID, select_id)))).select_by_value("8")
-            time.sleep(0.1)
-        except TimeoutException:
-            continue
-    return BeautifulSoup(driver.page_source, "lxml")
+    with stage_span("main.page_load"), track_outbound('selenium'), measure_navigation('chrome'):
+        with outbound_call(main_page_url):
+            driver.get(main_page_url)
+            budget.wait_until(driver, EC.presence_of_element_located((By.ID, "table_v1")), 10)
+    for idx, select_id in enumerate(["hSelect_1", "hSelect_2", "hSelect_3"], start=1):
+        with stage_span(f"main.select.{select_id}"):
+            _select_and_wait_for_table(driver, select_id, f"table_v{idx}", "8", budget)
+    with stage_span("main.soup_parse"):
+        soup = BeautifulSoup(driver.page_source, "lxml")
+    _index_h2h_page(main_match_id, soup)
+    return soup
+
+
+def _index_h2h_page(match_id, soup):
+    """Encola la página para el índice local de equipos; la escritura va en segundo plano."""
+    try:
+        with stage_span("team_history.record"):
+            home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+            record_h2h_page(match_id, soup, home_id, away_id, home_name, away_name, league_id)
+    except Exception as exc:
+        print(f"Error al indexar el historial de {match_id}: {exc}")
 
 
 def _build_selenium_options():
@@ -680,6 +878,7 @@ def _get_or_create_selenium_driver():
         if _driver_instance is None:
             try:
                 _driver_instance = webdriver.Chrome(options=_build_selenium_options())
+                apply_chrome_resource_blocking(_driver_instance)
             except WebDriverException as exc:
                 print(f"Error inicializando Selenium driver: {exc}")
                 _driver_instance = None
@@ -688,16 +887,29 @@ def _get_or_create_selenium_driver():
 
 @contextmanager
 def managed_selenium_driver():
+    checkout_started = time.perf_counter()
     driver = _get_or_create_selenium_driver()
     if not driver:
         yield None
         return
-    with _driver_use_lock:
+    DRIVER_WAITING.inc()
+    try:
+        _driver_use_lock.acquire()
+    finally:
+        DRIVER_WAITING.dec()
+    DRIVER_IN_USE.inc()
+    try:
+        checkout_elapsed = time.perf_counter() - checkout_started
+        record_stage("driver.checkout", checkout_elapsed)
+        DRIVER_CHECKOUT_SECONDS.observe(checkout_elapsed)
         try:
             yield driver
         except WebDriverException:
             _reset_selenium_driver()
             raise
+    finally:
+        DRIVER_IN_USE.dec()
+        _driver_use_lock.release()
 
 def analizar_partido_completo(match_id: str):
     main_match_id = "".join(filter(str.isdigit, str(match_id)))
@@ -709,46 +921,84 @@ def analizar_partido_completo(match_id: str):
         return cached_payload
 
     start_time = time.time()
-    try:
-        with managed_selenium_driver() as driver:
-            if not driver:
-                return {"error": "No se pudo inicializar el WebDriver."}
-            soup_completo = _load_main_match_soup(driver, main_match_id)
-            home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(soup_completo)
-            home_standings = extract_standings_data_from_h2h_page_of(soup_completo, home_name)
-            away_standings = extract_standings_data_from_h2h_page_of(soup_completo, away_name)
-            home_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'home')
-            away_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'away')
-            key_match_id_rival_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
-            last_home_match = extract_last_match_in_league_of(soup_completo, "table_v1", home_name, league_id, True)
-            last_away_match = extract_last_match_in_league_of(soup_completo, "table_v2", away_name, league_id, False)
-            h2h_data = extract_h2h_data_of(soup_completo, home_name, away_name, None)
-            comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
-            comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
-            main_match_odds_data = extract_bet365_initial_odds_of(soup_completo)
-            final_score, _ = extract_final_score_of(soup_completo)
-            details_h2h_col3 = get_h2h_details_for_original_logic_of(
-                driver, key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name
-            )
-    except Exception as exc:
-        return {"error": f"Error durante el análisis: {exc}"}
-
-    market_analysis_html = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
-
-    def get_stats_rows(match_id_value):
-        if not match_id_value:
-            return []
-        df = get_match_progression_stats_data(str(match_id_value))
-        return _df_to_rows(df)
-
-    last_home_match_stats = get_stats_rows((last_home_match or {}).get('match_id'))
-    last_away_match_stats = get_stats_rows((last_away_match or {}).get('match_id'))
-    h2h_col3_stats = get_stats_rows((details_h2h_col3 or {}).get('match_id'))
-    comp_L_vs_UV_A_stats = get_stats_rows((comp_L_vs_UV_A or {}).get('match_id'))
-    comp_V_vs_UL_H_stats = get_stats_rows((comp_V_vs_UL_H or {}).get('match_id'))
-    h2h_stadium_stats = get_stats_rows(h2h_data.get('match1_id'))
-    h2h_general_stats = get_stats_rows(h2h_data.get('match6_id'))
+    with collect_stage_timings() as timings:
+        wait_budget = SeleniumWaitBudget()
+        try:
+            with managed_selenium_driver() as driver:
+                if not driver:
+                    return {"error": "No se pudo inicializar el WebDriver."}
+                soup_completo = _load_main_match_soup(driver, main_match_id, wait_budget)
+                home_id, away_id, league_id, home_name, away_name, league_name = timed_call("extract.team_league_info", get_team_league_info_from_script_of, soup_completo)
+                publish_progress("page_loaded", {"home_name": home_name, "away_name": away_name, "league_name": league_name})
+                home_standings = timed_call("extract.home_standings", extract_standings_data_from_h2h_page_of, soup_completo, home_name)
+                away_standings = timed_call("extract.away_standings", extract_standings_data_from_h2h_page_of, soup_completo, away_name)
+                home_ou_stats = timed_call("extract.home_ou_stats", extract_over_under_stats_from_div_of, soup_completo, 'home')
+                away_ou_stats = timed_call("extract.away_ou_stats", extract_over_under_stats_from_div_of, soup_completo, 'away')
+                publish_progress("standings", {
+                    "home_standings": home_standings, "away_standings": away_standings,
+                    "home_ou_stats": home_ou_stats, "away_ou_stats": away_ou_stats,
+                })
+                key_match_id_rival_a, rival_a_id, rival_a_name = timed_call("extract.rival_a", get_rival_a_for_original_h2h_of, soup_completo, league_id)
+                _, rival_b_id, rival_b_name = timed_call("extract.rival_b", get_rival_b_for_original_h2h_of, soup_completo, league_id)
+                last_home_match = timed_call("extract.last_home_match", extract_last_match_in_league_of, soup_completo, "table_v1", home_name, league_id, True, home_id, main_match_id)
+                last_away_match = timed_call("extract.last_away_match", extract_last_match_in_league_of, soup_completo, "table_v2", away_name, league_id, False, away_id, main_match_id)
+                h2h_data = timed_call("extract.h2h_data", extract_h2h_data_of, soup_completo, home_name, away_name, None)
+                comp_L_vs_UV_A = timed_call("extract.comp_L_vs_UV_A", extract_comparative_match_of, soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
+                comp_V_vs_UL_H = timed_call("extract.comp_V_vs_UL_H", extract_comparative_match_of, soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
+                main_match_odds_data = timed_call("extract.bet365_odds", extract_bet365_initial_odds_of, soup_completo)
+                final_score, _ = timed_call("extract.final_score", extract_final_score_of, soup_completo)
+                publish_progress("h2h", {
+                    "final_score": final_score, "h2h_data": h2h_data, "main_match_odds_data": main_match_odds_data,
+                    "last_home_match": last_home_match, "last_away_match": last_away_match,
+                    "comp_L_vs_UV_A": comp_L_vs_UV_A, "comp_V_vs_UL_H": comp_V_vs_UL_H,
+                })
+                with stage_span("h2h_col3.total"):
+                    details_h2h_col3 = get_h2h_details_for_original_logic_of(
+                        driver, key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name,
+                        wait_budget=wait_budget
+                    )
+                publish_progress("h2h_col3", {"details": details_h2h_col3})
+        except OutboundUnavailable as exc:
+            # NowGoal no responde: mejor un análisis caducado que esperar timeouts.
+            stale_payload = _get_stale_analysis(main_match_id)
+            if stale_payload:
+                stale_payload["stale"] = True
+                return stale_payload
+            return {"error": f"NowGoal no está disponible ahora mismo ({exc.reason})."}
+        except Exception as exc:
+            return {"error": f"Error durante el análisis: {exc}"}
+        finally:
+            _record_wait_budget(wait_budget)
+
+        market_analysis_html = timed_call("market_analysis_html", generar_analisis_completo_mercado, main_match_odds_data, h2h_data, home_name, away_name)
+
+        with stage_span("stats.prefetch"):
+            try:
+                prefetch_match_progression_stats([
+                    (last_home_match or {}).get('match_id'), (last_away_match or {}).get('match_id'),
+                    (details_h2h_col3 or {}).get('match_id'), (comp_L_vs_UV_A or {}).get('match_id'),
+                    (comp_V_vs_UL_H or {}).get('match_id'), h2h_data.get('match1_id'), h2h_data.get('match6_id'),
+                ])
+            except Exception as exc:
+                # Si falla la descarga paralela, get_stats_rows recurre a la ruta síncrona.
+                print(f"Error en la descarga paralela de estadísticas para {main_match_id}: {exc}")
+
+        def get_stats_rows(label, match_id_value):
+            if not match_id_value:
+                return []
+            with stage_span(f"stats.{label}"):
+                df = get_match_progression_stats_data(str(match_id_value))
+                rows = _df_to_rows(df)
+            publish_progress(f"stats.{label}", {"match_id": str(match_id_value), "stats": rows})
+            return rows
+
+        last_home_match_stats = get_stats_rows("last_home", (last_home_match or {}).get('match_id'))
+        last_away_match_stats = get_stats_rows("last_away", (last_away_match or {}).get('match_id'))
+        h2h_col3_stats = get_stats_rows("h2h_col3", (details_h2h_col3 or {}).get('match_id'))
+        comp_L_vs_UV_A_stats = get_stats_rows("comp_L_vs_UV_A", (comp_L_vs_UV_A or {}).get('match_id'))
+        comp_V_vs_UL_H_stats = get_stats_rows("comp_V_vs_UL_H", (comp_V_vs_UL_H or {}).get('match_id'))
+        h2h_stadium_stats = get_stats_rows("h2h_stadium", h2h_data.get('match1_id'))
+        h2h_general_stats = get_stats_rows("h2h_general", h2h_data.get('match6_id'))
 
     results = {
         "match_id": main_match_id,
@@ -764,6 +1014,8 @@ def analizar_partido_completo(match_id: str):
             "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
             "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
         },
+        "main_match_odds_data": main_match_odds_data,
+        "h2h_data": h2h_data,
         "market_analysis_html": market_analysis_html,
         "last_home_match": {"details": last_home_match, "stats": last_home_match_stats},
         "last_away_match": {"details": last_away_match, "stats": last_away_match_stats},
@@ -773,6 +1025,9 @@ def analizar_partido_completo(match_id: str):
         "h2h_stadium": {"details": h2h_data, "stats": h2h_stadium_stats},
         "h2h_general": {"details": h2h_data, "stats": h2h_general_stats},
         "execution_time_seconds": round(time.time() - start_time, 2),
+        # Versión del análisis: cambia en cada refresco (la usa la caché del panel renderizado).
+        "generated_at": time.time(),
+        "stage_timings": timings.as_dict(),
     }
 
     _set_cached_analysis(main_match_id, results)
@@ -799,19 +1054,30 @@ def analizar_partidos_handicap(match_id: str, target_handicap_str: str, is_neutr
     except Exception as e:
         return {"error": f"Error al procesar el handicap: {e}"}
 
+    # Si la página del partido ya se indexó (con su fecha) y los dos historiales están frescos,
+    # no hace falta Selenium.
+    known = get_team_index().match_teams(main_match_id)
+    if known and known.get('kickoff') is not None:
+        home_table, away_table = fresh_team_table(known['home_id']), fresh_team_table(known['away_id'])
+        if home_table is not None and away_table is not None:
+            return {
+                "home_match": _index_match_in_handicap_range(home_table, known['home_id'], handicap_range, not is_neutral, main_match_id, known['kickoff']),
+                "away_match": _index_match_in_handicap_range(away_table, known['away_id'], handicap_range, is_neutral, main_match_id, known['kickoff']),
+            }
+
     try:
         with managed_selenium_driver() as driver:
             if not driver:
                 return {"error": "No se pudo inicializar el WebDriver."}
 
             soup = _load_main_match_soup(driver, main_match_id)
-            _, _, _, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
+            home_id, away_id, _, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
 
             if not home_name or not away_name:
                 return {"error": "No se pudieron obtener los nombres de los equipos."}
 
-            home_match = _extract_last_match_in_handicap_range(soup, 'table_v1', home_name, handicap_range, True, is_neutral)
-            away_match = _extract_last_match_in_handicap_range(soup, 'table_v2', away_name, handicap_range, False, is_neutral)
+            home_match = _extract_last_match_in_handicap_range(soup, 'table_v1', home_name, handicap_range, True, is_neutral, home_id, main_match_id)
+            away_match = _extract_last_match_in_handicap_range(soup, 'table_v2', away_name, handicap_range, False, is_neutral, away_id, main_match_id)
 
             return {
                 "home_match": home_match,
@@ -822,87 +1088,42 @@ def analizar_partidos_handicap(match_id: str, target_handicap_str: str, is_neutr
         return {"error": f"Ocurrió un error inesperado durante el análisis: {type(e).__name__}"}
 
 
-def _extract_last_match_in_handicap_range(soup, table_id, team_name, handicap_range, is_home_team_table, is_neutral):
-    """
-    Helper para extraer el último partido de una tabla que cae dentro de un rango de handicap,
-    con lógica corregida para la detección de localía y neutralidad.
-    """
-    candidate_matches = []
-    if not soup or not (table := soup.find("table", id=table_id)):
+def _match_in_handicap_range(table, team_rows, handicap_range):
+    # La web y el índice van del más reciente al más antiguo, así que el primero es el último.
+    i = table.first(team_rows & table.ah_range_mask(handicap_range[0], handicap_range[1]))
+    if i is None:
         return None
+    return {
+        "date": table.date[i],
+        "league": table.league_name[i],
+        "home_team": table.home[i],
+        "away_team": table.away[i],
+        "score": table.score_text[i],
+        "handicap": format_ah_as_decimal_string_of(table.ah_raw[i]),
+        "result": table.ah_result[i],
+    }
 
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        try:
-            cells = row.find_all('td')
-            if len(cells) < 12: continue
-
-            home_team_name_row = (cells[2].find('a') or cells[2]).get_text(strip=True)
-            away_team_name_row = (cells[4].find('a') or cells[4]).get_text(strip=True)
-
-            # Limpiar el '(n)' para comparaciones de nombre
-            clean_team_name = team_name.lower()
-            clean_home_name = home_team_name_row.lower().replace('(n)', '').strip()
-            clean_away_name = away_team_name_row.lower().replace('(n)', '').strip()
-
-            is_team_playing_home = clean_team_name in clean_home_name
-            is_team_playing_away = clean_team_name in clean_away_name
-
-            # Determinar si el partido cumple con el criterio de local/neutral
-            match_is_relevant = False
-            if is_neutral:
-                # Modo neutral: El equipo debe jugar fuera de su rol esperado en la tabla
-                if is_home_team_table and is_team_playing_away: # Equipo local jugando de visitante
-                    match_is_relevant = True
-                elif not is_home_team_table and is_team_playing_home: # Equipo visitante jugando de local
-                    match_is_relevant = True
-            else:
-                # Modo normal: El equipo debe jugar en su rol esperado
-                if is_home_team_table and is_team_playing_home: # Equipo local jugando de local
-                    match_is_relevant = True
-                elif not is_home_team_table and is_team_playing_away: # Equipo visitante jugando de visitante
-                    match_is_relevant = True
-
-            if not match_is_relevant:
-                continue
-
-            # Si el partido es relevante, proceder a verificar el handicap
-            handicap_cell = cells[11]
-            handicap_raw = (handicap_cell.get('data-o') or handicap_cell.text).strip()
-            handicap_num = parse_ah_to_number_of(handicap_raw)
-
-            if handicap_num is not None and handicap_range[0] <= handicap_num <= handicap_range[1]:
-                date_span = cells[1].find('span', attrs={'name': 'timeData'})
-                date_txt = date_span.get_text(strip=True) if date_span else ''
-                
-                league_name = (cells[0].find('a') or cells[0]).get_text(strip=True)
-                
-                score_cell = cells[3]
-                score_span = score_cell.find('span', class_=lambda c: isinstance(c, str) and 'score' in c)
-                score = (score_span or score_cell).get_text(strip=True)
-
-                result_cell = cells[11]
-                result_class = result_cell.get('class', [])
-                result = "Push"
-                if 'f_win' in result_class or 'f_red' in result_class:
-                    result = "Win"
-                elif 'f_loss' in result_class:
-                    result = "Loss"
-
-                candidate_matches.append({
-                    "date": date_txt,
-                    "league": league_name,
-                    "home_team": home_team_name_row,
-                    "away_team": away_team_name_row,
-                    "score": score,
-                    "handicap": format_ah_as_decimal_string_of(handicap_raw),
-                    "result": result
-                })
-        except Exception:
-            continue
-    
-    if not candidate_matches:
-        return None
-    
-    # La web muestra los partidos del más reciente al más antiguo, así que el primero es el último.
-    return candidate_matches[0]
 
+def _index_match_in_handicap_range(team_table, team_id, handicap_range, plays_home, main_match_id=None, kickoff=None):
+    side_ids = team_table.home_team_id if plays_home else team_table.away_team_id
+    before = rows_before_match(team_table, main_match_id, kickoff)
+    return _match_in_handicap_range(team_table, (side_ids == int(team_id)) & before, handicap_range)
+
+
+def _extract_last_match_in_handicap_range(soup, table_id, team_name, handicap_range, is_home_team_table, is_neutral, team_id=None, main_match_id=None):
+    """
+    Helper para extraer el último partido de una tabla que cae dentro de un rango de handicap,
+    con lógica corregida para la detección de localía y neutralidad. Si la página no tiene
+    ninguno, se busca en el índice local del equipo (si está fresco) entre los partidos
+    anteriores al analizado (main_match_id).
+    """
+    # Modo normal: el equipo juega en su rol esperado (local en table_v1, visitante en table_v2).
+    # Modo neutral: juega fuera de ese rol. Los nombres se comparan sin el sufijo '(n)'.
+    plays_home = is_home_team_table != is_neutral
+    if soup and (table := history_store(soup).table(table_id)):
+        relevant = table.clean_name_mask(team_name, 'home' if plays_home else 'away')
+        if (match := _match_in_handicap_range(table, relevant, handicap_range)):
+            return match
+    if team_id and (team_table := fresh_team_table(team_id)) is not None:
+        return _index_match_in_handicap_range(team_table, team_id, handicap_range, plays_home, main_match_id, match_kickoff_ordinal(soup))
+    return None
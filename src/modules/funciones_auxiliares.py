@@ -1,6 +1,11 @@
 # modules/funciones_auxiliares.py
+import numpy as np
+
+from modules.cobertura import ah_cover_code, ah_cover_codes, goal_line_codes, outcome_sign, parse_score, scores_to_arrays
 from modules.utils import parse_ah_to_number_of
 
+_AH_CUBIERTO_LABELS = {True: "Cubierto", False: "No Cubierto", None: "Push"}
+
 def _calcular_estadisticas_contra_rival(matches, equipo):
     """
     Calcula estadísticas resumidas para un equipo contra un rival específico.
@@ -14,39 +19,24 @@ def _calcular_estadisticas_contra_rival(matches, equipo):
     """
     if not matches:
         return {'victorias': 0, 'total': 0, 'over': 0, 'ah_cubierto': 0}
-    
-    victorias = 0
-    over = 0
-    ah_cubierto = 0
-    
-    for match in matches:
-        # Calcular victorias
-        if '-' in match['score_raw']:
-            try:
-                goles_local, goles_visitante = map(int, match['score_raw'].split('-'))
-                
-                if match['home_team'].lower() == equipo.lower() and goles_local > goles_visitante:
-                    victorias += 1
-                elif match['away_team'].lower() == equipo.lower() and goles_visitante > goles_local:
-                    victorias += 1
-            except (ValueError, TypeError):
-                pass
-        
-        # Calcular over/under
-        over_under = _analizar_over_under(match['score_raw'])
-        if over_under == 'Over':
-            over += 1
-            
-        # Calcular handicap cubierto
-        ah_result = _analizar_ah_cubierto(match['score_raw'], match['ah_line_raw'], equipo, match['home_team'], match['away_team'])
-        if ah_result == 'Cubierto':
-            ah_cubierto += 1
-    
+
+    # Una sola pasada vectorizada sobre todas las filas (ver modules/cobertura.py).
+    equipo_lower = equipo.lower()
+    goles_local, goles_visitante = scores_to_arrays([match['score_raw'] for match in matches])
+    lineas_ah = np.array([parse_ah_to_number_of(match['ah_line_raw']) for match in matches], dtype=float)
+    es_local = np.array([match['home_team'].lower() == equipo_lower for match in matches], dtype=bool)
+    es_visitante = np.array([match['away_team'].lower() == equipo_lower for match in matches], dtype=bool)
+
+    victorias = np.sum(es_local & (goles_local > goles_visitante)) + np.sum(es_visitante & (goles_visitante > goles_local))
+    over = np.sum(goal_line_codes(goles_local, goles_visitante, 2.5) > 0)
+    codigos_ah = ah_cover_codes(goles_local, goles_visitante, lineas_ah, es_local)
+    ah_cubierto = np.sum((es_local | es_visitante) & (codigos_ah > 0))
+
     return {
-        'victorias': victorias,
+        'victorias': int(victorias),
         'total': len(matches),
-        'over': over,
-        'ah_cubierto': ah_cubierto
+        'over': int(over),
+        'ah_cubierto': int(ah_cubierto)
     }
 
 def _analizar_over_under(resultado):
@@ -94,29 +84,23 @@ def _analizar_ah_cubierto(resultado, handicap_raw, equipo_favorito, equipo_local
         return "N/A"
     
     try:
-        goles_local, goles_visitante = map(int, resultado.split('-'))
+        goles_local, goles_visitante = parse_score(resultado)
         handicap_num = parse_ah_to_number_of(handicap_raw)
         
         if handicap_num is None:
             return "N/A"
         
-        # Determinar margen de victoria del favorito
         if equipo_favorito.lower() == equipo_local.lower():
-            margen_favorito = goles_local - goles_visitante
+            favorito_local = True
         elif equipo_favorito.lower() == equipo_visitante.lower():
-            margen_favorito = goles_visitante - goles_local
+            favorito_local = False
         else:
             return "N/A"
         
-        # Verificar si se cubrió el handicap
-        if abs(margen_favorito) - abs(handicap_num) > 0.05:
-            return "Cubierto"
-        elif abs(margen_favorito) - abs(handicap_num) < -0.05:
-            return "No Cubierto"
-        else:
-            return "Push"
+        codigo = ah_cover_code(goles_local, goles_visitante, handicap_num, favorito_local)
     except (ValueError, TypeError):
         return "N/A"
+    return _AH_CUBIERTO_LABELS[outcome_sign(codigo)]
 
 def _analizar_desempeno_casa_fuera(matches, equipo):
     """
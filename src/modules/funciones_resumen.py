@@ -1,7 +1,7 @@
 # modules/funciones_resumen.py
 import re
-from bs4 import BeautifulSoup
-from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
+import numpy as np
+from modules.historial import history_store
 
 def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_line):
     """
@@ -51,60 +51,36 @@ def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_
 
 def _obtener_partidos_recientes(soup, table_id, team_name, is_home_team=True):
     """Obtiene los partidos recientes de un equipo."""
-    table = soup.find("table", id=table_id)
-    if not table:
+    table = history_store(soup).table(table_id)
+    if table is None:
         return []
     
-    partidos = []
-    score_selector = 'fscore_1' if is_home_team else 'fscore_2'
+    # Los 5 primeros partidos del equipo con marcador, en el orden de la web
+    rows = np.flatnonzero(table.team_mask(team_name) & table.scored_mask())[:5]
+    # El favorito lo marca el signo de la línea: positiva el local, negativa el visitante
+    lines = table.ah[rows]
+    favorite_is_home = lines > 0
+    favorite_is_away = lines < 0
+    team_is_home = table.team_mask(team_name, side='home')[rows]
+    team_is_away = table.team_mask(team_name, side='away')[rows]
+    team_is_favorite = (favorite_is_home & team_is_home) | (favorite_is_away & team_is_away)
     
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if len(partidos) >= 5:  # Limitar a 5 partidos recientes
-            break
-            
-        cells = row.find_all('td')
-        if len(cells) < 12:
-            continue
-            
-        # Obtener nombres de equipos
-        home_team = cells[2].get_text(strip=True)
-        away_team = cells[4].get_text(strip=True)
-        
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
-            continue
-            
-        # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
-            continue
-            
-        score_raw = score_span.get_text(strip=True)
-        if '-' not in score_raw:
-            continue
-            
-        # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
-        
-        # Determinar si el equipo era favorito
-        ah_line_num = parse_ah_to_number_of(ah_line_raw)
-        favorito = None
-        if ah_line_num is not None:
-            if ah_line_num > 0:
-                favorito = home_team
-            elif ah_line_num < 0:
-                favorito = away_team
-        
+    partidos = []
+    for k, i in enumerate(rows):
+        if favorite_is_home[k]:
+            favorito = table.home[i]
+        elif favorite_is_away[k]:
+            favorito = table.away[i]
+        else:
+            favorito = None
         partidos.append({
-            'home_team': home_team,
-            'away_team': away_team,
-            'score': score_raw,
-            'ah_line_raw': ah_line_raw,
-            'ah_line_num': ah_line_num,
+            'home_team': table.home[i],
+            'away_team': table.away[i],
+            'score': table.score_text[i],
+            'ah_line_raw': table.ah_raw[i],
+            'ah_line_num': None if np.isnan(lines[k]) else float(lines[k]),
             'favorito': favorito,
-            'equipo_es_favorito': team_name.lower() == favorito.lower() if favorito else False
+            'equipo_es_favorito': bool(team_is_favorite[k])
         })
     
     return partidos
@@ -0,0 +1,142 @@
+# src/modules/handicap_asiatico.py
+# Parseo canónico de líneas de hándicap asiático ("0/0.5", "-1.25", "2.5/3"...).
+# El vocabulario es pequeño y se repite miles de veces por análisis: cada cadena se
+# resuelve una sola vez a (número, texto decimal, cubo de medio gol) y se memoiza.
+# Todos los módulos (scraper, utils, app, scripts) pasan por aquí.
+
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+AH_CACHE_MAX_ENTRIES = 4096
+_EMPTY_MARKERS = ('-', '?')
+
+
+class AhLine(NamedTuple):
+    number: float | None      # valor numérico (media de las dos mitades en líneas partidas)
+    display: str              # formato decimal ("0.25", "-1", "2.5") o '-' / '?'
+    half_bucket: str | None   # cubo de medio gol usado por los filtros del dashboard ("0.5", "-1.0")
+
+
+def _normalize(raw: str) -> str:
+    # NowGoal a veces usa el signo menos unicode y coma decimal.
+    return raw.replace('−', '-').replace(',', '.')
+
+
+def _parse(raw: str):
+    s = raw.strip().replace(' ', '')
+    if not s or s in _EMPTY_MARKERS:
+        return None
+    original_starts_with_minus = raw.strip().startswith('-')
+    try:
+        if '/' in s:
+            parts = s.split('/')
+            if len(parts) != 2:
+                return None
+            p1_str, p2_str = parts
+            val1 = float(p1_str)
+            val2 = float(p2_str)
+            # "-0.5/1" y "-0/0.5": el signo de la primera mitad se aplica a la segunda.
+            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
+                val2 = -abs(val2)
+            elif (original_starts_with_minus and val1 == 0.0 and p1_str in ('0', '-0')
+                  and not p2_str.startswith('-') and val2 > 0):
+                val2 = -abs(val2)
+            return (val1 + val2) / 2.0
+        return float(s)
+    except (ValueError, IndexError):
+        return None
+
+
+def _format(raw: str, number, for_sheets: bool = False) -> str:
+    if number is None:
+        stripped = raw.strip()
+        return stripped if stripped in _EMPTY_MARKERS else '-'
+    if number == 0.0:
+        return "0"
+    sign = -1 if number < 0 else 1
+    abs_num = abs(number)
+    mod_val = abs_num % 1
+    if mod_val in (0.0, 0.25, 0.5, 0.75):
+        abs_rounded = abs_num
+    elif mod_val < 0.25:
+        abs_rounded = math.floor(abs_num)
+    elif mod_val < 0.75:
+        abs_rounded = math.floor(abs_num) + 0.5
+    else:
+        abs_rounded = math.ceil(abs_num)
+    value = sign * abs_rounded
+    if value == 0.0:
+        output = "0"
+    elif abs(value - round(value, 0)) < 1e-9:
+        output = str(int(round(value, 0)))
+    elif abs(value - (math.floor(value) + 0.5)) < 1e-9:
+        output = f"{value:.1f}"
+    else:
+        output = f"{value:.2f}"
+    if for_sheets:
+        return "'" + output.replace('.', ',')
+    return output
+
+
+def _bucket_to_half(value: float) -> float:
+    # .25 / .5 / .75 caen en el cubo .5 del mismo entero; las líneas enteras se quedan igual.
+    if value == 0:
+        return 0.0
+    sign = -1.0 if value < 0 else 1.0
+    av = abs(value)
+    base = math.floor(av + 1e-9)
+    frac = av - base
+
+    def close(a, b):
+        return abs(a - b) < 1e-6
+
+    if close(frac, 0.0):
+        bucket = float(base)
+    elif close(frac, 0.5) or close(frac, 0.25) or close(frac, 0.75):
+        bucket = base + 0.5
+    else:
+        bucket = round(av * 2) / 2.0
+        f = bucket - math.floor(bucket)
+        if close(f, 0.0) and (abs(av - (math.floor(bucket) + 0.25)) < 0.26 or abs(av - (math.floor(bucket) + 0.75)) < 0.26):
+            bucket = math.floor(bucket) + 0.5
+    return sign * bucket
+
+
+@lru_cache(maxsize=AH_CACHE_MAX_ENTRIES)
+def _lookup(raw: str) -> AhLine:
+    normalized = _normalize(raw)
+    number = _parse(normalized)
+    half_bucket = f"{_bucket_to_half(number):.1f}" if number is not None else None
+    return AhLine(number, _format(normalized, number), half_bucket)
+
+
+_INVALID = AhLine(None, '-', None)
+
+
+def ah_line(raw) -> AhLine:
+    """Resuelve una línea de hándicap en bruto; lo que no es texto cuenta como línea vacía."""
+    if not isinstance(raw, str):
+        return _INVALID
+    return _lookup(raw)
+
+
+def parse_ah_to_number_of(ah_line_str: str):
+    return ah_line(ah_line_str).number
+
+
+def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
+    line = ah_line(ah_line_str)
+    if for_sheets and line.number is not None and line.number != 0.0:
+        return _format(ah_line_str, line.number, for_sheets=True)
+    return line.display
+
+
+def normalize_handicap_to_half_bucket_str(text):
+    if text is None:
+        return None
+    return ah_line(str(text)).half_bucket
+
+
+def ah_cache_info():
+    return _lookup.cache_info()
@@ -0,0 +1,344 @@
+# src/modules/historial.py
+# Almacén columnar de las tres tablas de historial de la página h2h (table_v1, table_v2, table_v3).
+# Cada tabla se parsea una sola vez a un struct-of-arrays (ids de equipo internados, goles enteros,
+# hándicap en float, fechas como ordinales) y los análisis se expresan como máscaras de NumPy
+# sobre esas columnas en lugar de recorrer las filas de BeautifulSoup una y otra vez.
+# El almacén se memoiza por soup, así que todos los extractores de un mismo análisis lo comparten.
+
+import re
+import threading
+import weakref
+from datetime import date
+
+import numpy as np
+
+from modules.handicap_asiatico import ah_line
+
+HISTORY_TABLE_IDS = ('table_v1', 'table_v2', 'table_v3')
+SCORE_SELECTORS = {'table_v1': 'fscore_1', 'table_v2': 'fscore_2', 'table_v3': 'fscore_3'}
+
+NO_GOALS = -1
+NO_TEAM = -1
+# Fecha ilegible: 1900-01-01, que ordena al final como hacía el antiguo orden por tuplas.
+UNKNOWN_DATE_ORDINAL = date(1900, 1, 1).toordinal()
+
+_HOME_IDX, _SCORE_IDX, _AWAY_IDX, _AH_IDX, _OU_RESULT_IDX = 2, 3, 4, 11, 14
+_DATE_RE = re.compile(r'(\d{2})-(\d{2})-(\d{4})')
+_SCORE_RE = re.compile(r'(\d+)\s*-\s*(\d+)')
+_TEAM_ID_RE = re.compile(r'team\((\d+)\)')
+
+# id(soup) -> (weakref a la soup, almacén). No se usa la soup como clave: Tag.__hash__
+# serializa el documento entero en cada consulta.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def date_to_ordinal(text: str) -> int:
+    m = _DATE_RE.search(text or '')
+    if not m:
+        return UNKNOWN_DATE_ORDINAL
+    try:
+        return date(int(m.group(3)), int(m.group(2)), int(m.group(1))).toordinal()
+    except ValueError:
+        return UNKNOWN_DATE_ORDINAL
+
+
+class TeamInterner:
+    """Nombre de equipo (en minúsculas) -> entero estable, compartido por las tres tablas."""
+
+    def __init__(self):
+        self._ids = {}
+        self.names = []
+
+    def intern(self, name: str) -> int:
+        key = name.lower()
+        team_id = self._ids.get(key)
+        if team_id is None:
+            team_id = self._ids[key] = len(self.names)
+            self.names.append(key)
+        return team_id
+
+    def lookup(self, name) -> int:
+        return self._ids.get((name or '').lower(), NO_TEAM)
+
+    def matching(self, fragment) -> set:
+        """Ids de los equipos cuyo nombre contiene el fragmento (sin distinguir mayúsculas)."""
+        fragment = (fragment or '').lower()
+        return {team_id for team_id, name in enumerate(self.names) if fragment in name}
+
+
+def _cell_text(cell):
+    a = cell.find('a')
+    return a.get_text(strip=True) if a else cell.get_text(strip=True)
+
+
+def _team_id(cell):
+    a = cell.find('a', onclick=True)
+    m = _TEAM_ID_RE.search(a.get('onclick', '')) if a else None
+    return int(m.group(1)) if m else NO_TEAM
+
+
+def _ah_result(cell):
+    classes = cell.get('class', [])
+    if 'f_win' in classes or 'f_red' in classes:
+        return 'Win'
+    if 'f_loss' in classes:
+        return 'Loss'
+    return 'Push'
+
+
+def parse_history_row(row, score_selector):
+    """Misma lectura que get_match_details_from_row_of más las columnas extra del almacén."""
+    cells = row.find_all('td')
+    if len(cells) <= _AH_IDX:
+        return None
+    home, away = _cell_text(cells[_HOME_IDX]), _cell_text(cells[_AWAY_IDX])
+    if not home or not away:
+        return None
+    date_span = cells[1].find('span', attrs={'name': 'timeData'})
+    score_cell = cells[_SCORE_IDX]
+    score_span = score_cell.find('span', class_=lambda c: isinstance(c, str) and score_selector in c)
+    score_text = (score_span.get_text(strip=True) if score_span else score_cell.get_text(strip=True)) or ''
+    ah_cell = cells[_AH_IDX]
+    league_cell = cells[0]
+    return {
+        'date': date_span.get_text(strip=True) if date_span else '',
+        'home': home,
+        'away': away,
+        'home_team_id': _team_id(cells[_HOME_IDX]),
+        'away_team_id': _team_id(cells[_AWAY_IDX]),
+        'score_text': score_text,
+        'score_in_span': score_span is not None,
+        'ah_raw': (ah_cell.get('data-o') or ah_cell.text).strip(),
+        'ah_result': _ah_result(ah_cell),
+        'ou_result': cells[_OU_RESULT_IDX].get_text(strip=True) if len(cells) > _OU_RESULT_IDX else '',
+        'league_name': (league_cell.find('a') or league_cell).get_text(strip=True),
+        'match_id': row.get('index'),
+        'vs': row.get('vs'),
+        'league_id': row.get('name'),
+    }
+
+
+class HistoryTable:
+    """Una tabla de historial en columnas; la fila i de cada array es el partido i de la web."""
+
+    def __init__(self, table_id, rows, interner):
+        self.table_id = table_id
+        self.interner = interner
+        self._opponent_index = {}
+        # Filas parseadas tal cual (dicts serializables): las persiste modules/indice_equipos.py.
+        self.rows = rows
+        n = len(rows)
+        self.date = [r['date'] for r in rows]
+        self.home = [r['home'] for r in rows]
+        self.away = [r['away'] for r in rows]
+        self.score_text = [r['score_text'] for r in rows]
+        self.ah_raw = [r['ah_raw'] for r in rows]
+        self.ah_result = [r['ah_result'] for r in rows]
+        self.ou_result = [r['ou_result'] for r in rows]
+        self.league_name = [r['league_name'] for r in rows]
+        self.match_id = [r['match_id'] for r in rows]
+
+        self.date_ordinal = np.fromiter((date_to_ordinal(d) for d in self.date), dtype=np.int32, count=n)
+        self.home_key = np.array([h.lower() for h in self.home], dtype=str)
+        self.away_key = np.array([a.lower() for a in self.away], dtype=str)
+        self.home_id = np.fromiter((interner.intern(h) for h in self.home), dtype=np.int32, count=n)
+        self.away_id = np.fromiter((interner.intern(a) for a in self.away), dtype=np.int32, count=n)
+        self.score_in_span = np.array([r['score_in_span'] for r in rows], dtype=bool)
+        self.home_team_id = np.array([r['home_team_id'] for r in rows], dtype=np.int64)
+        self.away_team_id = np.array([r['away_team_id'] for r in rows], dtype=np.int64)
+        self.league_id = np.array([r['league_id'] or '' for r in rows], dtype=object)
+        self.vs = np.array([r['vs'] or '' for r in rows], dtype=object)
+
+        self.home_goals = np.full(n, NO_GOALS, dtype=np.int16)
+        self.away_goals = np.full(n, NO_GOALS, dtype=np.int16)
+        for i, text in enumerate(self.score_text):
+            if (m := _SCORE_RE.search(text)):
+                self.home_goals[i], self.away_goals[i] = int(m.group(1)), int(m.group(2))
+        lines = [ah_line(raw) for raw in self.ah_raw]
+        self.ah = np.array([np.nan if line.number is None else line.number for line in lines], dtype=float)
+        self.ah_display = [line.display if raw not in ('', '-') else '-' for raw, line in zip(self.ah_raw, lines)]
+
+    @classmethod
+    def from_element(cls, table, table_id, interner):
+        selector = SCORE_SELECTORS.get(table_id, 'score')
+        rows = []
+        for row in table.find_all('tr', id=re.compile(rf"tr{table_id[-1]}_\d+")):
+            try:
+                parsed = parse_history_row(row, selector)
+            except Exception:
+                parsed = None
+            if parsed:
+                rows.append(parsed)
+        return cls(table_id, rows, interner)
+
+    def __len__(self):
+        return len(self.home)
+
+    # --- máscaras ---
+    def has_score(self):
+        return self.home_goals >= 0
+
+    def scored_mask(self):
+        """Filas con marcador en el span de la tabla (fscore_N) y con guion, como exigen los análisis recientes."""
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        return self.score_in_span & (np.char.find(np.array(self.score_text, dtype=str), '-') >= 0)
+
+    def goals(self):
+        """Goles local / visitante en float con NaN donde no hay marcador (entrada de modules.cobertura)."""
+        home = np.where(self.home_goals >= 0, self.home_goals, np.nan)
+        away = np.where(self.away_goals >= 0, self.away_goals, np.nan)
+        return home, away
+
+    def league_mask(self, league_id, keep_unknown=False):
+        """Filas de la liga; sin league_id, todas. keep_unknown conserva las filas sin liga."""
+        if not league_id:
+            return np.ones(len(self), dtype=bool)
+        mask = self.league_id == str(league_id)
+        if keep_unknown:
+            mask |= self.league_id == ''
+        return mask
+
+    def team_mask(self, name, side='any', exact=True):
+        """
+        Filas donde juega el equipo. exact compara el id internado (nombre completo sin
+        distinguir mayúsculas); exact=False busca el nombre como subcadena, como hace la web.
+        """
+        if exact:
+            team = self.interner.lookup(name)
+            home, away = self.home_id == team, self.away_id == team
+        else:
+            needle = (name or '').lower()
+            home = np.char.find(self.home_key, needle) >= 0 if len(self) else np.zeros(0, dtype=bool)
+            away = np.char.find(self.away_key, needle) >= 0 if len(self) else np.zeros(0, dtype=bool)
+        if side == 'home':
+            return home
+        if side == 'away':
+            return away
+        return home | away
+
+    def clean_name_mask(self, name, side):
+        """Subcadena sobre los nombres sin el sufijo '(n)' de campo neutral."""
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        keys = self.home_key if side == 'home' else self.away_key
+        return np.char.find(np.char.strip(np.char.replace(keys, '(n)', '')), name.lower()) >= 0
+
+    def opponent_rows(self, team_name, side='any'):
+        """
+        Índice hash rival -> filas (en orden de la web) de los partidos del equipo, buscado
+        como subcadena igual que team_mask(exact=False). Se construye una vez por equipo y lado.
+        Una fila en la que el nombre encaja en los dos lados cuenta para ambos rivales.
+        """
+        key = ((team_name or '').lower(), side)
+        index = self._opponent_index.get(key)
+        if index is None:
+            grouped = {}
+            if side in ('home', 'any'):
+                for i in np.flatnonzero(self.team_mask(team_name, side='home', exact=False)):
+                    grouped.setdefault(int(self.away_id[i]), []).append(int(i))
+            if side in ('away', 'any'):
+                for i in np.flatnonzero(self.team_mask(team_name, side='away', exact=False)):
+                    grouped.setdefault(int(self.home_id[i]), []).append(int(i))
+            index = {rival: np.array(sorted(set(rows)), dtype=np.intp) for rival, rows in grouped.items()}
+            self._opponent_index[key] = index
+        return index
+
+    def opponent_rows_by_id(self, team_id):
+        """Índice hash id NowGoal del rival -> filas del equipo team_id (filas sin ids quedan fuera)."""
+        key = ('#id', int(team_id))
+        index = self._opponent_index.get(key)
+        if index is None:
+            home = self.home_team_id == team_id
+            rivals = np.where(home, self.away_team_id, self.home_team_id)
+            plays = (home | (self.away_team_id == team_id)) & (rivals >= 0)
+            grouped = {}
+            for i in np.flatnonzero(plays):
+                grouped.setdefault(int(rivals[i]), []).append(int(i))
+            index = {rival: np.array(rows, dtype=np.intp) for rival, rows in grouped.items()}
+            self._opponent_index[key] = index
+        return index
+
+    def ah_range_mask(self, low, high):
+        return (self.ah >= low) & (self.ah <= high)
+
+    # --- selección ---
+    def first(self, mask):
+        indices = np.flatnonzero(mask)
+        return int(indices[0]) if len(indices) else None
+
+    def latest(self, mask):
+        """Fila más reciente de la máscara; a igual fecha gana la primera de la tabla."""
+        indices = np.flatnonzero(mask)
+        if not len(indices):
+            return None
+        return int(indices[np.argmax(self.date_ordinal[indices])])
+
+    def by_date_desc(self, mask):
+        """Índices de la máscara del más reciente al más antiguo (orden estable)."""
+        indices = np.flatnonzero(mask)
+        return indices[np.argsort(-self.date_ordinal[indices], kind='stable')]
+
+    # --- salida ---
+    def score_raw(self, i):
+        if self.home_goals[i] < 0:
+            return '?-?'
+        return f"{self.home_goals[i]}-{self.away_goals[i]}"
+
+    def details(self, i):
+        """Fila i en el formato de get_match_details_from_row_of."""
+        score_raw = self.score_raw(i)
+        return {
+            'date': self.date[i], 'home': self.home[i], 'away': self.away[i],
+            'score': score_raw.replace('-', ':'), 'score_raw': score_raw,
+            'ahLine': self.ah_display[i], 'ahLine_raw': self.ah_raw[i] or '-',
+            'matchIndex': self.match_id[i], 'vs': self.vs[i] or None,
+            'league_id_hist': self.league_id[i] or None,
+        }
+
+
+class HistoryStore:
+    """Las tres tablas de historial de una página h2h con un único internado de equipos."""
+
+    def __init__(self, tables, interner):
+        self.tables = tables
+        self.interner = interner
+
+    @classmethod
+    def from_soup(cls, soup):
+        interner = TeamInterner()
+        tables = {}
+        for table_id in HISTORY_TABLE_IDS:
+            element = soup.find('table', id=table_id) if soup else None
+            if element is not None:
+                tables[table_id] = HistoryTable.from_element(element, table_id, interner)
+        return cls(tables, interner)
+
+    def table(self, table_id):
+        """La tabla pedida, o None si la página no la trae."""
+        return self.tables.get(table_id)
+
+
+def history_store(soup) -> HistoryStore:
+    """Almacén de la soup, construido la primera vez y compartido mientras la soup viva."""
+    key = id(soup)
+    with _stores_lock:
+        entry = _stores.get(key)
+    if entry is not None and entry[0]() is soup:
+        return entry[1]
+    store = HistoryStore.from_soup(soup)
+    with _stores_lock:
+        entry = _stores.get(key)
+        if entry is not None and entry[0]() is soup:
+            return entry[1]
+        _stores[key] = (weakref.ref(soup), store)
+    weakref.finalize(soup, _forget_store, key)
+    return store
+
+
+def _forget_store(key):
+    with _stores_lock:
+        entry = _stores.get(key)
+        if entry is not None and entry[0]() is None:
+            del _stores[key]
@@ -0,0 +1,96 @@
+# src/modules/http_cache.py
+# Compresión negociada (brotli/gzip), ETags y GET condicional para las respuestas de Flask.
+# brotli es opcional: si el paquete no está instalado solo se ofrece gzip.
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'image/svg+xml',
+})
+STATIC_MAX_AGE_SECONDS = 31536000
+
+
+def make_etag(*parts) -> str:
+    """Etiqueta estable a partir de la versión de los datos (mtime del data store, versión del análisis...)."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def negotiate_encoding(accept_encoding: str | None):
+    """Devuelve 'br', 'gzip' o None según Accept-Encoding (respeta q=0)."""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    for encoding in (('br',) if brotli is not None else ()) + ('gzip',):
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encoding: str | None):
+    """Comprime la respuesta en sitio si merece la pena y el cliente lo acepta."""
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # Una ETag fuerte identifica bytes concretos: cada codificación lleva la suya.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    for encoding in ('br', 'gzip'):
+        if etag.endswith(f"-{encoding}"):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+
+def etag_matches(request, etag: str) -> bool:
+    """If-None-Match contiene etag, sea cual sea la codificación con la que el cliente la recibió."""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(strip_encoding_suffix(tag) == etag for tag in if_none_match.as_set(include_weak=True))
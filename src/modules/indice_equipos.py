@@ -0,0 +1,267 @@
+# src/modules/indice_equipos.py
+# Índice local del historial de cada equipo, con el id de equipo de NowGoal como clave.
+# Cada página h2h que se parsea (análisis completo, vista previa, búsqueda por hándicap)
+# aporta las filas de sus tablas de historial a los dos equipos del partido. Las filas se
+# deduplican por id de partido entre páginas y se guarda un JSON por equipo en
+# TEAM_HISTORY_DIR, así que el índice sobrevive a reinicios. Mientras el historial de un
+# equipo esté fresco (TEAM_HISTORY_FRESH_SECONDS desde la última página con su tabla), las
+# consultas de último partido en liga, rango de hándicap y rivales comunes pueden
+# responderse con datos locales.
+# record_h2h_page encola la indexación en un hilo propio: quien la llama (a menudo con el
+# driver de Selenium prestado) no espera a que se escriban los JSON.
+# El índice mezcla páginas de cualquier fecha, así que puede tener el propio partido analizado
+# y partidos posteriores a él: las consultas filtran con rows_before_match.
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from modules.historial import HistoryTable, TeamInterner, date_to_ordinal, history_store
+from modules.metricas import CACHE_REQUESTS
+
+TEAM_HISTORY_ENABLED = os.environ.get('TEAM_HISTORY_ENABLED', '1') != '0'
+TEAM_HISTORY_DIR = Path(os.environ.get('TEAM_HISTORY_DIR') or Path(__file__).resolve().parent.parent.parent / 'team_history')
+TEAM_HISTORY_FRESH_SECONDS = float(os.environ.get('TEAM_HISTORY_FRESH_SECONDS', 6 * 3600))
+TEAM_HISTORY_MAX_ROWS = int(os.environ.get('TEAM_HISTORY_MAX_ROWS', 200))
+TEAM_HISTORY_MEMORY_TEAMS = 512
+TEAM_HISTORY_MAX_MATCHES = 5000
+_MATCHES_FILE = 'partidos.json'
+# Cada equipo es historia de su propia tabla de la página h2h.
+_OWN_TABLES = ('table_v1', 'table_v2')
+
+CACHE_REQUESTS.touch(cache='team_history', result='hit')
+CACHE_REQUESTS.touch(cache='team_history', result='miss')
+
+
+def _team_key(team_id):
+    text = str(team_id if team_id is not None else '').strip()
+    return int(text) if text.isdigit() else None
+
+
+_MATCH_TIME_RE = re.compile(r"matchTime:\s*'(\d{1,2})/(\d{1,2})/(\d{4})")  # m/d/Y
+_START_DATE_RE = re.compile(r"startDate:\s*'(\d{4})-(\d{2})-(\d{2})")
+
+
+def match_kickoff_ordinal(soup):
+    """Fecha del partido de una página h2h (script _matchInfo) como ordinal, o None."""
+    script_tag = soup.find("script", string=re.compile(r"var _matchInfo = ")) if soup else None
+    if not (script_tag and script_tag.string):
+        return None
+    if (m := _MATCH_TIME_RE.search(script_tag.string)):
+        month, day, year = map(int, m.groups())
+    elif (m := _START_DATE_RE.search(script_tag.string)):
+        year, month, day = map(int, m.groups())
+    else:
+        return None
+    try:
+        return date(year, month, day).toordinal()
+    except ValueError:
+        return None
+
+
+def _row_key(row):
+    return row.get('match_id') or f"{row.get('date')}|{row.get('home_team_id')}|{row.get('away_team_id')}"
+
+
+class TeamHistoryIndex:
+    """
+    Historial por equipo en disco con una LRU en memoria de los equipos consultados.
+    _lock protege solo el estado en memoria y nunca se mantiene durante lecturas o
+    escrituras de disco; _record_lock serializa las altas para que los JSON se escriban
+    en el mismo orden en que se fusionan las filas.
+    """
+
+    def __init__(self, directory=TEAM_HISTORY_DIR, fresh_seconds=TEAM_HISTORY_FRESH_SECONDS):
+        self.directory = Path(directory)
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._record_lock = threading.Lock()
+        self._teams = OrderedDict()  # team_id -> {'team_id', 'name', 'refreshed_at', 'rows'}
+        self._tables = {}            # team_id -> HistoryTable de sus filas
+        self._matches = None         # match_id -> equipos del partido (para responder sin la página)
+
+    # --- persistencia ---
+    def _team_path(self, team_id):
+        return self.directory / f'{team_id}.json'
+
+    def _read_json(self, path):
+        try:
+            with path.open('r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, path, payload):
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('w', encoding='utf-8') as fh:
+                json.dump(payload, fh, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            print(f"Error al escribir el índice de equipos ({path.name}): {exc}")
+
+    def _entry(self, team_id):
+        with self._lock:
+            entry = self._teams.get(team_id)
+            if entry is not None:
+                self._teams.move_to_end(team_id)
+                return entry
+        loaded = self._read_json(self._team_path(team_id)) or {
+            'team_id': team_id, 'name': None, 'refreshed_at': 0.0, 'rows': []
+        }
+        with self._lock:
+            # Otro hilo pudo cargarlo mientras se leía el disco: gana el que ya está en memoria.
+            entry = self._teams.setdefault(team_id, loaded)
+            self._teams.move_to_end(team_id)
+            while len(self._teams) > TEAM_HISTORY_MEMORY_TEAMS:
+                evicted, _ = self._teams.popitem(last=False)
+                self._tables.pop(evicted, None)
+            return entry
+
+    def _match_map(self):
+        if self._matches is None:
+            loaded = OrderedDict(self._read_json(self.directory / _MATCHES_FILE) or {})
+            with self._lock:
+                if self._matches is None:
+                    self._matches = loaded
+        return self._matches
+
+    # --- alimentación ---
+    def record_page(self, match_id, soup, home_id, away_id, home_name=None, away_name=None, league_id=None):
+        """Añade las filas de historial de una página h2h a los dos equipos del partido."""
+        store = history_store(soup)
+        teams = [
+            (team_id, name, own_table)
+            for team_id, name, own_table in zip(map(_team_key, (home_id, away_id)), (home_name, away_name), _OWN_TABLES)
+            if team_id is not None
+        ]
+        now = time.time()
+        writes = []
+        with self._record_lock:
+            for team_id, name, own_table in teams:
+                entry = self._entry(team_id)
+                page_rows = [
+                    row for table in store.tables.values() for row in table.rows
+                    if team_id in (row['home_team_id'], row['away_team_id'])
+                ]
+                with self._lock:
+                    rows = {_row_key(row): row for row in entry['rows']}
+                    rows.update((_row_key(row), row) for row in page_rows)
+                    ordered = sorted(rows.values(), key=lambda row: date_to_ordinal(row['date']), reverse=True)
+                    entry['rows'] = ordered[:TEAM_HISTORY_MAX_ROWS]
+                    entry['name'] = name or entry['name']
+                    # Solo la tabla propia trae los últimos partidos completos del equipo.
+                    if store.table(own_table) is not None:
+                        entry['refreshed_at'] = now
+                    self._tables.pop(team_id, None)
+                    writes.append((self._team_path(team_id), dict(entry)))
+            if match_id and len(teams) == 2:
+                matches = self._match_map()
+                with self._lock:
+                    matches.pop(str(match_id), None)
+                    matches[str(match_id)] = {
+                        'home_id': teams[0][0], 'away_id': teams[1][0],
+                        'home_name': home_name, 'away_name': away_name, 'league_id': league_id,
+                        'kickoff': match_kickoff_ordinal(soup),
+                    }
+                    while len(matches) > TEAM_HISTORY_MAX_MATCHES:
+                        matches.popitem(last=False)
+                    writes.append((self.directory / _MATCHES_FILE, dict(matches)))
+            # Las copias se serializan fuera de _lock: las consultas no esperan al disco.
+            for path, payload in writes:
+                self._write_json(path, payload)
+
+    # --- consultas ---
+    def is_fresh(self, team_id) -> bool:
+        team_id = _team_key(team_id)
+        if team_id is None:
+            return False
+        refreshed_at = self._entry(team_id)['refreshed_at']
+        fresh = time.time() - refreshed_at <= self.fresh_seconds
+        CACHE_REQUESTS.inc(cache='team_history', result='hit' if fresh else 'miss')
+        return fresh
+
+    def match_teams(self, match_id):
+        """Equipos de un partido cuya página ya se indexó, o None."""
+        matches = self._match_map()
+        with self._lock:
+            return matches.get(str(match_id))
+
+    def team_table(self, team_id):
+        """Historial del equipo como HistoryTable, del partido más reciente al más antiguo."""
+        team_id = _team_key(team_id)
+        if team_id is None:
+            return None
+        entry = self._entry(team_id)
+        with self._lock:
+            table = self._tables.get(team_id)
+            if table is None:
+                table = self._tables[team_id] = HistoryTable(f'team_{team_id}', entry['rows'], TeamInterner())
+            return table
+
+    def team_name(self, team_id):
+        team_id = _team_key(team_id)
+        if team_id is None:
+            return None
+        return self._entry(team_id)['name']
+
+
+_index = None
+_index_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='team-history')
+
+
+def get_team_index() -> TeamHistoryIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TeamHistoryIndex()
+        return _index
+
+
+def fresh_team_table(team_id):
+    """Historial local del equipo si está activado y fresco; None si hay que ir a la página."""
+    if not TEAM_HISTORY_ENABLED or _team_key(team_id) is None:
+        return None
+    index = get_team_index()
+    return index.team_table(team_id) if index.is_fresh(team_id) else None
+
+
+def rows_before_match(table, main_match_id=None, kickoff=None):
+    """
+    Máscara de las filas de un historial del índice jugadas antes del partido analizado
+    (main_match_id, que también queda fuera). Sin kickoff se usa la fecha guardada al
+    indexar la página del partido; las filas sin fecha se conservan.
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if main_match_id:
+        main_match_id = str(main_match_id)
+        mask &= np.array([match_id != main_match_id for match_id in table.match_id], dtype=bool)
+        if kickoff is None:
+            kickoff = (get_team_index().match_teams(main_match_id) or {}).get('kickoff')
+    if kickoff is not None:
+        mask &= table.date_ordinal < kickoff
+    return mask
+
+
+def _record_in_background(match_id, soup, home_id, away_id, home_name, away_name, league_id):
+    try:
+        get_team_index().record_page(match_id, soup, home_id, away_id, home_name, away_name, league_id)
+    except Exception as exc:
+        print(f"Error al indexar el historial de {match_id}: {exc}")
+
+
+def record_h2h_page(match_id, soup, home_id, away_id, home_name=None, away_name=None, league_id=None):
+    """Encola la indexación de la página; devuelve el Future (None si el índice está desactivado)."""
+    if not TEAM_HISTORY_ENABLED or soup is None:
+        return None
+    return _writer.submit(_record_in_background, match_id, soup, home_id, away_id, home_name, away_name, league_id)
@@ -0,0 +1,244 @@
+# src/modules/metricas.py
+# Registro mínimo de métricas con exposición en formato de texto de Prometheus.
+# No depende de prometheus_client: cualquier scraper (o un curl) puede leer /metrics.
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label_value(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Etiquetas inválidas para {self.name}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _render_samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def touch(self, **labels):
+        """Inicializa la serie a 0 para que aparezca antes del primer evento."""
+        key = self._key(labels)
+        with self._lock:
+            self._values.setdefault(key, 0)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _render_samples(self):
+        if self._callback is not None:
+            try:
+                values = self._callback()
+            except Exception:
+                values = {}
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = sorted((key if isinstance(key, tuple) else (key,), value) for key, value in values.items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][idx] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted((key, {'counts': list(v['counts']), 'sum': v['sum'], 'count': v['count']}) for key, v in self._values.items())
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base_labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base_labels} {_format_value(round(entry['sum'], 6))}")
+            lines.append(f"{self.name}_count{base_labels} {entry['count']}")
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == metric.name:
+                return existing
+        _registry.append(metric)
+    return metric
+
+
+def counter(name: str, help_text: str, labelnames=()):
+    return _register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames=(), callback=None):
+    return _register(Gauge(name, help_text, labelnames, callback=callback))
+
+
+def histogram(name: str, help_text: str, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+    return _register(Histogram(name, help_text, labelnames, buckets=buckets))
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# --- MÉTRICAS COMPARTIDAS ---
+HTTP_REQUEST_SECONDS = histogram(
+    'app_http_request_duration_seconds', 'Latencia de las peticiones HTTP por ruta.', ('route', 'method', 'status')
+)
+CACHE_REQUESTS = counter(
+    'app_cache_requests_total', 'Consultas a caché por resultado (hit/miss).', ('cache', 'result')
+)
+CACHE_EVICTIONS = counter(
+    'app_cache_evictions_total', 'Entradas expulsadas de caché por expiración o límite.', ('cache',)
+)
+OUTBOUND_REQUESTS = counter(
+    'app_nowgoal_requests_total', 'Peticiones salientes a NowGoal por origen y resultado.', ('source', 'outcome')
+)
+OUTBOUND_SECONDS = histogram(
+    'app_nowgoal_request_duration_seconds', 'Latencia de las peticiones salientes a NowGoal.', ('source',)
+)
+DRIVER_CHECKOUT_SECONDS = histogram(
+    'app_selenium_driver_checkout_seconds', 'Espera hasta obtener el driver de Selenium compartido.'
+)
+DRIVER_IN_USE = gauge(
+    'app_selenium_drivers_in_use', 'Drivers de Selenium actualmente prestados.'
+)
+DRIVER_WAITING = gauge(
+    'app_selenium_driver_waiters', 'Hilos esperando por un driver de Selenium.'
+)
+DATA_STORE_RELOADS = counter(
+    'app_data_store_reloads_total', 'Lecturas de data.json por resultado.', ('outcome',)
+)
+ANALYSIS_STAGE_SECONDS = histogram(
+    'app_analysis_stage_duration_seconds', 'Duración de cada etapa de analizar_partido_completo.', ('stage',)
+)
+
+for _cache_name in ('soup', 'stats', 'analysis', 'h2h_col3', 'preview_disk', 'panel_html', 'dashboard'):
+    for _result in ('hit', 'miss'):
+        CACHE_REQUESTS.touch(cache=_cache_name, result=_result)
+    CACHE_EVICTIONS.touch(cache=_cache_name)
+DRIVER_IN_USE.set(0)
+DRIVER_WAITING.set(0)
+
+
+@contextmanager
+def track_outbound(source: str):
+    """Cuenta y cronometra una petición saliente; cualquier excepción cuenta como error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_REQUESTS.inc(source=source, outcome='error')
+        raise
+    else:
+        OUTBOUND_REQUESTS.inc(source=source, outcome='ok')
+    finally:
+        OUTBOUND_SECONDS.observe(time.perf_counter() - start, source=source)
@@ -0,0 +1,164 @@
+# src/modules/perfilado.py
+# Perfilado bajo demanda de peticiones lentas.
+#  - Explícito: cProfile sobre una petición concreta (flag + token de administración).
+#  - Automático (opt-in con PROFILE_SLOW_REQUEST_SECONDS > 0): muestreo ligero de pilas;
+#    solo se guarda si la petición supera el umbral.
+# Los perfiles se guardan en un directorio acotado (se borran los más antiguos).
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from pathlib import Path
+
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR') or Path(__file__).resolve().parent.parent.parent / 'profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 40))
+# Sin definir o 0: sin muestreo automático.
+PROFILE_SLOW_REQUEST_SECONDS = float(os.environ.get('PROFILE_SLOW_REQUEST_SECONDS') or 0)
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.02
+PROFILE_TOP_FUNCTIONS = 60
+
+_dir_lock = threading.Lock()
+
+
+def _safe_label(label: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', label or 'request').strip('_')[:80] or 'request'
+
+
+def _prune_profiles():
+    files = sorted((p for p in PROFILE_DIR.glob('*') if p.is_file()), key=lambda p: p.stat().st_mtime)
+    excess = len(files) - PROFILE_MAX_FILES
+    for path in files[:max(excess, 0)]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def _write_profile_files(label: str, files: dict):
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    base = f"{stamp}_{int(time.time() * 1000) % 1000:03d}_{_safe_label(label)}"
+    written = []
+    with _dir_lock:
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            for suffix, writer in files.items():
+                path = PROFILE_DIR / f"{base}{suffix}"
+                writer(path)
+                written.append(path.name)
+            _prune_profiles()
+        except OSError as exc:
+            print(f"Error al guardar perfil {base}: {exc}")
+    return written
+
+
+def list_profiles():
+    if not PROFILE_DIR.exists():
+        return []
+    entries = []
+    for path in sorted(PROFILE_DIR.glob('*'), key=lambda p: p.stat().st_mtime, reverse=True):
+        if path.is_file():
+            stat = path.stat()
+            entries.append({'name': path.name, 'bytes': stat.st_size, 'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))})
+    return entries
+
+
+class RequestProfile:
+    """cProfile sobre el hilo de la petición actual."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self._profiler = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._profiler.enable()
+
+    def stop(self):
+        self._profiler.disable()
+        elapsed = time.perf_counter() - self._started
+        summary = io.StringIO()
+        summary.write(f"# {self.label} - {elapsed:.2f}s\n")
+        pstats.Stats(self._profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        profiler = self._profiler
+        return _write_profile_files(self.label, {
+            '.prof': lambda path: profiler.dump_stats(str(path)),
+            '.txt': lambda path: path.write_text(summary.getvalue(), encoding='utf-8'),
+        })
+
+
+class _StackSampler:
+    """
+    Un único hilo que muestrea periódicamente las pilas de los hilos registrados. Termina en
+    cuanto no queda ninguna petición registrada; register() lo vuelve a arrancar.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def register(self, thread_id: int):
+        stacks = _StackCounter()
+        with self._lock:
+            self._sessions[thread_id] = stacks
+            self._ensure_thread()
+        return stacks
+
+    def unregister(self, thread_id: int):
+        with self._lock:
+            return self._sessions.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                sessions = dict(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for thread_id, stacks in sessions.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stacks[';'.join(reversed(parts))] += 1
+
+
+_sampler = _StackSampler(PROFILE_SAMPLE_INTERVAL_SECONDS)
+
+
+class SlowRequestSampler:
+    """Muestrea la petición en curso y guarda las pilas colapsadas solo si resulta lenta."""
+
+    def __init__(self, label: str, threshold_seconds: float = PROFILE_SLOW_REQUEST_SECONDS):
+        self.label = label
+        self.threshold_seconds = threshold_seconds
+        self._thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        _sampler.register(self._thread_id)
+
+    def stop(self):
+        stacks = _sampler.unregister(self._thread_id)
+        elapsed = time.perf_counter() - self._started
+        if not stacks or elapsed < self.threshold_seconds:
+            return []
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        header = f"# {self.label} - {elapsed:.2f}s - muestreo cada {PROFILE_SAMPLE_INTERVAL_SECONDS * 1000:.0f} ms (formato collapsed)\n"
+        return _write_profile_files(f"slow_{self.label}", {
+            '.collapsed.txt': lambda path: path.write_text(header + '\n'.join(lines) + '\n', encoding='utf-8'),
+        })
@@ -0,0 +1,139 @@
+# src/modules/playwright_pool.py
+# Navegador Playwright de larga duración, que vive en el event loop de fondo del proceso.
+# Cada petición recibe un contexto/página nuevos de un pool acotado; si el navegador
+# se cae se relanza en la siguiente petición.
+
+import asyncio
+import atexit
+import threading
+
+from modules.bloqueo_recursos import measure_navigation, playwright_route_filter
+from modules.bucle_fondo import get_background_loop
+from modules.metricas import gauge
+
+PLAYWRIGHT_MAX_PAGES = 3
+PLAYWRIGHT_NAVIGATION_TIMEOUT_MS = 20000
+PLAYWRIGHT_READY_TIMEOUT_MS = 8000
+PLAYWRIGHT_FETCH_TIMEOUT_SECONDS = 45
+
+# Filas de partidos de la portada: indica que los scripts ya pintaron la tabla.
+_MATCH_ROWS_SELECTOR = "tr[id^='tr1_']"
+
+
+class PlaywrightBrowserPool:
+    def __init__(self, max_pages: int = PLAYWRIGHT_MAX_PAGES, user_agent: str | None = None):
+        self.max_pages = max_pages
+        self.user_agent = user_agent
+        self._background = get_background_loop()
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = None
+        self._pages = None
+        self.active_pages = 0
+        self.restarts = 0
+
+    # --- Ciclo de vida del navegador (siempre dentro del loop de fondo) ---
+    def _ensure_primitives(self):
+        # Se crean dentro del loop de fondo, la primera vez que se usan.
+        if self._browser_lock is None:
+            self._browser_lock = asyncio.Lock()
+            self._pages = asyncio.Semaphore(self.max_pages)
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._browser is not None:
+                self.restarts += 1
+            await self._close_browser()
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            return self._browser
+
+    async def _close_browser(self):
+        browser, playwright = self._browser, self._playwright
+        self._browser = self._playwright = None
+        for closer in (getattr(browser, 'close', None), getattr(playwright, 'stop', None)):
+            if closer is None:
+                continue
+            try:
+                await closer()
+            except Exception:
+                pass
+
+    async def _fetch(self, url: str, filter_state: int | None):
+        self._ensure_primitives()
+        async with self._pages:
+            browser = await self._get_browser()
+            self.active_pages += 1
+            context = None
+            try:
+                context = await browser.new_context(user_agent=self.user_agent) if self.user_agent else await browser.new_context()
+                page = await context.new_page()
+                await page.route("**/*", playwright_route_filter)
+                with measure_navigation('playwright'):
+                    await page.goto(url, wait_until="domcontentloaded", timeout=PLAYWRIGHT_NAVIGATION_TIMEOUT_MS)
+                try:
+                    await page.wait_for_selector(_MATCH_ROWS_SELECTOR, state='attached', timeout=PLAYWRIGHT_READY_TIMEOUT_MS)
+                except Exception:
+                    pass
+                if filter_state is not None:
+                    try:
+                        await page.wait_for_function("typeof HideByState === 'function'", timeout=PLAYWRIGHT_READY_TIMEOUT_MS)
+                        # HideByState oculta las filas de forma síncrona: no hace falta esperar después.
+                        await page.evaluate("(state) => HideByState(state)", filter_state)
+                    except Exception as eval_err:
+                        print(f"Advertencia al aplicar HideByState({filter_state}) en {url}: {eval_err}")
+                return await page.content()
+            except Exception:
+                if not browser.is_connected():
+                    await self._close_browser()
+                raise
+            finally:
+                self.active_pages -= 1
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+
+    # --- API pública ---
+    def submit(self, url: str, filter_state: int | None = None):
+        """Programa la descarga en el loop de fondo y devuelve un concurrent.futures.Future."""
+        return self._background.submit(self._fetch(url, filter_state))
+
+    def fetch_html(self, url: str, filter_state: int | None = None, timeout: float = PLAYWRIGHT_FETCH_TIMEOUT_SECONDS):
+        return self.submit(url, filter_state).result(timeout)
+
+    async def fetch_html_async(self, url: str, filter_state: int | None = None):
+        if self._background.in_loop():
+            return await self._fetch(url, filter_state)
+        return await asyncio.wrap_future(self.submit(url, filter_state))
+
+    def shutdown(self):
+        if not self._background.is_running():
+            return
+        try:
+            self._background.run(self._close_browser(), timeout=10)
+        except Exception:
+            pass
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_playwright_pool(user_agent: str | None = None):
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = PlaywrightBrowserPool(user_agent=user_agent)
+            atexit.register(_shared_pool.shutdown)
+        return _shared_pool
+
+
+gauge('app_playwright_pages_in_use', 'Páginas de Playwright abiertas en el pool.',
+      callback=lambda: _shared_pool.active_pages if _shared_pool else 0)
+gauge('app_playwright_browser_restarts', 'Relanzamientos del navegador de Playwright tras una caída.',
+      callback=lambda: _shared_pool.restarts if _shared_pool else 0)
@@ -0,0 +1,124 @@
+# src/modules/prefetch.py
+# Precarga de análisis de los próximos partidos mientras el servidor está ocioso.
+# Recorre los partidos por hora de inicio y encola análisis de baja prioridad
+# para los N primeros cuya caché no esté lo bastante fresca.
+
+import datetime
+import threading
+import time
+
+# (segundos hasta el inicio, antigüedad máxima de la caché en segundos)
+REFRESH_WINDOWS = (
+    (3600, 10 * 60),
+    (6 * 3600, 60 * 60),
+    (None, 6 * 3600),
+)
+# Partidos que ya empezaron hace más de esto dejan de precargarse.
+STARTED_GRACE_SECONDS = 2 * 3600
+
+
+def max_cache_age_for_kickoff(kickoff, now=None):
+    if kickoff is None:
+        return REFRESH_WINDOWS[-1][1]
+    now = now or datetime.datetime.utcnow()
+    seconds_to_kickoff = (kickoff - now).total_seconds()
+    for window, max_age in REFRESH_WINDOWS:
+        if window is None or seconds_to_kickoff <= window:
+            return max_age
+    return REFRESH_WINDOWS[-1][1]
+
+
+class PrefetchScheduler:
+    """
+    list_upcoming() -> [(match_id, kickoff_datetime_utc), ...] ordenados por inicio.
+    submit(match_id) -> trabajo encolado (o None si la cola está llena).
+    cache_age(match_id) -> segundos desde el último análisis guardado, o None.
+    """
+
+    def __init__(self, list_upcoming, submit, cache_age, top_n=8, concurrency=1,
+                 min_interval_seconds=20.0, idle_seconds=30.0, tick_seconds=10.0):
+        self._list_upcoming = list_upcoming
+        self._submit = submit
+        self._cache_age = cache_age
+        self.top_n = top_n
+        self.concurrency = max(int(concurrency), 1)
+        self.min_interval_seconds = min_interval_seconds
+        self.idle_seconds = idle_seconds
+        self.tick_seconds = tick_seconds
+        self._last_interactive = time.monotonic()
+        self._last_submit = 0.0
+        self._in_flight = []
+        self._submitted_total = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def notify_interactive(self):
+        self._last_interactive = time.monotonic()
+
+    def is_idle(self):
+        return (time.monotonic() - self._last_interactive) >= self.idle_seconds
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='analysis-prefetch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for job in self._in_flight if not job.finished)
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'idle': self.is_idle(),
+            'in_flight': in_flight,
+            'submitted_total': self._submitted_total,
+        }
+
+    def _needs_refresh(self, match_id, kickoff, now):
+        age = self._cache_age(match_id)
+        return age is None or age > max_cache_age_for_kickoff(kickoff, now)
+
+    def run_once(self):
+        """Una pasada del planificador. Devuelve cuántos trabajos se encolaron."""
+        submitted = 0
+        with self._lock:
+            self._in_flight = [job for job in self._in_flight if not job.finished]
+        now = datetime.datetime.utcnow()
+        for match_id, kickoff in self._list_upcoming()[:self.top_n]:
+            if self._stop.is_set() or not self.is_idle():
+                break
+            with self._lock:
+                if len(self._in_flight) >= self.concurrency:
+                    break
+                if any(job.match_id == str(match_id) for job in self._in_flight):
+                    continue
+            if kickoff is not None and (now - kickoff).total_seconds() > STARTED_GRACE_SECONDS:
+                continue
+            if not self._needs_refresh(match_id, kickoff, now):
+                continue
+            if (time.monotonic() - self._last_submit) < self.min_interval_seconds:
+                break
+            job = self._submit(match_id)
+            if job is None:
+                break
+            self._last_submit = time.monotonic()
+            with self._lock:
+                self._in_flight.append(job)
+                self._submitted_total += 1
+            submitted += 1
+        return submitted
+
+    def _run(self):
+        while not self._stop.wait(self.tick_seconds):
+            if not self.is_idle():
+                continue
+            try:
+                self.run_once()
+            except Exception as exc:
+                print(f"Error en la precarga de análisis: {exc}")
@@ -0,0 +1,101 @@
+# src/modules/tiempos.py
+# Instrumentación por etapas del análisis: cada tramo se anota en el
+# colector activo del hilo (si lo hay) y en el agregado del proceso.
+
+import threading
+import time
+from contextlib import contextmanager
+
+from modules.metricas import ANALYSIS_STAGE_SECONDS
+
+_local = threading.local()
+_stage_totals = {}
+_stage_totals_lock = threading.Lock()
+
+
+class StageTimings:
+    """Tramos medidos durante un único análisis, en orden de ejecución."""
+
+    def __init__(self):
+        self.spans = []
+        self.extras = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage: str, elapsed: float):
+        self.spans.append({'stage': stage, 'ms': round(elapsed * 1000, 1)})
+
+    def as_dict(self):
+        data = {
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 1),
+            'spans': list(self.spans),
+        }
+        data.update(self.extras)
+        return data
+
+
+def _record_total(stage: str, elapsed: float):
+    with _stage_totals_lock:
+        entry = _stage_totals.get(stage)
+        if entry is None:
+            entry = _stage_totals[stage] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        entry['count'] += 1
+        entry['total'] += elapsed
+        if elapsed > entry['max']:
+            entry['max'] = elapsed
+
+
+def get_current_timings():
+    return getattr(_local, 'timings', None)
+
+
+def record_stage(stage: str, elapsed: float):
+    timings = get_current_timings()
+    if timings is not None:
+        timings.add(stage, elapsed)
+    _record_total(stage, elapsed)
+    ANALYSIS_STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+@contextmanager
+def stage_span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_stage_timings():
+    previous = get_current_timings()
+    timings = StageTimings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def get_stage_summary():
+    with _stage_totals_lock:
+        snapshot = {stage: dict(entry) for stage, entry in _stage_totals.items()}
+    summary = {}
+    for stage, entry in sorted(snapshot.items(), key=lambda item: item[1]['total'], reverse=True):
+        count = entry['count'] or 1
+        summary[stage] = {
+            'count': entry['count'],
+            'total_ms': round(entry['total'] * 1000, 1),
+            'avg_ms': round(entry['total'] * 1000 / count, 1),
+            'max_ms': round(entry['max'] * 1000, 1),
+        }
+    return summary
+
+
+def reset_stage_summary():
+    with _stage_totals_lock:
+        _stage_totals.clear()
+
+
+def timed_call(stage: str, func, *args, **kwargs):
+    with stage_span(stage):
+        return func(*args, **kwargs)
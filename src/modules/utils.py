@@ -1,6 +1,8 @@
 # modules/utils.py
 import re
-import math
+
+from modules.cobertura import ah_cover_code, goal_line_code, outcome_sign, parse_score
+from modules.handicap_asiatico import format_ah_as_decimal_string_of, parse_ah_to_number_of
 
 def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h'):
     """Extrae detalles de un partido desde una fila de la tabla."""
@@ -39,123 +41,36 @@ def get_match_details_from_row_of(row_element, score_class_selector='score', sou
     except Exception:
         return None
 
-def parse_ah_to_number_of(ah_line_str: str):
-    """Convierte una línea de handicap asiático de string a número."""
-    if not isinstance(ah_line_str, str): 
-        return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: 
-        return None
-        
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: 
-                return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            # Ajustar signo para fracciones mixtas
-            if val1 < 0 and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    """Formatea una línea de handicap asiático como string decimal."""
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-        
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-        
-    if numeric_value == 0.0: 
-        return "0"
-        
-    # Redondear y formatear
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    
-    # Redondeo especial para líneas asiáticas
-    if abs_num % 1 == 0.0:
-        result = int(abs_num)
-    elif abs_num % 1 == 0.5:
-        result = abs_num
-    elif abs_num % 1 == 0.25 or abs_num % 1 == 0.75:
-        result = abs_num
-    else:
-        # Redondeo al 0.25 más cercano
-        result = round(abs_num * 4) / 4
-        
-    final_value = sign * result
-    
-    # Formatear como string
-    if final_value == int(final_value):
-        output_str = str(int(final_value))
-    else:
-        output_str = f"{final_value:.2f}".rstrip('0').rstrip('.')
-        
-    return output_str
+_AH_COVER_LABELS = {True: ("CUBIERTO", True), False: ("NO CUBIERTO", False), None: ("PUSH", None)}
+_GOAL_LINE_LABELS = {True: ("SUPERADA (Over)", True), False: ("NO SUPERADA (Under)", False), None: ("PUSH (Empate)", None)}
 
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, 
                         home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
     """Verifica si un equipo cubrió el handicap en un partido."""
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-        
-        # Caso de handicap asiático 0
+        goles_h, goles_a = parse_score(resultado_raw)
         if ah_line_num == 0.0:
-            if main_home_team_name.lower() == home_team_in_h2h.lower():
-                if goles_h > goles_a: 
-                    return ("CUBIERTO", True)
-                elif goles_a > goles_h: 
-                    return ("NO CUBIERTO", False)
-                else: 
-                    return ("PUSH", None)
-            else:
-                if goles_a > goles_h: 
-                    return ("CUBIERTO", True)
-                elif goles_h > goles_a: 
-                    return ("NO CUBIERTO", False)
-                else: 
-                    return ("PUSH", None)
-        
-        # Determinar margen de victoria del favorito
-        if favorite_team_name.lower() == home_team_in_h2h.lower():
-            favorite_margin = goles_h - goles_a
+            # Línea 0: se mira desde el local del partido principal.
+            favourite_is_home = main_home_team_name.lower() == home_team_in_h2h.lower()
+        elif favorite_team_name.lower() == home_team_in_h2h.lower():
+            favourite_is_home = True
         elif favorite_team_name.lower() == away_team_in_h2h.lower():
-            favorite_margin = goles_a - goles_h
+            favourite_is_home = False
         else:
             return ("indeterminado", None)
-        
-        # Verificar si se cubrió el handicap
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
+        code = ah_cover_code(goles_h, goles_a, ah_line_num, favourite_is_home)
     except (ValueError, TypeError, AttributeError):
         return ("indeterminado", None)
+    return _AH_COVER_LABELS[outcome_sign(code)]
 
 def check_goal_line_cover(resultado_raw: str, goal_line_num: float = 2.5):
     """Verifica si un partido superó la línea de goles."""
     try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return ("NO SUPERADA (Under)", False)
-        else:
-            return ("PUSH (Empate)", None)
+        goles_h, goles_a = parse_score(resultado_raw)
+        code = goal_line_code(goles_h, goles_a, goal_line_num)
     except (ValueError, TypeError):
         return ("indeterminado", None)
+    return _GOAL_LINE_LABELS[outcome_sign(code)]
 
 def extract_final_score_of(soup):
     """
@@ -0,0 +1,18 @@
+# Preparación común de los tests: src/ en el path y la página h2h guardada como fixture.
+import sys
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+# Página h2h guardada: Singapore U23 (5144, table_v1) vs Bangladesh U23 (5126, table_v2), 20 filas cada una.
+FIXTURE = ROOT / 'html_extraer' / 'analisis.txt'
+HOME, AWAY = 'Singapore U23', 'Bangladesh U23'
+
+
+@pytest.fixture(scope='session')
+def soup():
+    return BeautifulSoup(FIXTURE.read_text(encoding='utf-8', errors='replace'), 'lxml')
@@ -0,0 +1,155 @@
+import math
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from modules.cobertura import (  # noqa: E402
+    HALF_LOSS,
+    HALF_WIN,
+    LOSS,
+    PUSH,
+    UNKNOWN,
+    WIN,
+    ah_cover_code,
+    ah_cover_codes,
+    classify_margin,
+    classify_margins,
+    goal_line_code,
+    goal_line_codes,
+    outcome_sign,
+    scores_to_arrays,
+)
+from modules.utils import check_goal_line_cover, check_handicap_cover  # noqa: E402
+
+NAN = float('nan')
+
+
+# --- Implementaciones originales de utils, congeladas como oráculo ---
+def _reference_handicap_cover(resultado_raw, ah_line_num, favorite_team_name, home_team_in_h2h, away_team_in_h2h, main_home_team_name):
+    try:
+        goles_h, goles_a = map(int, resultado_raw.split('-'))
+        if ah_line_num == 0.0:
+            if main_home_team_name.lower() == home_team_in_h2h.lower():
+                margin = goles_h - goles_a
+            else:
+                margin = goles_a - goles_h
+            return ("CUBIERTO", True) if margin > 0 else ("NO CUBIERTO", False) if margin < 0 else ("PUSH", None)
+        if favorite_team_name.lower() == home_team_in_h2h.lower():
+            favorite_margin = goles_h - goles_a
+        elif favorite_team_name.lower() == away_team_in_h2h.lower():
+            favorite_margin = goles_a - goles_h
+        else:
+            return ("indeterminado", None)
+        if favorite_margin - abs(ah_line_num) > 0.05:
+            return ("CUBIERTO", True)
+        elif favorite_margin - abs(ah_line_num) < -0.05:
+            return ("NO CUBIERTO", False)
+        return ("PUSH", None)
+    except (ValueError, TypeError, AttributeError):
+        return ("indeterminado", None)
+
+
+def _reference_goal_line_cover(resultado_raw, goal_line_num=2.5):
+    try:
+        goles_h, goles_a = map(int, resultado_raw.split('-'))
+        total_goles = goles_h + goles_a
+        if total_goles > goal_line_num:
+            return ("SUPERADA (Over)", True)
+        elif total_goles < goal_line_num:
+            return ("NO SUPERADA (Under)", False)
+        return ("PUSH (Empate)", None)
+    except (ValueError, TypeError):
+        return ("indeterminado", None)
+
+
+AH_CASES = [
+    # (goles local, goles visitante, línea, favorito local, código)
+    (1, 0, 0.25, True, WIN),
+    (0, 0, 0.25, True, HALF_LOSS),
+    (0, 0, -0.25, False, HALF_LOSS),
+    (1, 0, 0.75, True, HALF_WIN),
+    (0, 1, -0.75, False, HALF_WIN),
+    (1, 0, 1.0, True, PUSH),
+    (1, 0, 1.25, True, HALF_LOSS),
+    (2, 0, 1.25, True, WIN),
+    (1, 1, 0.0, True, PUSH),
+    (0, 2, 0.5, True, LOSS),
+    (0, 3, 1.5, True, LOSS),
+    (NAN, 0, 0.5, True, UNKNOWN),
+    (1, NAN, 0.5, False, UNKNOWN),
+    (1, 0, NAN, True, UNKNOWN),
+]
+
+GOAL_LINE_CASES = [
+    # (goles local, goles visitante, línea, código)
+    (3, 0, 2.5, WIN),
+    (0, 0, 2.5, LOSS),
+    (2, 1, 2.75, HALF_WIN),
+    (1, 1, 2.25, HALF_LOSS),
+    (1, 1, 2.0, PUSH),
+    (2, 1, 3.0, PUSH),
+    (NAN, 1, 2.5, UNKNOWN),
+    (1, 1, NAN, UNKNOWN),
+]
+
+
+def test_ah_cover_codes_pinned():
+    home, away, lines, favourite, expected = map(list, zip(*AH_CASES))
+    assert ah_cover_codes(home, away, lines, favourite).tolist() == expected
+
+
+def test_goal_line_codes_pinned():
+    home, away, lines, expected = map(list, zip(*GOAL_LINE_CASES))
+    assert goal_line_codes(home, away, lines).tolist() == expected
+
+
+@pytest.mark.parametrize('home, away, line, favourite_is_home, expected', AH_CASES)
+def test_ah_cover_code_matches_batch(home, away, line, favourite_is_home, expected):
+    assert ah_cover_code(home, away, line, favourite_is_home) == expected
+
+
+@pytest.mark.parametrize('home, away, line, expected', GOAL_LINE_CASES)
+def test_goal_line_code_matches_batch(home, away, line, expected):
+    assert goal_line_code(home, away, line) == expected
+
+
+def test_scalar_and_batch_agree_randomised():
+    rng = random.Random(47)
+    quarter_lines = [q / 4 for q in range(-16, 17)]
+    rows = [(rng.randint(0, 6), rng.randint(0, 6), rng.choice(quarter_lines), rng.random() < 0.5) for _ in range(2000)]
+    home, away, lines, favourite = map(list, zip(*rows))
+    batch_ah = ah_cover_codes(home, away, lines, favourite)
+    batch_goals = goal_line_codes(home, away, [abs(line) + 1.5 for line in lines])
+    for k, (h, a, line, fav) in enumerate(rows):
+        assert ah_cover_code(h, a, line, fav) == batch_ah[k]
+        assert goal_line_code(h, a, abs(line) + 1.5) == batch_goals[k]
+    diffs = [rng.uniform(-2, 2) for _ in range(500)] + [NAN, 0.05, -0.05, 0.3, -0.3]
+    assert classify_margins(diffs).tolist() == [classify_margin(d) for d in diffs]
+
+
+def test_wrappers_agree_with_original_implementations():
+    rng = random.Random(2047)
+    lines = [q / 4 for q in range(-12, 13)]
+    teams = ['Local', 'Visitante']
+    for _ in range(2000):
+        score = rng.choice([f"{rng.randint(0, 5)}-{rng.randint(0, 5)}", '?-?', '', '1 - 0'])
+        line = rng.choice(lines)
+        favourite = rng.choice(teams + ['Otro'])
+        main_home = rng.choice(teams)
+        args = (score, line, favourite, 'Local', 'Visitante', main_home)
+        assert check_handicap_cover(*args) == _reference_handicap_cover(*args)
+        goal_line = rng.choice([1.5, 2.0, 2.25, 2.5, 2.75, 3.0, 3.5])
+        assert check_goal_line_cover(score, goal_line) == _reference_goal_line_cover(score, goal_line)
+
+
+def test_outcome_sign_and_scores():
+    assert [outcome_sign(code) for code in (WIN, HALF_WIN, PUSH, HALF_LOSS, LOSS, UNKNOWN)] == [True, True, None, False, False, None]
+    home, away = scores_to_arrays(['2-1', '?-?', None, '0-0'])
+    assert home[0] == 2 and away[0] == 1 and home[3] == 0 and away[3] == 0
+    assert all(math.isnan(v) for v in (home[1], away[1], home[2], away[2]))
+    assert np.issubdtype(home.dtype, np.floating)
@@ -0,0 +1,164 @@
+import math
+import random
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from modules.handicap_asiatico import (  # noqa: E402
+    ah_line,
+    format_ah_as_decimal_string_of,
+    normalize_handicap_to_half_bucket_str,
+    parse_ah_to_number_of,
+)
+
+
+# --- Implementaciones originales de estudio_scraper y app.py, congeladas como oráculo ---
+def _reference_parse(ah_line_str):
+    if not isinstance(ah_line_str, str): return None
+    s = ah_line_str.strip().replace(' ', '')
+    if not s or s in ['-', '?']: return None
+    original_starts_with_minus = ah_line_str.strip().startswith('-')
+    try:
+        if '/' in s:
+            parts = s.split('/')
+            if len(parts) != 2: return None
+            p1_str, p2_str = parts[0], parts[1]
+            val1 = float(p1_str)
+            val2 = float(p2_str)
+            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
+                val2 = -abs(val2)
+            elif original_starts_with_minus and val1 == 0.0 and \
+                    (p1_str == "0" or p1_str == "-0") and \
+                    not p2_str.startswith('-') and val2 > 0:
+                val2 = -abs(val2)
+            return (val1 + val2) / 2.0
+        else:
+            return float(s)
+    except (ValueError, IndexError):
+        return None
+
+
+def _reference_format(ah_line_str, for_sheets=False):
+    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
+        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-', '?'] else '-'
+    numeric_value = _reference_parse(ah_line_str)
+    if numeric_value is None:
+        return ah_line_str.strip() if ah_line_str.strip() in ['-', '?'] else '-'
+    if numeric_value == 0.0: return "0"
+    sign = -1 if numeric_value < 0 else 1
+    abs_num = abs(numeric_value)
+    mod_val = abs_num % 1
+    if mod_val == 0.0: abs_rounded = abs_num
+    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
+    elif mod_val == 0.5: abs_rounded = abs_num
+    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
+    else:
+        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
+        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
+        else: abs_rounded = math.ceil(abs_num)
+    final_value_signed = sign * abs_rounded
+    if final_value_signed == 0.0: output_str = "0"
+    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9: output_str = str(int(round(final_value_signed, 0)))
+    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
+    else: output_str = f"{final_value_signed:.2f}"
+    if for_sheets:
+        return "'" + output_str.replace('.', ',') if output_str not in ['-', '?'] else output_str
+    return output_str
+
+
+def _reference_half_bucket(text):
+    # app.normalize_handicap_to_half_bucket_str, para líneas sin '/' (las del dashboard).
+    txt = str(text).strip().replace('−', '-').replace(',', '.').replace('+', '').replace(' ', '')
+    if not re.search(r"^[+-]?\d+(?:\.\d+)?$", txt):
+        return None
+    value = float(txt)
+    if value == 0:
+        return "0.0"
+    sign = -1.0 if value < 0 else 1.0
+    av = abs(value)
+    base = math.floor(av + 1e-9)
+    frac = av - base
+    if abs(frac) < 1e-6:
+        bucket = float(base)
+    elif any(abs(frac - f) < 1e-6 for f in (0.25, 0.5, 0.75)):
+        bucket = base + 0.5
+    else:
+        bucket = round(av * 2) / 2.0
+        f = bucket - math.floor(bucket)
+        if abs(f) < 1e-6 and (abs(av - (math.floor(bucket) + 0.25)) < 0.26 or abs(av - (math.floor(bucket) + 0.75)) < 0.26):
+            bucket = math.floor(bucket) + 0.5
+    return f"{sign * bucket:.1f}"
+
+
+# --- Generadores de entradas ---
+_QUARTERS = ['0', '0.25', '0.5', '0.75', '1', '1.25', '1.5', '1.75', '2', '2.5', '3', '3.25', '4.75', '10']
+
+
+def _random_line(rng):
+    kind = rng.random()
+    sign = rng.choice(['', '', '-', '+'])
+    if kind < 0.4:
+        return sign + rng.choice(_QUARTERS)
+    if kind < 0.7:
+        first = rng.choice(_QUARTERS)
+        second = rng.choice(_QUARTERS)
+        sep = rng.choice(['/', '/', ' / '])
+        return sign + first + sep + rng.choice(['', '', '-']) + second
+    if kind < 0.85:
+        return rng.choice(['', ' ', '-', '?', ' - ', '?', 'N/A', '0/0/0', '1//2', 'abc', '.', '-0', '-0/0.5'])
+    alphabet = '0123456789.-/ +?'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 8)))
+
+
+def _random_lines(seed, count=3000):
+    rng = random.Random(seed)
+    return [_random_line(rng) for _ in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_parse_agrees_with_estudio_scraper(seed):
+    for raw in _random_lines(seed):
+        expected = _reference_parse(raw)
+        got = parse_ah_to_number_of(raw)
+        assert got == expected or (got is not None and expected is not None and math.isclose(got, expected)), raw
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('for_sheets', [False, True])
+def test_format_agrees_with_estudio_scraper(seed, for_sheets):
+    for raw in _random_lines(seed):
+        assert format_ah_as_decimal_string_of(raw, for_sheets=for_sheets) == _reference_format(raw, for_sheets), raw
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_half_bucket_agrees_with_dashboard_filter(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        raw = rng.choice(['', '-', '+']) + rng.choice(_QUARTERS + ['0.1', '0.4', '1.6', '2.9', '3.00', '2.50'])
+        assert normalize_handicap_to_half_bucket_str(raw) == _reference_half_bucket(raw), raw
+
+
+@pytest.mark.parametrize('value', [None, 0.5, 1, [], object()])
+def test_non_string_input_is_an_empty_line(value):
+    assert parse_ah_to_number_of(value) is None
+    assert format_ah_as_decimal_string_of(value) == '-'
+
+
+@pytest.mark.parametrize('raw, number, display, bucket', [
+    ('0/0.5', 0.25, '0.25', '0.5'),
+    ('-0/0.5', -0.25, '-0.25', '-0.5'),
+    ('-0.5/1', -0.75, '-0.75', '-0.5'),
+    ('2.5/3', 2.75, '2.75', '2.5'),
+    ('−0,5', -0.5, '-0.5', '-0.5'),
+    ('?', None, '?', None),
+])
+def test_known_lines(raw, number, display, bucket):
+    assert ah_line(raw) == (number, display, bucket)
+
+
+def test_lookups_are_memoized():
+    assert ah_line('1.25') is ah_line('1.25')
@@ -0,0 +1,287 @@
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from conftest import AWAY, FIXTURE, HOME
+from modules.analisis_reciente import analizar_rendimiento_reciente_con_handicap
+from modules.estudio_scraper import (
+    _extract_last_match_in_handicap_range,
+    extract_comparative_match_of,
+    extract_h2h_data_of,
+    extract_last_match_in_league_of,
+    get_rival_a_for_original_h2h_of,
+    get_rival_b_for_original_h2h_of,
+)
+from modules.funciones_resumen import _obtener_partidos_recientes
+from modules.utils import (
+    check_handicap_cover,
+    format_ah_as_decimal_string_of,
+    get_match_details_from_row_of,
+    parse_ah_to_number_of,
+)
+
+NAMES = [HOME, AWAY, 'singapore', 'bangladesh u23', 'Vietnam U23', 'Malaysia U23', 'U23', 'Nadie']
+LEAGUES = [None, '1385', '293', '2319', '999']
+TABLES = [('table_v1', True), ('table_v2', False)]
+
+
+@pytest.fixture(scope='module')
+def h2h_soup():
+    """La página con una table_v3 hecha de las filas de table_v1 (el fixture no trae h2h directo)."""
+    text = FIXTURE.read_text(encoding='utf-8', errors='replace')
+    page = BeautifulSoup(text, 'lxml')
+    table = BeautifulSoup(text, 'lxml').find('table', id='table_v1')
+    table['id'] = 'table_v3'
+    for row in table.find_all('tr', id=re.compile(r"tr1_\d+")):
+        row['id'] = row['id'].replace('tr1_', 'tr3_')
+        for span in row.find_all('span', class_='fscore_1'):
+            span['class'] = ['fscore_3']
+    page.body.append(table)
+    return page
+
+
+# --- Implementaciones originales por recorrido de filas, congeladas como oráculo ---
+def _reference_rows(table, table_id):
+    return table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+"))
+
+
+def _reference_date(d):
+    m = re.search(r'(\d{2})-(\d{2})-(\d{4})', d or '')
+    return (int(m.group(3)), int(m.group(2)), int(m.group(1))) if m else (1900, 1, 1)
+
+
+def _reference_rival(soup, table_id, league_id, link_index):
+    if not soup or not (table := soup.find("table", id=table_id)): return None, None, None
+    for row in _reference_rows(table, table_id):
+        if league_id and row.get("name") != str(league_id):
+            continue
+        if row.get("vs") == "1" and (key_id := row.get("index")):
+            onclicks = row.find_all("a", onclick=True)
+            if len(onclicks) > link_index and (rival_tag := onclicks[link_index]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
+                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+    return None, None, None
+
+
+def _reference_last_match_in_league(soup, table_id, team_name, league_id, is_home_game):
+    if not soup or not (table := soup.find("table", id=table_id)): return None
+    candidate_matches = []
+    score_selector = 'fscore_1' if is_home_game else 'fscore_2'
+    for row in _reference_rows(table, table_id):
+        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')):
+            continue
+        if league_id and details.get("league_id_hist") != str(league_id):
+            continue
+        is_team_home = team_name.lower() in details.get('home', '').lower()
+        is_team_away = team_name.lower() in details.get('away', '').lower()
+        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
+            candidate_matches.append(details)
+    if not candidate_matches: return None
+    candidate_matches.sort(key=lambda x: _reference_date(x.get('date', '')), reverse=True)
+    last_match = candidate_matches[0]
+    return {
+        "date": last_match.get('date', 'N/A'), "home_team": last_match.get('home'),
+        "away_team": last_match.get('away'), "score": last_match.get('score_raw', 'N/A').replace('-', ':'),
+        "handicap_line_raw": last_match.get('ahLine_raw', 'N/A'), "match_id": last_match.get('matchIndex')
+    }
+
+
+def _reference_h2h_data(soup, home_name, away_name, league_id=None):
+    results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
+    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")): return results
+    all_matches = []
+    for r in _reference_rows(h2h_table, 'table_v3'):
+        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h')):
+            if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
+                all_matches.append(d)
+    if not all_matches: return results
+    all_matches.sort(key=lambda x: _reference_date(x.get('date', '')), reverse=True)
+    most_recent = all_matches[0]
+    results.update({'ah6': most_recent.get('ahLine', '-'), 'res6': most_recent.get('score', '?:?'), 'res6_raw': most_recent.get('score_raw', '?-?'), 'match6_id': most_recent.get('matchIndex'), 'h2h_gen_home': most_recent.get('home'), 'h2h_gen_away': most_recent.get('away')})
+    for d in all_matches:
+        if d['home'].lower() == home_name.lower() and d['away'].lower() == away_name.lower():
+            results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
+            break
+    return results
+
+
+def _reference_comparative_match(soup, table_id, main_team, opponent, league_id, is_home_table):
+    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
+    score_selector = 'fscore_1' if is_home_table else 'fscore_2'
+    for row in _reference_rows(table, table_id):
+        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')): continue
+        if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
+        h, a = details.get('home', '').lower(), details.get('away', '').lower()
+        main, opp = main_team.lower(), opponent.lower()
+        if (main == h and opp == a) or (main == a and opp == h):
+            return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
+    return None
+
+
+def _reference_handicap_range(soup, table_id, team_name, handicap_range, is_home_team_table, is_neutral):
+    if not soup or not (table := soup.find("table", id=table_id)):
+        return None
+    for row in _reference_rows(table, table_id):
+        cells = row.find_all('td')
+        if len(cells) < 12: continue
+        home_team_name_row = (cells[2].find('a') or cells[2]).get_text(strip=True)
+        away_team_name_row = (cells[4].find('a') or cells[4]).get_text(strip=True)
+        clean_team_name = team_name.lower()
+        is_team_playing_home = clean_team_name in home_team_name_row.lower().replace('(n)', '').strip()
+        is_team_playing_away = clean_team_name in away_team_name_row.lower().replace('(n)', '').strip()
+        if is_neutral:
+            relevant = is_team_playing_away if is_home_team_table else is_team_playing_home
+        else:
+            relevant = is_team_playing_home if is_home_team_table else is_team_playing_away
+        if not relevant:
+            continue
+        handicap_cell = cells[11]
+        handicap_raw = (handicap_cell.get('data-o') or handicap_cell.text).strip()
+        handicap_num = parse_ah_to_number_of(handicap_raw)
+        if handicap_num is not None and handicap_range[0] <= handicap_num <= handicap_range[1]:
+            date_span = cells[1].find('span', attrs={'name': 'timeData'})
+            score_span = cells[3].find('span', class_=lambda c: isinstance(c, str) and 'score' in c)
+            result_class = cells[11].get('class', [])
+            result = "Push"
+            if 'f_win' in result_class or 'f_red' in result_class:
+                result = "Win"
+            elif 'f_loss' in result_class:
+                result = "Loss"
+            return {
+                "date": date_span.get_text(strip=True) if date_span else '',
+                "league": (cells[0].find('a') or cells[0]).get_text(strip=True),
+                "home_team": home_team_name_row,
+                "away_team": away_team_name_row,
+                "score": (score_span or cells[3]).get_text(strip=True),
+                "handicap": format_ah_as_decimal_string_of(handicap_raw),
+                "result": result,
+            }
+    return None
+
+
+def _reference_recent_rows(soup, table_id, team_name, is_home_team):
+    table = soup.find("table", id=table_id)
+    if not table:
+        return None
+    matches = []
+    score_selector = 'fscore_1' if is_home_team else 'fscore_2'
+    for row in _reference_rows(table, table_id):
+        if len(matches) >= 5:
+            break
+        cells = row.find_all('td')
+        if len(cells) < 12:
+            continue
+        home_team, away_team = cells[2].get_text(strip=True), cells[4].get_text(strip=True)
+        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
+            continue
+        score_span = cells[3].find('span', class_=score_selector)
+        if not score_span or '-' not in (score_raw := score_span.get_text(strip=True)):
+            continue
+        ah_line_raw = (cells[11].get('data-o') or cells[11].text).strip()
+        matches.append({'home_team': home_team, 'away_team': away_team, 'score': score_raw,
+                        'ah_line_raw': ah_line_raw, 'ah_line_num': parse_ah_to_number_of(ah_line_raw)})
+    return matches
+
+
+def _reference_recent_performance(soup, team_name, is_home_team):
+    matches = _reference_recent_rows(soup, "table_v1" if is_home_team else "table_v2", team_name, is_home_team)
+    if matches is None:
+        return {"error": "No se encontró la tabla de partidos recientes"}
+    analysis = {'team_name': team_name, 'total_matches': len(matches), 'covered': 0, 'not_covered': 0, 'push': 0, 'details': []}
+    for match in matches:
+        favorito_name = None
+        if match['ah_line_num'] is not None:
+            if match['ah_line_num'] > 0:
+                favorito_name = match['home_team']
+            elif match['ah_line_num'] < 0:
+                favorito_name = match['away_team']
+        # check_handicap_cover queda fijado a su versión original en test_cobertura.py.
+        resultado = check_handicap_cover(
+            match['score'], match['ah_line_num'] if match['ah_line_num'] is not None else 0,
+            favorito_name or "", match['home_team'], match['away_team'], team_name
+        )
+        if resultado[1] is True:
+            analysis['covered'] += 1
+            result_text = "CUBIERTO"
+        elif resultado[1] is False:
+            analysis['not_covered'] += 1
+            result_text = "NO CUBIERTO"
+        else:
+            analysis['push'] += 1
+            result_text = "PUSH"
+        analysis['details'].append({
+            'home_team': match['home_team'], 'away_team': match['away_team'], 'score': match['score'],
+            'ah_line': format_ah_as_decimal_string_of(match['ah_line_raw']) if match['ah_line_raw'] else '-',
+            'result': result_text,
+        })
+    return analysis
+
+
+def _reference_partidos_recientes(soup, table_id, team_name, is_home_team):
+    partidos = []
+    for match in _reference_recent_rows(soup, table_id, team_name, is_home_team) or []:
+        favorito = None
+        if match['ah_line_num'] is not None:
+            if match['ah_line_num'] > 0:
+                favorito = match['home_team']
+            elif match['ah_line_num'] < 0:
+                favorito = match['away_team']
+        partidos.append(dict(match, favorito=favorito,
+                             equipo_es_favorito=team_name.lower() == favorito.lower() if favorito else False))
+    return partidos
+
+
+@pytest.mark.parametrize('league_id', LEAGUES)
+def test_rivals_for_original_h2h(soup, league_id):
+    assert get_rival_a_for_original_h2h_of(soup, league_id) == _reference_rival(soup, 'table_v1', league_id, 1)
+    assert get_rival_b_for_original_h2h_of(soup, league_id) == _reference_rival(soup, 'table_v2', league_id, 0)
+
+
+@pytest.mark.parametrize('league_id', LEAGUES)
+@pytest.mark.parametrize('team', NAMES)
+def test_last_match_in_league(soup, team, league_id):
+    for table_id, _ in TABLES:
+        for side in (True, False):
+            assert extract_last_match_in_league_of(soup, table_id, team, league_id, side) == \
+                _reference_last_match_in_league(soup, table_id, team, league_id, side)
+
+
+@pytest.mark.parametrize('league_id', LEAGUES)
+@pytest.mark.parametrize('home, away', [(HOME, AWAY), (HOME, 'Vietnam U23'), ('malaysia u23', 'SINGAPORE U23'), ('U23', 'Nadie')])
+def test_h2h_data(soup, h2h_soup, home, away, league_id):
+    assert extract_h2h_data_of(soup, home, away, league_id) == _reference_h2h_data(soup, home, away, league_id)
+    assert extract_h2h_data_of(h2h_soup, home, away, league_id) == _reference_h2h_data(h2h_soup, home, away, league_id)
+
+
+@pytest.mark.parametrize('league_id', LEAGUES)
+@pytest.mark.parametrize('opponent', ['Vietnam U23', 'malaysia u23', 'Yemen U23', 'U23', 'N/A', ''])
+def test_comparative_match(soup, opponent, league_id):
+    for table_id, is_home in TABLES:
+        for main in (HOME, AWAY, 'singapore u23'):
+            assert extract_comparative_match_of(soup, table_id, main, opponent, league_id, is_home) == \
+                _reference_comparative_match(soup, table_id, main, opponent, league_id, is_home)
+
+
+@pytest.mark.parametrize('handicap_range', [(-0.25, 0.25), (-1.75, -1.25), (0.75, 1.25), (-3.0, 3.0), (5.0, 6.0)])
+@pytest.mark.parametrize('team', NAMES)
+def test_handicap_range(soup, team, handicap_range):
+    for table_id, is_home in TABLES:
+        for is_neutral in (False, True):
+            assert _extract_last_match_in_handicap_range(soup, table_id, team, handicap_range, is_home, is_neutral) == \
+                _reference_handicap_range(soup, table_id, team, handicap_range, is_home, is_neutral)
+
+
+@pytest.mark.parametrize('team', NAMES)
+def test_recent_form(soup, team):
+    for table_id, is_home in TABLES:
+        assert analizar_rendimiento_reciente_con_handicap(soup, team, is_home) == _reference_recent_performance(soup, team, is_home)
+        assert _obtener_partidos_recientes(soup, table_id, team, is_home) == _reference_partidos_recientes(soup, table_id, team, is_home)
+
+
+def test_missing_tables():
+    empty = BeautifulSoup('<html><body></body></html>', 'lxml')
+    assert extract_last_match_in_league_of(empty, 'table_v1', HOME, None, True) is None
+    assert extract_h2h_data_of(empty, HOME, AWAY) == _reference_h2h_data(empty, HOME, AWAY)
+    assert get_rival_a_for_original_h2h_of(empty) == (None, None, None)
+    assert analizar_rendimiento_reciente_con_handicap(empty, HOME) == {"error": "No se encontró la tabla de partidos recientes"}
+    assert _obtener_partidos_recientes(empty, 'table_v1', HOME) == []
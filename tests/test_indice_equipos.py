@@ -0,0 +1,131 @@
+import copy
+import re
+import threading
+from datetime import date
+
+import pytest
+from bs4 import BeautifulSoup
+
+from conftest import AWAY, HOME
+from modules import indice_equipos
+from modules.analisis_rivales import resumir_rivales_comunes, resumir_rivales_comunes_indice
+from modules.estudio_scraper import (
+    _extract_last_match_in_handicap_range,
+    analizar_partidos_handicap,
+    extract_last_match_in_league_of,
+)
+from modules.indice_equipos import TeamHistoryIndex, match_kickoff_ordinal
+
+HOME_ID, AWAY_ID, LEAGUE_ID = '5144', '5126', '1385'
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch, soup):
+    index = TeamHistoryIndex(tmp_path)
+    monkeypatch.setattr(indice_equipos, '_index', index)
+    index.record_page('2800000', soup, HOME_ID, AWAY_ID, HOME, AWAY, LEAGUE_ID)
+    return index
+
+
+def test_record_page_dedupes_and_persists(index, soup, tmp_path):
+    rows = len(index.team_table(HOME_ID).rows)
+    assert rows >= 20
+    index.record_page('2800000', soup, HOME_ID, AWAY_ID, HOME, AWAY, LEAGUE_ID)
+    assert len(index.team_table(HOME_ID).rows) == rows
+    reloaded = TeamHistoryIndex(tmp_path)
+    assert [row['match_id'] for row in reloaded.team_table(HOME_ID).rows] == [
+        row['match_id'] for row in index.team_table(HOME_ID).rows]
+    assert reloaded.team_name(AWAY_ID) == AWAY
+    assert reloaded.match_teams(2800000)['away_id'] == int(AWAY_ID)
+
+
+def test_record_h2h_page_runs_in_background(tmp_path, monkeypatch, soup):
+    index = TeamHistoryIndex(tmp_path)
+    monkeypatch.setattr(indice_equipos, '_index', index)
+    indice_equipos.record_h2h_page('2800001', soup, HOME_ID, AWAY_ID, HOME, AWAY, LEAGUE_ID).result(timeout=10)
+    assert index.match_teams('2800001')['home_id'] == int(HOME_ID)
+    assert (tmp_path / f'{HOME_ID}.json').exists()
+
+
+def test_queries_do_not_wait_for_disk_writes(index, soup, monkeypatch):
+    writing, release = threading.Event(), threading.Event()
+    write_json = index._write_json
+
+    def slow_write(path, payload):
+        writing.set()
+        release.wait(10)
+        write_json(path, payload)
+
+    monkeypatch.setattr(index, '_write_json', slow_write)
+    recorder = threading.Thread(target=index.record_page, args=('2800002', soup, HOME_ID, AWAY_ID, HOME, AWAY, LEAGUE_ID))
+    recorder.start()
+    try:
+        assert writing.wait(10)
+        assert index.is_fresh(HOME_ID)
+        assert index.team_table(AWAY_ID) is not None
+        assert index.match_teams('2800002') is not None
+    finally:
+        release.set()
+        recorder.join(10)
+
+
+def test_freshness(index, tmp_path):
+    assert index.is_fresh(HOME_ID) and index.is_fresh(AWAY_ID)
+    assert not index.is_fresh('999999')
+    assert not TeamHistoryIndex(tmp_path, fresh_seconds=-1).is_fresh(HOME_ID)
+
+
+def test_lookups_fall_back_to_index(index, soup):
+    for table_id, name, team_id, is_home in (('table_v1', HOME, HOME_ID, True), ('table_v2', AWAY, AWAY_ID, False)):
+        from_page = extract_last_match_in_league_of(soup, table_id, name, LEAGUE_ID, is_home)
+        assert extract_last_match_in_league_of(None, table_id, name, LEAGUE_ID, is_home, team_id) == from_page
+    from_page = _extract_last_match_in_handicap_range(soup, 'table_v1', HOME, (-2.0, -1.0), True, False)
+    assert from_page is not None
+    assert _extract_last_match_in_handicap_range(None, 'table_v1', HOME, (-2.0, -1.0), True, False, HOME_ID) == from_page
+    assert extract_last_match_in_league_of(None, 'table_v1', HOME, LEAGUE_ID, True) is None
+
+
+def test_common_rivals_from_index(index, soup):
+    rivals = {r['rival']: r for r in resumir_rivales_comunes_indice(HOME_ID, AWAY_ID)}
+    assert {'Vietnam U23', 'Malaysia U23'} <= rivals.keys()
+    assert HOME not in rivals and AWAY not in rivals
+    # El índice cruza todas las condiciones: al menos los partidos que ve la página.
+    page = {r['rival']: r for r in resumir_rivales_comunes(soup, HOME, AWAY)}
+    for rival, summary in page.items():
+        assert set(summary['team_a']['match_ids']) <= set(rivals[rival]['team_a']['match_ids'])
+    assert resumir_rivales_comunes_indice(HOME_ID, '999999') is None
+
+
+def _later_page(soup, main_match_id):
+    """Página h2h de un partido posterior: su historial ya trae el partido analizado y otro más reciente."""
+    later = BeautifulSoup(str(soup), 'lxml')
+    script = later.find('script', string=re.compile(r'var _matchInfo = '))
+    script.string = script.string.replace("matchTime:'9/9/2025", "matchTime:'9/20/2025")
+    first_row = later.find(id='table_v1').find('tr', attrs={'index': True})
+    for match_id, day in ((main_match_id, '09-09-2025'), ('2800100', '15-09-2025')):
+        row = copy.copy(first_row)
+        row['index'] = match_id
+        row.find('span', attrs={'name': 'timeData'}).string = day
+        first_row.insert_before(row)
+    return later
+
+
+def test_index_fallbacks_stop_at_analysed_match(index, soup):
+    assert match_kickoff_ordinal(soup) == date(2025, 9, 9).toordinal()
+    assert index.match_teams('2800000')['kickoff'] == match_kickoff_ordinal(soup)
+    league = extract_last_match_in_league_of(None, 'table_v1', HOME, LEAGUE_ID, True, HOME_ID, '2800000')
+    in_range = _extract_last_match_in_handicap_range(None, 'table_v1', HOME, (-2.0, -1.0), True, False, HOME_ID, '2800000')
+    shortcut = analizar_partidos_handicap('2800000', '-1.5')
+    rivals = resumir_rivales_comunes_indice(HOME_ID, AWAY_ID, '2800000')
+
+    index.record_page('2800200', _later_page(soup, '2800000'), HOME_ID, AWAY_ID, HOME, AWAY, LEAGUE_ID)
+    # Sin partido de referencia el índice ya ve los dos partidos nuevos...
+    assert extract_last_match_in_league_of(None, 'table_v1', HOME, LEAGUE_ID, True, HOME_ID)['match_id'] == '2800100'
+    # ...pero el análisis de 2800000 solo usa lo jugado antes de él.
+    assert extract_last_match_in_league_of(None, 'table_v1', HOME, LEAGUE_ID, True, HOME_ID, '2800000') == league
+    assert _extract_last_match_in_handicap_range(None, 'table_v1', HOME, (-2.0, -1.0), True, False, HOME_ID, '2800000') == in_range
+    assert analizar_partidos_handicap('2800000', '-1.5') == shortcut
+    assert shortcut['home_match']['date'] == '06-09-2025'
+    assert resumir_rivales_comunes_indice(HOME_ID, AWAY_ID, '2800000') == rivals
+    later_ids = {'2800000', '2800100'}
+    assert not later_ids & {mid for r in rivals for mid in r['team_a']['match_ids']}
@@ -0,0 +1,101 @@
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from conftest import AWAY, HOME
+from modules.analisis_rivales import (
+    analizar_contra_rival_del_rival,
+    analizar_rivales_comunes,
+    resumir_rivales_comunes,
+)
+from modules.utils import get_match_details_from_row_of
+
+NAMES = [HOME, AWAY, 'singapore', 'bangladesh u23', 'Vietnam U23', 'Malaysia U23', 'U23', 'Yemen', 'Nadie']
+
+
+# --- Implementaciones originales por recorrido de filas, congeladas como oráculo ---
+def _reference_row(details, team, opponent=None):
+    row = {'team': team}
+    if opponent is not None:
+        row['opponent'] = opponent
+    row.update({
+        'home_team': details['home'], 'away_team': details['away'], 'score': details['score'],
+        'score_raw': details['score_raw'], 'ah_line': details['ahLine'],
+        'ah_line_raw': details['ahLine_raw'], 'date': details['date'],
+    })
+    return row
+
+
+def _reference_rows(soup, table_id):
+    table = soup.find('table', id=table_id)
+    selector = 'fscore_1' if table_id == 'table_v1' else 'fscore_2'
+    for row in table.find_all('tr', id=re.compile(rf"tr{table_id[-1]}_\d+")):
+        details = get_match_details_from_row_of(row, score_class_selector=selector, source_table_type='hist')
+        if details:
+            yield details
+
+
+def _reference_rivales_comunes(soup, team_a, team_b):
+    rivals_a = {d['away'].lower() for d in _reference_rows(soup, 'table_v1') if team_a.lower() in d['home'].lower()}
+    rivals_b = {d['home'].lower() for d in _reference_rows(soup, 'table_v2') if team_b.lower() in d['away'].lower()}
+    common = rivals_a & rivals_b
+    matches = [_reference_row(d, team_a, d['away']) for d in _reference_rows(soup, 'table_v1') if d['away'].lower() in common]
+    matches += [_reference_row(d, team_b, d['home']) for d in _reference_rows(soup, 'table_v2') if d['home'].lower() in common]
+    matches.sort(key=lambda x: x['date'], reverse=True)
+    return {'team_a': team_a, 'team_b': team_b, 'common_rivals': sorted(common),
+            'common_rivals_count': len(common), 'matches': matches[:10]}
+
+
+def _reference_contra(soup, table_id, team, rival):
+    team, rival = team.lower(), rival.lower()
+    return [
+        d for d in _reference_rows(soup, table_id)
+        if (team in d['home'].lower() and rival in d['away'].lower())
+        or (team in d['away'].lower() and rival in d['home'].lower())
+    ]
+
+
+@pytest.mark.parametrize('team_a', NAMES)
+@pytest.mark.parametrize('team_b', NAMES)
+def test_rivales_comunes_agree_with_row_scans(soup, team_a, team_b):
+    result = analizar_rivales_comunes(soup, team_a, team_b)
+    legacy = {key: value for key, value in result.items() if key != 'rivals'}
+    legacy['common_rivals'] = sorted(legacy['common_rivals'])
+    assert legacy == _reference_rivales_comunes(soup, team_a, team_b)
+    assert [r['rival'].lower() for r in result['rivals']] == result['common_rivals']
+
+
+@pytest.mark.parametrize('rival_a_rival, rival_b_rival', [
+    ('Vietnam U23', 'Malaysia U23'), ('Yemen U23', 'Vietnam'), ('u23', 'U23'), ('Nadie', 'Laos U23'),
+])
+@pytest.mark.parametrize('team_a, team_b', [(HOME, AWAY), ('singapore', 'BANGLADESH'), ('U23', 'U23')])
+def test_contra_rival_del_rival_agrees_with_row_scans(soup, team_a, team_b, rival_a_rival, rival_b_rival):
+    result = analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b_rival)
+    assert result['matches_a_vs_rival_b_rival'] == [
+        _reference_row(d, team_a) for d in _reference_contra(soup, 'table_v1', team_a, rival_b_rival)]
+    assert result['matches_b_vs_rival_a_rival'] == [
+        _reference_row(d, team_b) for d in _reference_contra(soup, 'table_v2', team_b, rival_a_rival)]
+    assert result['resumen_a_vs_rival_b_rival']['matches'] == len(result['matches_a_vs_rival_b_rival'])
+
+
+def test_per_rival_aggregates(soup):
+    rivals = resumir_rivales_comunes(soup, HOME, AWAY)
+    assert [r['rival'] for r in rivals] == ['Vietnam U23', 'Malaysia U23']
+    vietnam, malaysia = rivals
+    # Singapore: 0-1 (+1.5, U), 2-2 fuera (+2.25, O), 0-7 (sin línea).
+    assert vietnam['team_a'] == {
+        'matches': 3, 'wins': 0, 'draws': 1, 'losses': 2, 'goals_for': 2, 'goals_against': 10,
+        'ah_covered': 2, 'ah_not_covered': 0, 'ah_push': 0, 'over': 1, 'under': 1, 'ou_push': 0,
+        'last_margin': -1, 'match_ids': ['2789588', '2466310', '2157626'],
+    }
+    # Bangladesh: 0-2 fuera con el local dando 1.5.
+    assert (vietnam['team_b']['losses'], vietnam['team_b']['ah_not_covered'], vietnam['team_b']['last_margin']) == (1, 1, -2)
+    assert (malaysia['team_a']['draws'], malaysia['team_a']['ah_covered'], malaysia['team_a']['over']) == (1, 1, 1)
+    assert (malaysia['team_b']['losses'], malaysia['team_b']['ah_not_covered'], malaysia['team_b']['under']) == (1, 1, 1)
+
+
+def test_missing_tables():
+    empty = BeautifulSoup('<html><body></body></html>', 'lxml')
+    assert analizar_rivales_comunes(empty, HOME, AWAY) == {"error": "No se encontraron las tablas de partidos"}
+    assert resumir_rivales_comunes(empty, HOME, AWAY) is None